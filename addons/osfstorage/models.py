@@ -1,6 +1,7 @@
 from __future__ import unicode_literals
 
 import logging
+from collections import defaultdict
 
 from django.apps import apps
 from django.db import models, connection
@@ -14,7 +15,7 @@ from osf.exceptions import InvalidTagError, TagNotFoundError
 from framework.auth.core import Auth
 from osf.models.mixins import Loggable
 from osf.models import AbstractNode
-from osf.models.files import File, FileVersion, Folder, TrashedFileNode, BaseFileNode, BaseFileNodeManager
+from osf.models.files import File, FileVersion, Folder, TrashedFileNode, TrashedFolder, BaseFileNode, BaseFileNodeManager
 from osf.utils import permissions
 from website.files import exceptions
 from website.files import utils as files_utils
@@ -39,38 +40,69 @@ class OsfStorageFolderManager(BaseFileNodeManager):
 class OsfStorageFileNode(BaseFileNode):
     _provider = 'osfstorage'
 
+    # Computes the path of each of a list of file node ids by walking up to its root
+    MATERIALIZED_PATHS_SQL = """
+        WITH RECURSIVE materialized_path_cte(id, parent_id, GEN_PATH) AS (
+          SELECT
+            T.id,
+            T.parent_id,
+            T.name :: TEXT AS GEN_PATH
+          FROM %s AS T
+          WHERE T.id = ANY(%s)
+          UNION ALL
+          SELECT
+            R.id,
+            T.parent_id,
+            (T.name || '/' || R.GEN_PATH) AS GEN_PATH
+          FROM materialized_path_cte AS R
+            JOIN %s AS T ON T.id = R.parent_id
+          WHERE R.parent_id IS NOT NULL
+        )
+        SELECT id, gen_path
+        FROM materialized_path_cte AS N
+        WHERE parent_id IS NULL;
+    """
+
     @property
     def materialized_path(self):
-        sql = """
-            WITH RECURSIVE materialized_path_cte(parent_id, GEN_PATH) AS (
-              SELECT
-                T.parent_id,
-                T.name :: TEXT AS GEN_PATH
-              FROM %s AS T
-              WHERE T.id = %s
-              UNION ALL
-              SELECT
-                T.parent_id,
-                (T.name || '/' || R.GEN_PATH) AS GEN_PATH
-              FROM materialized_path_cte AS R
-                JOIN %s AS T ON T.id = R.parent_id
-              WHERE R.parent_id IS NOT NULL
-            )
-            SELECT gen_path
-            FROM materialized_path_cte AS N
-            WHERE parent_id IS NULL
-            LIMIT 1;
+        # Stored on save; rows written before paths were stored are computed from the tree
+        if self._materialized_path:
+            return self._materialized_path
+        if self.pk is None:
+            return '/'
+        return self.materialized_paths_for([self.pk]).get(self.pk, '/')
+
+    @classmethod
+    def materialized_paths_for(cls, ids):
+        """Return a dict of id -> materialized path for the given file node ids, reading the
+        stored paths and computing any missing ones with a single recursive query.
         """
+        ids = list(ids)
+        paths = dict(
+            BaseFileNode.objects.filter(id__in=ids)
+            .exclude(_materialized_path='')
+            .exclude(_materialized_path__isnull=True)
+            .values_list('id', '_materialized_path')
+        )
+        missing = [pk for pk in ids if pk not in paths]
+        if not missing:
+            return paths
+        folder_ids = set(
+            BaseFileNode.objects.filter(
+                id__in=missing,
+                type__in=OsfStorageFolder._typedmodels_subtypes + TrashedFolder._typedmodels_subtypes,
+            ).values_list('id', flat=True)
+        )
         with connection.cursor() as cursor:
-            cursor.execute(sql, [AsIs(self._meta.db_table), self.pk, AsIs(self._meta.db_table)])
-            row = cursor.fetchone()
-            if not row:
-                return '/'
+            table = AsIs(cls._meta.db_table)
+            cursor.execute(cls.MATERIALIZED_PATHS_SQL, [table, missing, table])
+            for pk, path in cursor.fetchall():
+                paths[pk] = path + '/' if pk in folder_ids else path
+        return paths
 
-            path = row[0]
-            if not self.is_file:
-                path = path + '/'
-            return path
+    def _compute_materialized_path(self):
+        parent_path = self.parent.materialized_path if self.parent_id else ''
+        return parent_path + self.name + ('' if self.is_file else '/')
 
     @materialized_path.setter
     def materialized_path(self, val):
@@ -224,7 +256,9 @@ class OsfStorageFileNode(BaseFileNode):
 
     def save(self):
         self._path = ''
-        self._materialized_path = ''
+        # Descendants of a moved or renamed folder are re-saved by _update_node after it,
+        # so each one picks up the new path from its (already saved) parent
+        self._materialized_path = self._compute_materialized_path()
         return super(OsfStorageFileNode, self).save()
 
 
@@ -447,36 +481,45 @@ class OsfStorageFolder(OsfStorageFileNode, Folder):
 
     @property
     def is_checked_out(self):
-        sql = """
-            WITH RECURSIVE is_checked_out_cte(id, parent_id, checkout_id) AS (
-              SELECT
-                T.id,
-                T.parent_id,
-                T.checkout_id
-              FROM %s AS T
-              WHERE T.id = %s
-              UNION ALL
-              SELECT
-                T.id,
-                T.parent_id,
-                T.checkout_id
-              FROM is_checked_out_cte AS R
-                JOIN %s AS T ON T.parent_id = R.id
-            )
-            SELECT N.checkout_id
-            FROM is_checked_out_cte as N
-            WHERE N.checkout_id IS NOT NULL
-            LIMIT 1;
-        """
-
-        with connection.cursor() as cursor:
-            cursor.execute(sql, [AsIs(self._meta.db_table), self.pk, AsIs(self._meta.db_table)])
-            row = cursor.fetchone()
+        return self.pk in self.checked_out_ids([self])
 
-            if row and row[0]:
-                return True
+    @classmethod
+    def checked_out_ids(cls, folders):
+        """Return the ids of those `folders` that are checked out or contain a checked out file node.
 
-        return False
+        Checked out file nodes are found per target through a partial index on checkout_id and matched
+        to folders by materialized path, so no folder subtree has to be walked.
+        """
+        folders_by_target = defaultdict(list)
+        for folder in folders:
+            if folder.pk is not None:
+                folders_by_target[(folder.target_content_type_id, folder.target_object_id)].append(folder)
+
+        checked_out = set()
+        for (content_type_id, object_id), target_folders in folders_by_target.items():
+            checked_out_nodes = dict(
+                BaseFileNode.objects.filter(
+                    target_content_type_id=content_type_id,
+                    target_object_id=object_id,
+                    provider='osfstorage',
+                    checkout__isnull=False,
+                ).exclude(
+                    type__in=TrashedFileNode._typedmodels_subtypes,
+                ).values_list('id', '_materialized_path')
+            )
+            if not checked_out_nodes:
+                continue
+            missing_paths = [pk for pk, path in checked_out_nodes.items() if not path]
+            if missing_paths:
+                checked_out_nodes.update(cls.materialized_paths_for(missing_paths))
+            for folder in target_folders:
+                folder_path = folder.materialized_path
+                if any(
+                    pk == folder.pk or path.startswith(folder_path)
+                    for pk, path in checked_out_nodes.items()
+                ):
+                    checked_out.add(folder.pk)
+        return checked_out
 
     @property
     def is_preprint_primary(self):
@@ -308,6 +308,39 @@ class TestOsfstorageFileNode(StorageTestCase):
         child = self.node_settings.get_root().append_folder('Cloud').append_file('Carp')
         assert_equals('/Cloud/Carp', child.materialized_path)
 
+    def test_materialized_path_is_stored(self):
+        child = self.node_settings.get_root().append_folder('Cloud').append_file('Carp')
+        child.reload()
+        assert_equals('/Cloud/Carp', child._materialized_path)
+        with self.assertNumQueries(0):
+            assert_equals('/Cloud/Carp', child.materialized_path)
+
+    def test_materialized_path_updated_when_folder_moved_and_renamed(self):
+        root = self.node_settings.get_root()
+        folder = root.append_folder('Cloud')
+        subfolder = folder.append_folder('Sky')
+        child = subfolder.append_file('Carp')
+        destination = root.append_folder('Sea')
+
+        folder.move_under(destination, name='Fog')
+
+        assert_equals('/Sea/Fog/', OsfStorageFileNode.load(folder._id).materialized_path)
+        assert_equals('/Sea/Fog/Sky/', OsfStorageFileNode.load(subfolder._id).materialized_path)
+        assert_equals('/Sea/Fog/Sky/Carp', OsfStorageFileNode.load(child._id).materialized_path)
+
+    def test_materialized_paths_for(self):
+        root = self.node_settings.get_root()
+        folder = root.append_folder('Cloud')
+        child = folder.append_file('Carp')
+        unstored = folder.append_folder('Sky')
+        BaseFileNode.objects.filter(id=unstored.id).update(_materialized_path='')
+
+        assert_equals(
+            OsfStorageFileNode.materialized_paths_for([root.id, folder.id, child.id, unstored.id]),
+            {root.id: '/', folder.id: '/Cloud/', child.id: '/Cloud/Carp', unstored.id: '/Cloud/Sky/'}
+        )
+        assert_equals('/Cloud/Sky/', OsfStorageFileNode.load(unstored._id).materialized_path)
+
     def test_copy(self):
         to_copy = self.node_settings.get_root().append_file('Carp')
         copy_to = self.node_settings.get_root().append_folder('Cloud')
@@ -917,6 +950,44 @@ class TestOsfStorageCheckout(StorageTestCase):
         with assert_raises(FileNodeCheckedOutError):
             folder.delete()
 
+    def test_folder_is_checked_out_when_descendant_is(self):
+        folder = self.root_node.append_folder('folder')
+        subfolder = folder.append_folder('subfolder')
+        sibling = self.root_node.append_folder('folder sibling')
+        self.file.move_under(subfolder)
+        assert_false(folder.is_checked_out)
+
+        self.file.check_in_or_out(self.user, self.user, save=True)
+        assert_true(self.root_node.is_checked_out)
+        assert_true(folder.is_checked_out)
+        assert_true(subfolder.is_checked_out)
+        assert_false(sibling.is_checked_out)
+        assert_equal(
+            OsfStorageFolder.checked_out_ids([self.root_node, folder, subfolder, sibling]),
+            {self.root_node.id, folder.id, subfolder.id}
+        )
+
+        other_folder = self.node_settings.get_root().append_folder('folder')
+        assert_equal(OsfStorageFolder.checked_out_ids([folder, other_folder]), {folder.id})
+
+    def test_trashed_and_other_provider_checkouts_are_ignored(self):
+        folder = self.root_node.append_folder('folder')
+        self.file.move_under(folder)
+        self.file.check_in_or_out(self.user, self.user, save=True)
+        assert_true(folder.is_checked_out)
+
+        BaseFileNode.objects.filter(id=self.file.id).update(type='osf.trashedfile')
+        assert_false(folder.is_checked_out)
+
+        BaseFileNode.objects.filter(id=self.file.id).update(type='osf.osfstoragefile', provider='github')
+        assert_false(folder.is_checked_out)
+
+    def test_checked_out_folder(self):
+        folder = self.root_node.append_folder('folder')
+        folder.check_in_or_out(self.user, self.user, save=True)
+        assert_true(folder.is_checked_out)
+        assert_true(self.root_node.is_checked_out)
+
     def test_move_checked_out_file(self):
         self.file.check_in_or_out(self.user, self.user, save=True)
         self.file.reload()
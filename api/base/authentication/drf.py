@@ -1,5 +1,4 @@
 import itsdangerous
-from importlib import import_module
 
 from django.middleware.csrf import get_token
 from django.utils.translation import ugettext_lazy as _
@@ -17,13 +16,12 @@ from api.base.exceptions import (
 )
 from framework.auth import cas
 from framework.auth.core import get_user
+from framework.sessions import load_session
 from osf import features
 from osf.models import OSFUser
 from osf.utils.fields import ensure_str
 from website import settings
 
-SessionStore = import_module(api_settings.SESSION_ENGINE).SessionStore
-
 
 def drf_get_session_from_cookie(cookie_val):
     """
@@ -32,6 +30,7 @@ def drf_get_session_from_cookie(cookie_val):
     For expired/nonexistent sessions,
     SessionStore(session_key=session_key) doesn't load the session data.
     Thus, when using the returned session object from this method, must check ``session.get('auth_user_id', None)``.
+    The session object is shared with any other lookup of the same session within the request, see ``load_session()``.
 
     :param cookie_val: the cookie
     :return: the Django native `Session` object or None
@@ -40,7 +39,7 @@ def drf_get_session_from_cookie(cookie_val):
         session_key = ensure_str(itsdangerous.Signer(settings.SECRET_KEY).unsign(cookie_val))
     except itsdangerous.BadSignature:
         return None
-    return SessionStore(session_key=session_key)
+    return load_session(session_key)
 
 
 def check_user(user):
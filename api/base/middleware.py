@@ -15,6 +15,10 @@ from framework.postcommit_tasks.handlers import (
     postcommit_after_request,
     postcommit_before_request,
 )
+from framework.guids.handlers import (
+    guids_after_request,
+    guids_before_request,
+)
 from framework.celery_tasks.handlers import (
     celery_before_request,
     celery_after_request,
@@ -112,6 +116,17 @@ class PostcommitTaskMiddleware(MiddlewareMixin):
         return response
 
 
+class GuidIdentityMapMiddleware(MiddlewareMixin):
+    """
+    Scope the identity map of objects loaded by guid to the request.
+    """
+    def process_request(self, request):
+        guids_before_request()
+
+    def process_response(self, request, response):
+        return guids_after_request(response)
+
+
 # Adapted from http://www.djangosnippets.org/snippets/186/
 # Original author: udfalkso
 # Modified by: Shwagroo Team and Gun.io
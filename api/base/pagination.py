@@ -220,8 +220,13 @@ class NodeContributorPagination(JSONAPIPagination):
         response = super(NodeContributorPagination, self).get_paginated_response(data)
         response_dict = response.data
         kwargs = self.request.parser_context['kwargs'].copy()
-        node = self.get_resource(kwargs)
-        total_bibliographic = node.visible_contributors.count()
+        contributors = self.page.paginator.object_list
+        if kwargs.get('is_embedded') and isinstance(contributors, list):
+            # Embedded contributor lists are loaded whole, see NodeContributorsList.get_embedded_objects
+            total_bibliographic = len([contributor for contributor in contributors if contributor.visible])
+        else:
+            node = self.get_resource(kwargs)
+            total_bibliographic = node.visible_contributors.count()
         if self.request.version < '2.1':
             response_dict['links']['meta']['total_bibliographic'] = total_bibliographic
         else:
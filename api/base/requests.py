@@ -14,9 +14,12 @@ class EmbeddedRequest(Request):
     def __init__(
         self, request, parsers=None, authenticators=None,
         negotiator=None, parser_context=None, parents=None,
+        embedded_objects=None,
     ):
         self.original_user = request.user
         self.parents = parents or {Node: {}, OSFUser: {}}
+        # Objects loaded in bulk for all items of the embedding list response
+        self.embedded_objects = embedded_objects or {}
         self.version = request.version
 
         super(EmbeddedRequest, self).__init__(
@@ -793,6 +793,9 @@ class RelationshipField(ser.Field):
                         else:
                             raise e
 
+                    if view_name == 'related':
+                        self._related_reverse = (view, kwargs)
+
                     if self.filter:
                         formatted_filters = self.format_filter(obj)
                         if formatted_filters:
@@ -879,6 +882,7 @@ class RelationshipField(ser.Field):
             format = self.format
 
         # Return the hyperlink, or error if incorrectly configured.
+        self._related_reverse = None
         try:
             url = self.get_url(value, self.view_name, request, format)
         except NoReverseMatch:
@@ -912,65 +916,81 @@ class RelationshipField(ser.Field):
         self_meta = self.get_meta_information(self.self_meta, value)
         relationship = format_relationship_links(related_url, self_url, related_meta, self_meta)
         if related_url:
-            resolved_url = resolve(related_path)
-            related_class = resolved_url.func.view_class
-            if issubclass(related_class, RetrieveModelMixin):
+            rule = self._get_relationship_data_rule(related_path)
+            if rule is not None:
+                related_type, id_kwargs = rule
+                related_kwargs = self._related_reverse[1] if self._related_reverse else resolve(related_path).kwargs
                 try:
-                    related_type = resolved_url.namespace.split(':')[-1]
-                    # TODO: change kwargs to preprint_provider_id and registration_id
-                    if related_class.view_name == 'node-settings':
-                        related_id = resolved_url.kwargs['node_id']
-                        related_type = 'node-setting'
-                    elif related_class.view_name == 'node-storage':
-                        related_id = resolved_url.kwargs['node_id']
-                        related_type = 'node-storage'
-                    elif related_class.view_name == 'node-citation' \
-                            or related_class.view_name == 'registration-citation':
-                        related_id = resolved_url.kwargs['node_id']
-                        related_type = 'citation'
-                    elif related_class.view_name == 'preprint-citation':
-                        related_id = resolved_url.kwargs['preprint_id']
-                        related_type = 'citation'
-                    elif related_type in ('preprint_providers', 'preprint-providers', 'registration-providers'):
-                        related_id = resolved_url.kwargs['provider_id']
-                    elif related_type in ('registrations', 'draft_nodes'):
-                        related_id = resolved_url.kwargs['node_id']
-                    elif related_type == 'schemas' and related_class.view_name == 'registration-schema-detail':
-                        related_id = resolved_url.kwargs['schema_id']
-                        related_type = 'registration-schemas'
-                    elif related_type == 'users' and related_class.view_name == 'user_settings':
-                        related_id = resolved_url.kwargs['user_id']
-                        related_type = 'user-settings'
-                    elif related_type == 'institutions' and related_class.view_name == 'institution-summary-metrics':
-                        related_id = resolved_url.kwargs['institution_id']
-                        related_type = 'institution-summary-metrics'
-                    elif related_type == 'collections' and related_class.view_name == 'collection-submission-detail':
-                        related_id = f'{resolved_url.kwargs["collection_submission_id"]}-{resolved_url.kwargs["collection_id"]}'
-                        related_type = 'collection-submission'
-                    elif related_type == 'collection-providers' and related_class.view_name == 'collection-provider-detail':
-                        related_id = resolved_url.kwargs['provider_id']
-                        related_type = 'collection-providers'
-                    elif related_type == 'registration-providers' and related_class.view_name == 'registration-provider-detail':
-                        related_id = resolved_url.kwargs['provider_id']
-                        related_type = 'registration-providers'
-                    elif related_type == 'preprint-providers' and related_class.view_name == 'preprint-provider-detail':
-                        related_id = resolved_url.kwargs['provider_id']
-                        related_type = 'preprint-providers'
-                    elif related_type == 'custom-item-metadata':
-                        related_id = resolved_url.kwargs['guid_id']
-                        related_type = 'custom-item-metadata-records'
-                    elif related_type == 'custom-file-metadata':
-                        related_id = resolved_url.kwargs['guid_id']
-                        related_type = 'custom-file-metadata-records'
-                    elif related_type == 'cedar-metadata-templates' and related_class.view_name == 'cedar-metadata-template-detail':
-                        related_id = resolved_url.kwargs['template_id']
-                    else:
-                        related_id = resolved_url.kwargs[related_type[:-1] + '_id']
+                    related_id = '-'.join(str(related_kwargs[kwarg]) for kwarg in id_kwargs)
                 except KeyError:
                     return relationship
                 relationship['data'] = {'id': related_id, 'type': related_type}
         return relationship
 
+    def _get_relationship_data_rule(self, related_path):
+        """
+        Returns the ``(related_type, id_kwargs)`` rule for the related view, resolving the related path
+        only the first time a view name is seen in this process.
+        """
+        if self._related_reverse is None:
+            # get_url was overridden without recording the reversed view; fall back to resolving the path
+            resolved_url = resolve(related_path)
+            return _relationship_data_rule(resolved_url.func.view_class, resolved_url.namespace)
+        view, kwargs = self._related_reverse
+        key = (view, 'version' in kwargs)
+        try:
+            return _RELATIONSHIP_DATA_RULES[key]
+        except KeyError:
+            resolved_url = resolve(related_path)
+            rule = _RELATIONSHIP_DATA_RULES[key] = _relationship_data_rule(resolved_url.func.view_class, resolved_url.namespace)
+            return rule
+
+
+# Per-process table of (view name, versioned) -> (related_type, id_kwargs) used by RelationshipField
+# to build relationship data without resolving every related link
+_RELATIONSHIP_DATA_RULES = {}
+
+
+def _relationship_data_rule(related_class, namespace):
+    """
+    Returns the JSON API type of a related view and the url kwargs that make up its id, or None
+    if the related view does not represent a single resource.
+    """
+    if not issubclass(related_class, RetrieveModelMixin):
+        return None
+    related_type = namespace.split(':')[-1]
+    # TODO: change kwargs to preprint_provider_id and registration_id
+    if related_class.view_name == 'node-settings':
+        return 'node-setting', ('node_id',)
+    elif related_class.view_name == 'node-storage':
+        return 'node-storage', ('node_id',)
+    elif related_class.view_name == 'node-citation' \
+            or related_class.view_name == 'registration-citation':
+        return 'citation', ('node_id',)
+    elif related_class.view_name == 'preprint-citation':
+        return 'citation', ('preprint_id',)
+    elif related_type in ('preprint_providers', 'preprint-providers', 'registration-providers'):
+        return related_type, ('provider_id',)
+    elif related_type in ('registrations', 'draft_nodes'):
+        return related_type, ('node_id',)
+    elif related_type == 'schemas' and related_class.view_name == 'registration-schema-detail':
+        return 'registration-schemas', ('schema_id',)
+    elif related_type == 'users' and related_class.view_name == 'user_settings':
+        return 'user-settings', ('user_id',)
+    elif related_type == 'institutions' and related_class.view_name == 'institution-summary-metrics':
+        return 'institution-summary-metrics', ('institution_id',)
+    elif related_type == 'collections' and related_class.view_name == 'collection-submission-detail':
+        return 'collection-submission', ('collection_submission_id', 'collection_id')
+    elif related_type == 'collection-providers' and related_class.view_name == 'collection-provider-detail':
+        return 'collection-providers', ('provider_id',)
+    elif related_type == 'custom-item-metadata':
+        return 'custom-item-metadata-records', ('guid_id',)
+    elif related_type == 'custom-file-metadata':
+        return 'custom-file-metadata-records', ('guid_id',)
+    elif related_type == 'cedar-metadata-templates' and related_class.view_name == 'cedar-metadata-template-detail':
+        return related_type, ('template_id',)
+    return related_type, (related_type[:-1] + '_id',)
+
 
 class TypedRelationshipField(RelationshipField):
     """ Overrides get_url to inject a typed namespace.
@@ -1314,6 +1334,14 @@ class JSONAPIListSerializer(ser.ListSerializer):
         if isinstance(data, collections.Mapping):
             errors = data.get('errors', None)
             data = data.get('data', None)
+        embeds = self.context.get('embed', None)
+        if embeds and not enable_esi:
+            # Give each embed the chance to load what it needs for the whole page at once
+            data = list(data)
+            for embed_partial in embeds.values():
+                prefetch = getattr(embed_partial, 'prefetch', None)
+                if prefetch is not None:
+                    prefetch(data)
         if enable_esi:
             ret = [
                 self.child.to_esi_representation(item, envelope=None) for item in data
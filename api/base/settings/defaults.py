@@ -228,6 +228,8 @@ MIDDLEWARE = (
     'api.base.middleware.DjangoGlobalMiddleware',
     'api.base.middleware.CeleryTaskMiddleware',
     'api.base.middleware.PostcommitTaskMiddleware',
+    # Listed after the task middlewares so that the identity map is dropped before tasks run
+    'api.base.middleware.GuidIdentityMapMiddleware',
     # A profiling middleware. ONLY FOR DEV USE
     # Uncomment and add "prof" to url params to recieve a profile for that url
     # 'api.base.middleware.ProfileMiddleware',
@@ -307,6 +309,28 @@ ADDONS_OAUTH = ADDONS_FOLDER_CONFIGURABLE + ['dataverse', 'github', 'bitbucket',
 
 BYPASS_THROTTLE_TOKEN = 'test-token'
 
+# Cache holding the throttle counters; must be shared between API processes (e.g. 'redis') for
+# rates to be enforced across them
+THROTTLE_CACHE_NAME = 'default'
+
+# Optional cache of guid -> (content type, object id), shared between processes, which saves the
+# join through osf_guid when loading objects by guid; None disables it
+GUID_LOAD_CACHE_NAME = None
+GUID_LOAD_CACHE_TIMEOUT = 60 * 60
+
+# Cache of node id -> ancestor guids; entries are invalidated when a node is moved, so it must be
+# shared between processes; None disables it
+NODE_LINEAGE_CACHE_NAME = 'redis'
+NODE_LINEAGE_CACHE_TIMEOUT = 60 * 10
+
+# Cache of SHARE updates waiting out SHARE_UPDATE_COALESCE_SECONDS; set and cleared by different
+# celery workers, so it must be shared between them
+SHARE_UPDATE_CACHE_NAME = 'redis'
+
+# Cache of OAuth2 token lookups (see CAS_PROFILE_CACHE_TTL); shared so that revoking a token in one
+# process stops every process from accepting it
+CAS_PROFILE_CACHE_NAME = 'redis'
+
 OSF_SHELL_USER_IMPORTS = None
 
 # Settings for use in the admin
@@ -335,6 +359,7 @@ ELASTICSEARCH_METRICS_DATE_FORMAT = '%Y'
 
 WAFFLE_CACHE_NAME = 'waffle_cache'
 STORAGE_USAGE_CACHE_NAME = 'storage_usage'
+# Past this, the database cache culls keys regardless of timeout; culled usage counters are recomputed on demand
 STORAGE_USAGE_MAX_ENTRIES = 10000000
 
 
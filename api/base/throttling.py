@@ -1,3 +1,4 @@
+from django.core.cache import caches
 from rest_framework import permissions
 from rest_framework.throttling import UserRateThrottle, AnonRateThrottle, SimpleRateThrottle
 import logging
@@ -8,6 +9,14 @@ logger = logging.getLogger(__name__)
 
 
 class BaseThrottle(SimpleRateThrottle):
+    """
+    Throttles opt into ``atomic_counters`` to replace DRF's per-key request history, which is read, trimmed
+    and written back by every request, with a sliding window over two fixed windows whose request counts are
+    kept with atomic cache increments. Memory per key is fixed and concurrent requests cannot overwrite each
+    other's history.
+    """
+    atomic_counters = False
+    cache = caches[settings.THROTTLE_CACHE_NAME]
 
     def get_ident(self, request):
         if request.META.get('HTTP_X_THROTTLE_TOKEN'):
@@ -29,6 +38,9 @@ class BaseThrottle(SimpleRateThrottle):
         if self.key is None:
             return True
 
+        if self.atomic_counters:
+            return self.allow_request_atomic()
+
         self.history = self.cache.get(self.key, [])
         self.now = self.timer()
 
@@ -40,6 +52,43 @@ class BaseThrottle(SimpleRateThrottle):
             return self.throttle_failure()
         return self.throttle_success()
 
+    def allow_request_atomic(self):
+        """
+        Estimate the requests made over the last ``duration`` seconds as the count of the current fixed window
+        plus the count of the previous one, weighted by how much of it still overlaps the sliding window.
+        """
+        self.now = self.timer()
+        window, elapsed = divmod(self.now, self.duration)
+        current_key = '{}:{}'.format(self.key, int(window))
+        previous_key = '{}:{}'.format(self.key, int(window) - 1)
+
+        counts = self.cache.get_many([current_key, previous_key])
+        weighted_previous = counts.get(previous_key, 0) * (1 - elapsed / self.duration)
+        if weighted_previous + counts.get(current_key, 0) >= self.num_requests:
+            return self.throttle_failure()
+
+        # Counters outlive their window by one duration, as the next window still weighs them
+        self.cache.add(current_key, 0, timeout=2 * self.duration)
+        try:
+            current = self.cache.incr(current_key)
+        except ValueError:
+            # The counter expired or was evicted in between
+            self.cache.set(current_key, 1, timeout=2 * self.duration)
+            current = 1
+        if weighted_previous + current > self.num_requests:
+            # Lost the race for the last slots of the window to concurrent requests
+            try:
+                self.cache.decr(current_key)
+            except ValueError:
+                pass
+            return self.throttle_failure()
+        return True
+
+    def wait(self):
+        if not self.atomic_counters:
+            return super(BaseThrottle, self).wait()
+        return self.duration - self.now % self.duration
+
 
 class NonCookieAuthThrottle(BaseThrottle, AnonRateThrottle):
 
@@ -123,11 +172,14 @@ class SendEmailDeactivationThrottle(SendEmailThrottle):
 
 class BurstRateThrottle(NonCookieAuthThrottle, UserRateThrottle):
     scope = 'burst'
+    atomic_counters = True
 
 
 class FilesRateThrottle(NonCookieAuthThrottle, UserRateThrottle):
     scope = 'files'
+    atomic_counters = True
 
 
 class FilesBurstRateThrottle(NonCookieAuthThrottle, UserRateThrottle):
     scope = 'files-burst'
+    atomic_counters = True
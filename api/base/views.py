@@ -8,12 +8,14 @@ from django.conf import settings as django_settings
 from django.db import transaction
 from django.db.models import F, Q
 from django.http import JsonResponse
+from django.urls import NoReverseMatch, Resolver404
 from django.contrib.contenttypes.models import ContentType
 from rest_framework import generics
 from rest_framework import permissions as drf_permissions
 from rest_framework import status
 from rest_framework.decorators import api_view, throttle_classes
-from rest_framework.exceptions import ValidationError, NotFound
+from rest_framework.exceptions import APIException, ValidationError, NotFound
+from rest_framework.fields import SkipField
 from rest_framework.mixins import ListModelMixin
 from rest_framework.response import Response
 
@@ -48,6 +50,12 @@ from waffle import sample_is_active
 
 class JSONAPIBaseView(generics.GenericAPIView):
 
+    # When embedded in a list response, views (usually through mixins such as NodeMixin) may load
+    # what every item needs at once in a `get_embedded_objects(request, view_kwargs_list)`
+    # classmethod and read it back from `request.embedded_objects`. Views that must load item by
+    # item set this to False.
+    batch_embeds = True
+
     def __init__(self, **kwargs):
         assert getattr(self, 'view_name', None), 'Must specify view_name on view.'
         assert getattr(self, 'view_category', None), 'Must specify view_category on view.'
@@ -65,17 +73,50 @@ class JSONAPIBaseView(generics.GenericAPIView):
         if getattr(field, 'field', None):
             field = field.field
 
+        def get_cache():
+            if not hasattr(self.request._request, '_embed_cache'):
+                self.request._request._embed_cache = {}
+            return self.request._request._embed_cache
+
+        def prefetch(items):
+            """Resolve this embed for every item of a list response up front and let the
+            embedded view load what it needs for all of them at once (see `get_embedded_objects`).
+            """
+            if not hasattr(field, 'resolve'):
+                return
+            cache = get_cache()
+            resolved = cache.setdefault(('resolved', field_name), {})
+            view_kwargs_by_class = defaultdict(list)
+            for item in items:
+                try:
+                    v, view_args, view_kwargs = field.resolve(item, field_name, self.request)
+                except (SkipField, NoReverseMatch, Resolver404, APIException):
+                    # Let the per-item path raise or skip as it would have
+                    continue
+                # Keep a reference to the item so its id() is not reused during this request
+                resolved[id(item)] = (item, (v, view_args, view_kwargs))
+                if v:
+                    view_kwargs_by_class[v.cls].append(view_kwargs)
+
+            for view_class, view_kwargs_list in view_kwargs_by_class.items():
+                if not getattr(view_class, 'batch_embeds', False) or not hasattr(view_class, 'get_embedded_objects'):
+                    continue
+                embedded_objects = cache.setdefault(('embedded_objects', view_class), {})
+                embedded_objects.update(view_class.get_embedded_objects(self.request, view_kwargs_list))
+
         def partial(item):
-            # resolve must be implemented on the field
-            v, view_args, view_kwargs = field.resolve(item, field_name, self.request)
+            cache = get_cache()
+            item_ref, resolution = cache.get(('resolved', field_name), {}).get(id(item), (None, None))
+            if item_ref is item:
+                v, view_args, view_kwargs = resolution
+                view_kwargs = dict(view_kwargs)
+            else:
+                # resolve must be implemented on the field
+                v, view_args, view_kwargs = field.resolve(item, field_name, self.request)
             if not v:
                 return None
 
-            request = EmbeddedRequest(self.request)
-
-            if not hasattr(request._request, '_embed_cache'):
-                request._request._embed_cache = {}
-            cache = request._request._embed_cache
+            request = EmbeddedRequest(self.request, embedded_objects=cache.get(('embedded_objects', v.cls)))
 
             request.parents.setdefault(type(item), {})[item._id] = item
 
@@ -137,6 +178,7 @@ class JSONAPIBaseView(generics.GenericAPIView):
 
             return ret
 
+        partial.prefetch = prefetch
         return partial
 
     def get_serializer_context(self):
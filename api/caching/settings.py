@@ -1,3 +1,8 @@
 NEVER_TIMEOUT = None  # for django caches setting None as a timeout value means the cache never times out.
 
 STORAGE_USAGE_KEY = 'storage_usage:{target_id}'
+STORAGE_USAGE_LOCK_ID = 5781  # advisory lock namespace, locked with the target's pk while applying deltas
+
+VARNISH_BAN_TIMEOUT = 0.3  # 300ms timeout for bans
+VARNISH_BAN_POOL_SIZE = 10  # concurrent BAN requests across all Varnish servers
+VARNISH_BAN_MERGE_THRESHOLD = 20  # bans under one resource before they are merged into a ban of the resource
@@ -1,13 +1,16 @@
+from collections import Counter, defaultdict
+
 from future.moves.urllib.parse import urlparse
-from django.db import connection
+from django.db import connection, transaction
 from django.db.models import Sum
+from gevent.pool import Pool
 
 import requests
 import logging
 
 from django.apps import apps
 from api.caching.utils import storage_usage_cache
-from framework.postcommit_tasks.handlers import enqueue_postcommit_task
+from framework.postcommit_tasks.handlers import enqueue_postcommit_task, postcommit_collection
 
 from api.caching import settings as cache_settings
 from framework.celery_tasks import app
@@ -15,6 +18,11 @@ from website import settings
 
 logger = logging.getLogger(__name__)
 
+VARNISH_BAN_COLLECTION = 'varnish_bans'
+
+# Running totals of bans requested by saved instances vs. bans actually sent to Varnish
+ban_metrics = Counter()
+
 
 def get_varnish_servers():
     #  TODO: this should get the varnish servers from HAProxy or a setting
@@ -72,67 +80,197 @@ def get_bannable_urls(instance):
     return bannable_urls, parsed_absolute_url.hostname
 
 
+def coalesce_bans(bans):
+    """Reduce (hostname, url pattern) pairs to the fewest prefix bans that still cover them all.
+
+    Varnish bans are regexes on the request line, so a ban for ``/v2/nodes/abc12/.*`` already
+    covers ``/v2/nodes/abc12/comments/.*``. Alternations can't be used instead, since ``|`` is
+    percent-encoded in the BAN request line.
+    """
+    grouped = defaultdict(set)
+    for hostname, url in bans:
+        parsed = urlparse(url)
+        path = parsed.path[:-len('.*')] if parsed.path.endswith('.*') else parsed.path
+        grouped[(hostname, parsed.scheme, parsed.netloc)].add(path)
+
+    coalesced = []
+    for (hostname, scheme, netloc), paths in grouped.items():
+        for path in _merge_ban_paths(paths):
+            coalesced.append((hostname, '{}://{}{}.*'.format(scheme, netloc, path)))
+    return coalesced
+
+
+def _merge_ban_paths(paths):
+    paths = set(paths)
+
+    # Many bans under one resource (e.g. /v2/nodes/<id>/files/<n>/) become a single ban of their parent,
+    # but never of anything broader than /v2/<type>/<id>/: top-level resources such as /v2/files/<id>/
+    # are never merged into their list
+    siblings = defaultdict(set)
+    for path in paths:
+        parent = path.rstrip('/').rsplit('/', 1)[0] + '/'
+        if parent.count('/') >= 4:
+            siblings[parent].add(path)
+    for parent, children in siblings.items():
+        if len(children) >= cache_settings.VARNISH_BAN_MERGE_THRESHOLD:
+            paths -= children
+            paths.add(parent)
+
+    # In sorted order a prefix comes right before everything it covers
+    merged = []
+    for path in sorted(paths):
+        if merged and path.startswith(merged[-1]):
+            continue
+        merged.append(path)
+    return merged
+
+
+def _send_ban(hostname, url_to_ban):
+    try:
+        response = requests.request(
+            'BAN', url_to_ban, timeout=cache_settings.VARNISH_BAN_TIMEOUT, headers=dict(
+                Host=hostname,
+            ),
+        )
+    except Exception as ex:
+        logger.error('Banning {} failed: {}'.format(
+            url_to_ban,
+            ex,
+        ))
+        return False
+    if not response.ok:
+        logger.error('Banning {} failed: {}'.format(
+            url_to_ban,
+            response.text,
+        ))
+        return False
+    logger.info('Banning {} succeeded'.format(
+        url_to_ban,
+    ))
+    return True
+
+
+def send_bans(bans):
+    """Coalesce ``bans`` and send them to every Varnish server concurrently"""
+    bans = list(bans)
+    coalesced = coalesce_bans(bans)
+    pool = Pool(cache_settings.VARNISH_BAN_POOL_SIZE)
+    results = pool.map(lambda ban: _send_ban(*ban), coalesced)
+
+    ban_metrics['requested'] += len(bans)
+    ban_metrics['sent'] += len(coalesced)
+    ban_metrics['coalesced'] += len(bans) - len(coalesced)
+    ban_metrics['failed'] += results.count(False)
+    logger.info('Sent {} Varnish bans for {} requested ({} coalesced, {} failed)'.format(
+        len(coalesced),
+        len(bans),
+        len(bans) - len(coalesced),
+        results.count(False),
+    ))
+    return coalesced
+
+
+def dispatch_bans(bans):
+    pending = list(bans)
+    del bans[:]
+    if pending:
+        send_bans(pending)
+
+
+def enqueue_ban(instance):
+    """Collect the bans for ``instance`` so they are sent, along with every other ban from the
+    request, by a single postcommit task.
+    """
+    if not settings.ENABLE_VARNISH:
+        return
+    bannable_urls, hostname = get_bannable_urls(instance)
+    bans = postcommit_collection(VARNISH_BAN_COLLECTION)
+    if bans is None:
+        # Not in a request, so there is nothing to batch with
+        send_bans((hostname, url) for url in bannable_urls)
+        return
+    first_ban = not bans
+    bans.extend((hostname, url) for url in bannable_urls)
+    if first_ban and bans:
+        enqueue_postcommit_task(dispatch_bans, (bans, ), {}, celery=False, once_per_request=True)
+
+
 @app.task(max_retries=5, default_retry_delay=60)
 def ban_url(instance):
-    # TODO: Refactor; Pull url generation into postcommit_task handling so we only ban urls once per request
-    timeout = 0.3  # 300ms timeout for bans
     if settings.ENABLE_VARNISH:
         bannable_urls, hostname = get_bannable_urls(instance)
-
-        for url_to_ban in set(bannable_urls):
-            try:
-                response = requests.request(
-                    'BAN', url_to_ban, timeout=timeout, headers=dict(
-                        Host=hostname,
-                    ),
-                )
-            except Exception as ex:
-                logger.error('Banning {} failed: {}'.format(
-                    url_to_ban,
-                    ex.message,
-                ))
-            else:
-                if not response.ok:
-                    logger.error('Banning {} failed: {}'.format(
-                        url_to_ban,
-                        response.text,
-                    ))
-                else:
-                    logger.info('Banning {} succeeded'.format(
-                        url_to_ban,
-                    ))
+        send_bans((hostname, url) for url in bannable_urls)
+
+
+STORAGE_USAGE_PAGE_SQL = """
+    SELECT max(obfnv.id), count(*), sum(version.size) FROM
+    (SELECT obfnv.id, obfnv.fileversion_id FROM osf_basefileversionsthrough AS obfnv
+    LEFT JOIN osf_basefilenode file ON obfnv.basefilenode_id = file.id
+    LEFT JOIN django_content_type type on file.target_content_type_id = type.id
+    WHERE file.provider = 'osfstorage'
+    AND type.model = 'abstractnode'
+    AND file.deleted_on IS NULL
+    AND file.target_object_id=%s
+    AND obfnv.id > %s
+    ORDER BY obfnv.id
+    LIMIT %s) obfnv
+    LEFT JOIN osf_fileversion version ON obfnv.fileversion_id = version.id
+"""
+
+
+def compute_storage_usage(target_id, per_page=500000):
+    """Sum the size of every osfstorage file version on the target.
+
+    Pages through ``osf_basefileversionsthrough`` by primary key rather than OFFSET so that each
+    page is an index range scan, no matter how many versions the target has.
+    """
+    storage_usage_total = 0
+    last_id = 0
+    with connection.cursor() as cursor:
+        while True:
+            cursor.execute(STORAGE_USAGE_PAGE_SQL, [target_id, last_id, per_page])
+            max_id, count, size = cursor.fetchone()
+            storage_usage_total += int(size) if size else 0
+            if not count or count < per_page:
+                break
+            last_id = max_id
+    return storage_usage_total
 
 
 @app.task(max_retries=5, default_retry_delay=10)
 def update_storage_usage_cache(target_id, target_guid, per_page=500000):
     if not settings.ENABLE_STORAGE_USAGE_CACHE:
         return
-    sql = """
-        SELECT count(size), sum(size) from
-        (SELECT size FROM osf_basefileversionsthrough AS obfnv
-        LEFT JOIN osf_basefilenode file ON obfnv.basefilenode_id = file.id
-        LEFT JOIN osf_fileversion version ON obfnv.fileversion_id = version.id
-        LEFT JOIN django_content_type type on file.target_content_type_id = type.id
-        WHERE file.provider = 'osfstorage'
-        AND type.model = 'abstractnode'
-        AND file.deleted_on IS NULL
-        AND file.target_object_id=%s
-        ORDER BY version.id
-        LIMIT %s OFFSET %s) file_page
-    """
-    count = per_page
-    offset = 0
-    storage_usage_total = 0
-    with connection.cursor() as cursor:
-        while count:
-            cursor.execute(sql, [target_id, per_page, offset])
-            result = cursor.fetchall()
-            storage_usage_total += int(result[0][1]) if result[0][1] else 0
-            count = int(result[0][0]) if result[0][0] else 0
-            offset += count
+    storage_usage_total = compute_storage_usage(target_id, per_page=per_page)
 
     key = cache_settings.STORAGE_USAGE_KEY.format(target_id=target_guid)
     storage_usage_cache.set(key, storage_usage_total, settings.STORAGE_USAGE_CACHE_TIMEOUT)
+    return storage_usage_total
+
+
+def reconcile_storage_usage(target_id, target_guid, per_page=500000):
+    """Recompute the target's storage usage and overwrite the incrementally maintained counter.
+
+    Returns the drift between the recomputed total and the counter, or None if there was no
+    counter to compare against.
+    """
+    if not settings.ENABLE_STORAGE_USAGE_CACHE:
+        return None
+    key = cache_settings.STORAGE_USAGE_KEY.format(target_id=target_guid)
+    counted_usage = storage_usage_cache.get(key)
+    storage_usage_total = update_storage_usage_cache(target_id, target_guid, per_page=per_page)
+    if counted_usage is None:
+        return None
+
+    drift = storage_usage_total - counted_usage
+    if drift:
+        logger.warning('Storage usage for {} drifted by {} bytes (counter: {}, actual: {})'.format(
+            target_guid,
+            drift,
+            counted_usage,
+            storage_usage_total,
+        ))
+    return drift
 
 
 def update_storage_usage(target):
@@ -141,6 +279,39 @@ def update_storage_usage(target):
     if settings.ENABLE_STORAGE_USAGE_CACHE and not isinstance(target, Preprint) and not target.is_quickfiles:
         enqueue_postcommit_task(update_storage_usage_cache, (target.id, target._id,), {}, celery=True)
 
+
+def apply_storage_usage_delta(target, delta):
+    """Add ``delta`` bytes to the target's storage usage counter."""
+    apply_storage_usage_deltas([(target, delta)])
+
+
+def apply_storage_usage_deltas(deltas):
+    """Add each ``(target, delta)`` pair's bytes to its target's storage usage counter.
+
+    Counters are only ever seeded by a full computation; if one is missing, one is enqueued
+    instead of applying the delta to nothing. That includes counters culled from the database
+    cache once it holds more than STORAGE_USAGE_MAX_ENTRIES keys: culling ignores the counters'
+    lack of expiry, so a culled target is simply recomputed on its next file event.
+
+    Concurrent deltas for a target apply one after the other under a transaction-level advisory
+    lock, which only blocks other counter updates rather than every write to the target's row.
+    Locks are taken in pk order, so deltas for the same targets in opposite directions (e.g. two
+    moves between the same nodes) can't deadlock. ``incr`` is no help here, as the database cache
+    implements it as the same get and set (and resets the timeout while doing so).
+    """
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            for target_id in sorted({target.pk for target, _ in deltas}):
+                cursor.execute('SELECT pg_advisory_xact_lock(%s, %s)', [cache_settings.STORAGE_USAGE_LOCK_ID, target_id])
+        for target, delta in deltas:
+            key = cache_settings.STORAGE_USAGE_KEY.format(target_id=target._id)
+            current_usage = storage_usage_cache.get(key)
+            if current_usage is None:
+                update_storage_usage(target)
+                continue
+            storage_usage_cache.set(key, max(current_usage + delta, 0), settings.STORAGE_USAGE_CACHE_TIMEOUT)
+
+
 def update_storage_usage_with_size(payload):
     BaseFileNode = apps.get_model('osf.basefilenode')
     AbstractNode = apps.get_model('osf.abstractnode')
@@ -163,7 +334,6 @@ def update_storage_usage_with_size(payload):
     if target_node.storage_limit_status is settings.StorageLimits.NOT_CALCULATED:
         return update_storage_usage(target_node)
 
-    current_usage = target_node.storage_usage
     target_file = BaseFileNode.load(target_file_id)
 
     if target_file and action in ['copy', 'delete', 'move']:
@@ -171,33 +341,23 @@ def update_storage_usage_with_size(payload):
         target_file_size = target_file.versions.aggregate(Sum('size'))['size__sum'] or target_file_size
 
     if action in ['create', 'update', 'copy'] and provider == 'osfstorage':
-        current_usage += target_file_size
+        apply_storage_usage_delta(target_node, target_file_size)
 
     elif action == 'delete' and provider == 'osfstorage':
-        current_usage = max(current_usage - target_file_size, 0)
+        apply_storage_usage_delta(target_node, -target_file_size)
 
-    elif action in 'move':
+    elif action == 'move':
         source_node = AbstractNode.load(payload['source']['nid'])  # Getting the 'from' node
 
         source_provider = payload['source']['provider']
         if target_node == source_node and source_provider == provider:
             return  # Its not going anywhere.
+        deltas = []
         if source_provider == 'osfstorage' and not source_node.is_quickfiles:
-            if source_node.storage_limit_status is settings.StorageLimits.NOT_CALCULATED:
-                return update_storage_usage(source_node)
+            deltas.append((source_node, -target_file_size))
 
-            source_node_usage = source_node.storage_usage
-            source_node_usage = max(source_node_usage - target_file_size, 0)
-
-            key = cache_settings.STORAGE_USAGE_KEY.format(target_id=source_node._id)
-            storage_usage_cache.set(key, source_node_usage, settings.STORAGE_USAGE_CACHE_TIMEOUT)
-
-        current_usage += target_file_size
-
-        if provider != 'osfstorage':
-            return  # We don't want to update the destination node if the provider isn't osfstorage
-    else:
-        return
+        # We don't want to update the destination node if the provider isn't osfstorage
+        if provider == 'osfstorage':
+            deltas.append((target_node, target_file_size))
 
-    key = cache_settings.STORAGE_USAGE_KEY.format(target_id=target_node._id)
-    storage_usage_cache.set(key, current_usage, settings.STORAGE_USAGE_CACHE_TIMEOUT)
+        apply_storage_usage_deltas(deltas)
@@ -0,0 +1,113 @@
+from unittest import mock
+
+import pytest
+
+from api.base.api_globals import api_globals
+from api.caching import tasks
+from framework.postcommit_tasks.handlers import postcommit_before_request, postcommit_collection, postcommit_queue
+
+VARNISH = 'http://varnish:80'
+
+
+class FakeInstance:
+
+    def __init__(self, path):
+        self.absolute_api_v2_url = 'http://api.osf.io{}'.format(path)
+
+
+def ban(path):
+    return ('api.osf.io', '{}{}.*'.format(VARNISH, path))
+
+
+@pytest.fixture(autouse=True)
+def varnish_settings():
+    with mock.patch.object(tasks.settings, 'ENABLE_VARNISH', True), \
+            mock.patch.object(tasks.settings, 'VARNISH_SERVERS', [VARNISH]):
+        yield
+
+
+@pytest.fixture()
+def mock_request():
+    with mock.patch.object(tasks.requests, 'request') as mock_request:
+        mock_request.return_value.ok = True
+        yield mock_request
+
+
+class TestCoalesceBans:
+
+    def test_duplicates_are_dropped(self):
+        bans = [ban('/v2/nodes/abc12/'), ban('/v2/nodes/abc12/'), ban('/v2/users/def34/')]
+        assert sorted(tasks.coalesce_bans(bans)) == [ban('/v2/nodes/abc12/'), ban('/v2/users/def34/')]
+
+    def test_covered_bans_are_dropped(self):
+        bans = [ban('/v2/nodes/abc12/comments/'), ban('/v2/nodes/abc12/'), ban('/v2/nodes/abc123/')]
+        assert sorted(tasks.coalesce_bans(bans)) == [ban('/v2/nodes/abc12/'), ban('/v2/nodes/abc123/')]
+
+    def test_crowded_siblings_are_merged_into_parent(self):
+        bans = [ban('/v2/nodes/abc12/files/{}/'.format(i)) for i in range(30)]
+        assert tasks.coalesce_bans(bans) == [ban('/v2/nodes/abc12/files/')]
+
+    def test_resources_are_never_merged_into_a_list(self):
+        bans = [ban('/v2/nodes/node{}/'.format(i)) for i in range(30)]
+        assert len(tasks.coalesce_bans(bans)) == 30
+        bans = [ban('/v2/files/file{}/'.format(i)) for i in range(30)]
+        assert len(tasks.coalesce_bans(bans)) == 30
+
+    def test_servers_and_hosts_are_kept_apart(self):
+        bans = [
+            ban('/v2/nodes/abc12/'),
+            ('api.osf.io', 'http://varnish2:80/v2/nodes/abc12/.*'),
+            ('api.staging.osf.io', '{}/v2/nodes/abc12/.*'.format(VARNISH)),
+        ]
+        assert len(tasks.coalesce_bans(bans)) == 3
+
+
+class TestBanDispatch:
+
+    @pytest.fixture(autouse=True)
+    def postcommit(self):
+        postcommit_before_request()
+        with mock.patch.object(api_globals, 'request', mock.Mock()):
+            yield
+        postcommit_before_request()
+
+    def test_bans_are_sent_once_per_request(self, mock_request):
+        for _ in range(10):
+            tasks.enqueue_ban(FakeInstance('/v2/nodes/abc12/'))
+        tasks.enqueue_ban(FakeInstance('/v2/nodes/abc12/comments/'))
+        tasks.enqueue_ban(FakeInstance('/v2/users/def34/'))
+        assert not mock_request.called
+        assert len(postcommit_queue()) == 1
+
+        for task in postcommit_queue().values():
+            task()
+
+        banned = sorted(call[0][1] for call in mock_request.call_args_list)
+        assert banned == [
+            '{}/v2/nodes/abc12/.*'.format(VARNISH),
+            '{}/v2/users/def34/.*'.format(VARNISH),
+        ]
+
+    def test_bans_outside_of_a_request_are_sent_at_once(self, mock_request):
+        with mock.patch.object(api_globals, 'request', None):
+            tasks.enqueue_ban(FakeInstance('/v2/nodes/abc12/'))
+            assert postcommit_collection(tasks.VARNISH_BAN_COLLECTION) is None
+        assert [call[0][1] for call in mock_request.call_args_list] == ['{}/v2/nodes/abc12/.*'.format(VARNISH)]
+        assert not postcommit_queue()
+        assert postcommit_collection(tasks.VARNISH_BAN_COLLECTION) == []
+
+    def test_ban_metrics(self, mock_request):
+        with mock.patch.object(tasks, 'ban_metrics', tasks.Counter()) as metrics:
+            tasks.send_bans([ban('/v2/nodes/abc12/'), ban('/v2/nodes/abc12/'), ban('/v2/nodes/abc12/logs/')])
+        assert metrics == {'requested': 3, 'sent': 1, 'coalesced': 2, 'failed': 0}
+
+    def test_failed_bans_are_counted(self, mock_request):
+        mock_request.return_value.ok = False
+        with mock.patch.object(tasks, 'ban_metrics', tasks.Counter()) as metrics:
+            tasks.send_bans([ban('/v2/nodes/abc12/'), ban('/v2/users/def34/')])
+        assert metrics['failed'] == 2
+
+    def test_varnish_disabled(self, mock_request):
+        with mock.patch.object(tasks.settings, 'ENABLE_VARNISH', False):
+            tasks.enqueue_ban(FakeInstance('/v2/nodes/abc12/'))
+        assert not postcommit_queue()
@@ -5,7 +5,7 @@ from rest_framework import serializers as ser
 
 from api.base.serializers import BaseAPISerializer
 from api.base.utils import absolute_reverse
-from osf.metrics.counted_usage import CountedAuthUsage
+from osf.metrics.counted_usage import CountedAuthUsage, record_counted_usage
 from website import settings as website_settings
 
 logger = logging.getLogger(__name__)
@@ -63,7 +63,7 @@ class CountedAuthUsageSerializer(ser.Serializer):
         return data
 
     def create(self, validated_data):
-        return CountedAuthUsage.record(
+        return record_counted_usage(
             platform_iri=website_settings.DOMAIN,
             provider_id=validated_data.get('provider_id'),
             item_guid=validated_data.get('item_guid'),
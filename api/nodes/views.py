@@ -139,6 +139,7 @@ from framework.sentry import log_exception
 from osf.features import OSF_GROUPS
 from osf.models import (
     AbstractNode,
+    Contributor,
     OSFUser,
     Node,
     PrivateLink,
@@ -181,6 +182,8 @@ class NodeMixin(object):
         if self.kwargs.get('is_embedded') is True:
             # If this is an embedded request, the node might be cached somewhere
             node = self.request.parents[Node].get(self.kwargs[self.node_lookup_url_kwarg])
+            if node is None:
+                node = self.request.embedded_objects.get(self.kwargs[self.node_lookup_url_kwarg])
 
         node_id = node_id or self.kwargs[self.node_lookup_url_kwarg]
         if node is None:
@@ -198,6 +201,18 @@ class NodeMixin(object):
             self.check_object_permissions(self.request, node)
         return node
 
+    @classmethod
+    def get_embedded_objects(cls, request, view_kwargs_list):
+        """Load the nodes for many embedded requests with a single query. Deleted or missing
+        nodes are left out so that get_node raises the appropriate error for them.
+        """
+        node_ids = {view_kwargs.get(cls.node_lookup_url_kwarg) for view_kwargs in view_kwargs_list} - {None}
+        nodes = Node.objects.filter(
+            guids___id__in=node_ids,
+            is_deleted=False,
+        ).annotate(region=F('addons_osfstorage_node_settings__region___id')).exclude(region=None)
+        return {node._id: node for node in nodes}
+
 
 class DraftMixin(object):
 
@@ -434,6 +449,45 @@ class NodeContributorsList(BaseContributorList, bulk_views.BulkUpdateJSONAPIView
     def get_resource(self):
         return self.get_node()
 
+    @classmethod
+    def get_embedded_objects(cls, request, view_kwargs_list):
+        """Besides the nodes, load the contributors of every node at once, along with their users
+        as `UserMixin.get_user` would, for `?embed=contributors` on node lists.
+        """
+        embedded_objects = super().get_embedded_objects(request, view_kwargs_list)
+        nodes = {node.id: node for node in embedded_objects.values()}
+        contributors = list(
+            Contributor.objects.filter(node_id__in=nodes).order_by('node_id', '_order'),
+        )
+        users = OSFUser.objects.filter(
+            id__in={contributor.user_id for contributor in contributors},
+        ).annotate(
+            default_region=F('addons_osfstorage_user_settings__default_region___id'),
+        ).exclude(default_region=None).prefetch_related('guids').in_bulk()
+
+        contributors_by_node = {node._id: [] for node in nodes.values()}
+        for contributor in contributors:
+            contributor.node = nodes[contributor.node_id]
+            # Users without a default region are left for get_user to fail on as it would have
+            if contributor.user_id in users:
+                contributor.user = users[contributor.user_id]
+            contributors_by_node[contributor.node._id].append(contributor)
+        embedded_objects.update({
+            ('contributors', node_id): node_contributors
+            for node_id, node_contributors in contributors_by_node.items()
+        })
+        return embedded_objects
+
+    # overrides BaseContributorList
+    def get_default_queryset(self):
+        if self.kwargs.get('is_embedded') is True:
+            contributors = self.request.embedded_objects.get(('contributors', self.kwargs[self.node_lookup_url_kwarg]))
+            if contributors is not None:
+                # Still checks permissions to the node
+                self.get_node()
+                return list(contributors)
+        return super().get_default_queryset()
+
     # overrides ListBulkCreateJSONAPIView, BulkUpdateJSONAPIView, BulkDeleteJSONAPIView
     def get_serializer_class(self):
         """
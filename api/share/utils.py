@@ -5,11 +5,14 @@ SHARE/Trove accepts metadata records as "indexcards" in turtle format: https://w
 from functools import partial
 import logging
 import random
+import threading
 from urllib.parse import urljoin
 import uuid
 
 from celery.exceptions import Retry
 from django.apps import apps
+from django.conf import settings as django_conf_settings
+from django.core.cache import caches
 import requests
 
 from framework.celery_tasks import app as celery_app
@@ -17,12 +20,23 @@ from framework.celery_tasks.handlers import enqueue_task
 from framework.encryption import ensure_bytes
 from framework.sentry import log_exception
 from osf import models as osf_db
+from osf.metadata.gather import GatherSession
 from osf.metadata.tools import pls_gather_metadata_file
 from website import settings
 
 
 logger = logging.getLogger(__name__)
 
+_local = threading.local()
+
+# Set while an update for the guid is waiting out SHARE_UPDATE_COALESCE_SECONDS
+SHARE_UPDATE_PENDING_KEY = 'share_update_pending:{}'
+
+
+def share_update_cache():
+    """The cache of pending SHARE updates, shared by the workers that set and clear them"""
+    return caches[django_conf_settings.SHARE_UPDATE_CACHE_NAME]
+
 
 def shtrove_ingest_url():
     return f'{settings.SHARE_URL}api/v3/ingest'
@@ -59,16 +73,57 @@ def update_share(resource):
     _enqueue_update_share(resource)
 
 
+def update_share_batch(resources):
+    """update_share for many resources, pushed to SHARE/Trove SHARE_UPDATE_BATCH_SIZE at a time
+
+    Prefetch `guids` on `resources` to avoid a query per resource.
+    """
+    if not settings.SHARE_ENABLED:
+        return
+    _osfguid_values = []
+    for _resource in resources:
+        _guid = _resource.guids.first()
+        if not _guid:
+            logger.warning(f'update_share skipping resource that has no guids: {_resource}')
+            continue
+        _osfguid_values.append(_guid._id)
+        if isinstance(_resource, (osf_db.AbstractNode, osf_db.Preprint)):
+            enqueue_task(async_update_resource_share.s(_guid._id))
+    _batch_size = settings.SHARE_UPDATE_BATCH_SIZE
+    for _start in range(0, len(_osfguid_values), _batch_size):
+        enqueue_task(task__update_share_batch.s(_osfguid_values[_start:_start + _batch_size]))
+
+
 def _enqueue_update_share(osfresource):
     _osfguid_value = osfresource.guids.values_list('_id', flat=True).first()
     if not _osfguid_value:
         logger.warning(f'update_share skipping resource that has no guids: {osfresource}')
         return
-    enqueue_task(task__update_share.s(_osfguid_value))
+    if settings.SHARE_UPDATE_COALESCE_SECONDS:
+        _enqueue_coalesced_update_share(_osfguid_value)
+    else:
+        enqueue_task(task__update_share.s(_osfguid_value))
     if isinstance(osfresource, (osf_db.AbstractNode, osf_db.Preprint)):
         enqueue_task(async_update_resource_share.s(_osfguid_value))
 
 
+def _enqueue_coalesced_update_share(osfguid: str):
+    # scheduled from a task, so the pending marker is only set once the request's tasks are dispatched
+    enqueue_task(task__schedule_update_share.si(osfguid))
+
+
+def share_session():
+    """A requests.Session per thread, so pushes to SHARE/Trove reuse pooled connections"""
+    _session = getattr(_local, 'session', None)
+    if _session is None:
+        _session = _local.session = requests.Session()
+    return _session
+
+
+def _retry_countdown(retries):
+    return (random.random() + 1) * min(60 + settings.CELERY_RETRY_BACKOFF_BASE ** retries, 60 * 10)
+
+
 @celery_app.task(bind=True, max_retries=4, acks_late=True)
 def task__update_share(self, guid: str, is_backfill=False):
     """
@@ -87,7 +142,7 @@ def task__update_share(self, guid: str, is_backfill=False):
             try:
                 self.retry(
                     exc=e,
-                    countdown=(random.random() + 1) * min(60 + settings.CELERY_RETRY_BACKOFF_BASE ** self.request.retries, 60 * 10),
+                    countdown=_retry_countdown(self.request.retries),
                 )
             except Retry:  # Retry is only raise after > 5 retries
                 log_exception()
@@ -97,19 +152,77 @@ def task__update_share(self, guid: str, is_backfill=False):
     return resp
 
 
-def pls_send_trove_indexcard(osf_item, *, is_backfill=False):
+@celery_app.task(acks_late=True)
+def task__schedule_update_share(osfguid: str):
+    """Push `osfguid` once SHARE_UPDATE_COALESCE_SECONDS have passed, unless a push is already waiting
+
+    The waiting push reads the resource when it runs, so it carries any later changes too.
+    """
+    _window = settings.SHARE_UPDATE_COALESCE_SECONDS
+    # expiring only risks a duplicate push, so a short margin past the window is enough
+    if share_update_cache().add(SHARE_UPDATE_PENDING_KEY.format(osfguid), True, _window * 2):
+        task__update_share_batch.apply_async(args=([osfguid],), countdown=_window)
+
+
+@celery_app.task(bind=True, max_retries=4, acks_late=True)
+def task__update_share_batch(self, guids, is_backfill=False):
+    """
+    Like task__update_share, for many guids at once: duplicates are pushed once, the guids and
+    their referents are loaded together and the requests share one pooled session.
+    Only the guids that failed with a server error are retried.
+    :param self:
+    :param guids: list of osfguids
+    :return: dict of osfguid to response status code
+    """
+    _osfguids = list(dict.fromkeys(_guid.lower() for _guid in guids))
+    if settings.SHARE_UPDATE_COALESCE_SECONDS:
+        # later changes need a new push, since this one may read the resources before they land
+        share_update_cache().delete_many([SHARE_UPDATE_PENDING_KEY.format(_osfguid) for _osfguid in _osfguids])
+    _status_codes = {}
+    _retry_osfguids = []
+    for _osfguid, _push in _iter_update_share_batch(_osfguids, is_backfill=is_backfill):
+        try:
+            resp = _push()
+            _status_codes[_osfguid] = resp.status_code
+            resp.raise_for_status()
+        except requests.RequestException as e:
+            # connection errors (no response) and server errors are worth another try
+            _status_codes.setdefault(_osfguid, None)
+            _is_retryable = e.response is None or e.response.status_code >= 500
+            if _is_retryable and self.request.retries < self.max_retries:
+                _retry_osfguids.append(_osfguid)
+            else:
+                log_exception()
+        except Exception:
+            _status_codes.setdefault(_osfguid, None)
+            log_exception()
+    if _retry_osfguids:
+        try:
+            self.retry(
+                # replace both, since retry reuses the request's args and kwargs unless given
+                args=(_retry_osfguids,),
+                kwargs={'is_backfill': is_backfill},
+                countdown=_retry_countdown(self.request.retries),
+            )
+        except Retry:  # Retry is only raise after > 5 retries
+            log_exception()
+
+    return _status_codes
+
+
+def pls_send_trove_indexcard(osf_item, *, is_backfill=False, record_identifier=None, gather_session=None):
     try:
         _iri = osf_item.get_semantic_iri()
     except (AttributeError, ValueError):
         raise ValueError(f'could not get iri for {osf_item}')
-    _metadata_record = pls_gather_metadata_file(osf_item, 'turtle')
+    _metadata_record = pls_gather_metadata_file(osf_item, 'turtle', gather_session=gather_session)
     _queryparams = {
         'focus_iri': _iri,
-        'record_identifier': _shtrove_record_identifier(osf_item),
+        'record_identifier': record_identifier or _shtrove_record_identifier(osf_item),
     }
     if is_backfill:
         _queryparams['nonurgent'] = True
-    return requests.post(
+    return share_session().post(
         shtrove_ingest_url(),
         params=_queryparams,
         headers={
@@ -120,11 +233,11 @@ def pls_send_trove_indexcard(osf_item, *, is_backfill=False):
     )
 
 
-def pls_delete_trove_indexcard(osf_item):
-    return requests.delete(
+def pls_delete_trove_indexcard(osf_item, *, record_identifier=None):
+    return share_session().delete(
         shtrove_ingest_url(),
         params={
-            'record_identifier': _shtrove_record_identifier(osf_item),
+            'record_identifier': record_identifier or _shtrove_record_identifier(osf_item),
         },
         headers=_shtrove_auth_headers(osf_item),
     )
@@ -144,6 +257,59 @@ def _do_update_share(osfguid: str, *, is_backfill=False):
     return _response
 
 
+def _iter_update_share_batch(osfguids, *, is_backfill=False):
+    """Yield (osfguid, push) for each of `osfguids`, loading all the guids and referents up front
+
+    calling `push` sends the request and returns its response, so errors can be handled per guid
+    """
+    Guid = apps.get_model('osf.Guid')
+    _guid_instances = {
+        _guid._id: _guid
+        for _guid in Guid.objects.filter(_id__in=osfguids).prefetch_related('referent')
+    }
+    # the record identifier of each referent is its latest guid (see _shtrove_record_identifier)
+    _record_identifiers = {}
+    _latest_guids = (
+        Guid.objects
+        .filter(
+            content_type_id__in={_guid.content_type_id for _guid in _guid_instances.values()},
+            object_id__in={_guid.object_id for _guid in _guid_instances.values()},
+        )
+        .order_by('-created')
+        .values_list('content_type_id', 'object_id', '_id')
+    )
+    for _content_type_id, _object_id, _osfguid in _latest_guids:
+        _record_identifiers.setdefault((_content_type_id, _object_id), _osfguid)
+    # metadata shared by items in the batch (like their creators) is gathered once
+    _gather_session = GatherSession()
+    for _osfguid in osfguids:
+        _guid_instance = _guid_instances.get(_osfguid)
+        _resource = _guid_instance and _guid_instance.referent
+        if _resource is None:
+            logger.warning(f'update_share skipping unknown osfguid "{_osfguid}"')
+            continue
+        _record_identifier = _record_identifiers.get((_guid_instance.content_type_id, _guid_instance.object_id))
+        logger.debug('%s._iter_update_share_batch("%s", is_backfill=%s)', __name__, _osfguid, is_backfill)
+        yield _osfguid, partial(
+            _push_trove_indexcard,
+            _resource,
+            is_backfill=is_backfill,
+            record_identifier=_record_identifier,
+            gather_session=_gather_session,
+        )
+
+
+def _push_trove_indexcard(osf_item, *, is_backfill, record_identifier, gather_session):
+    if _should_delete_indexcard(osf_item):
+        return pls_delete_trove_indexcard(osf_item, record_identifier=record_identifier)
+    return pls_send_trove_indexcard(
+        osf_item,
+        is_backfill=is_backfill,
+        record_identifier=record_identifier,
+        gather_session=gather_session,
+    )
+
+
 def _shtrove_record_identifier(osf_item):
     return osf_item.guids.values_list('_id', flat=True).first()
 
@@ -567,7 +733,7 @@ def async_update_resource_share(self, guid, old_subjects=None):
             try:
                 self.retry(
                     exc=e,
-                    countdown=(random.random() + 1) * min(60 + settings.CELERY_RETRY_BACKOFF_BASE ** self.request.retries, 60 * 10),
+                    countdown=_retry_countdown(self.request.retries),
                 )
             except Retry:  # Retry is only raise after > 5 retries
                 log_exception()
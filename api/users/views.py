@@ -111,6 +111,9 @@ class UserMixin(object):
             if user._id == key:
                 if check_permissions:
                     self.check_object_permissions(self.request, user)
+                if getattr(user, 'default_region', None) is not None:
+                    # Already annotated, see NodeContributorsList.get_embedded_objects
+                    return user
                 return get_object_or_error(
                     OSFUser.objects.filter(id=user.id).annotate(default_region=F('addons_osfstorage_user_settings__default_region___id')).exclude(default_region=None),
                     request=self.request,
@@ -0,0 +1,78 @@
+from unittest import mock
+
+import pytest
+
+from api.base import serializers as base_serializers
+from api.base.settings.defaults import API_BASE
+from osf_tests.factories import (
+    AuthUserFactory,
+    ProjectFactory,
+    NodeFactory,
+)
+
+
+class _UncachedRules(dict):
+    """Rule table that never stores, forcing a resolve() per relationship like the old implementation"""
+    def __setitem__(self, key, value):
+        pass
+
+
+@pytest.fixture()
+def user():
+    return AuthUserFactory()
+
+
+@pytest.fixture()
+def nodes(user):
+    projects = [ProjectFactory(creator=user, is_public=True) for _ in range(20)]
+    for project in projects[:10]:
+        NodeFactory(parent=project, creator=user, is_public=True)
+    return projects
+
+
+@pytest.mark.django_db
+class TestRelationshipDataRules:
+
+    @pytest.fixture()
+    def url(self):
+        return '/{}nodes/?page[size]=100'.format(API_BASE)
+
+    def test_rule_table_matches_resolve(self, app, user, nodes, url):
+        with mock.patch.object(base_serializers, '_RELATIONSHIP_DATA_RULES', _UncachedRules()):
+            uncached = app.get(url, auth=user.auth).json['data']
+        with mock.patch.object(base_serializers, '_RELATIONSHIP_DATA_RULES', {}) as rules:
+            cached = app.get(url, auth=user.auth).json['data']
+            assert rules
+
+        assert len(cached) == len(uncached)
+        for cached_node, uncached_node in zip(cached, uncached):
+            assert cached_node['relationships'] == uncached_node['relationships']
+
+    def test_rule_is_computed_once_per_view(self, app, user, nodes, url):
+        with mock.patch.object(base_serializers, '_RELATIONSHIP_DATA_RULES', {}):
+            with mock.patch.object(base_serializers, 'resolve', wraps=base_serializers.resolve) as mock_resolve:
+                app.get(url, auth=user.auth)
+                assert mock_resolve.called
+                mock_resolve.reset_mock()
+                app.get(url, auth=user.auth)
+                assert not mock_resolve.called
+
+    def test_relationship_data_rule_types(self):
+        from api.nodes.views import NodeDetail, NodeStorage, NodeCitationDetail, NodeChildrenList
+        assert base_serializers._relationship_data_rule(NodeDetail, 'nodes') == ('nodes', ('node_id',))
+        assert base_serializers._relationship_data_rule(NodeStorage, 'nodes') == ('node-storage', ('node_id',))
+        assert base_serializers._relationship_data_rule(NodeCitationDetail, 'nodes') == ('citation', ('node_id',))
+        assert base_serializers._relationship_data_rule(NodeChildrenList, 'nodes') is None
+
+    def test_node_list_resolves_each_view_once(self, app, user, nodes, url):
+        with mock.patch.object(base_serializers, '_RELATIONSHIP_DATA_RULES', _UncachedRules()), \
+                mock.patch.object(base_serializers, 'resolve', wraps=base_serializers.resolve) as mock_resolve:
+            uncached_res = app.get(url, auth=user.auth)
+        uncached_calls = mock_resolve.call_count
+        with mock.patch.object(base_serializers, '_RELATIONSHIP_DATA_RULES', {}) as rules, \
+                mock.patch.object(base_serializers, 'resolve', wraps=base_serializers.resolve) as mock_resolve:
+            cached_res = app.get(url, auth=user.auth)
+            # one resolve() per related view, however many nodes are listed
+            assert mock_resolve.call_count <= len(rules)
+        assert uncached_calls >= len(nodes)
+        assert cached_res.json['data'] == uncached_res.json['data']
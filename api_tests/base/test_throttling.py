@@ -1,9 +1,16 @@
+import threading
+
 import mock
 from nose.tools import *  # noqa:
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from rest_framework.throttling import UserRateThrottle
 
+from api.base import settings
 from api.base.settings.defaults import API_BASE
+from api.base.throttling import BaseThrottle
 
-from tests.base import ApiTestCase
+from tests.base import ApiTestCase, fake
 from osf_tests.factories import AuthUserFactory, ProjectFactory
 
 class TestDefaultThrottleClasses(ApiTestCase):
@@ -140,3 +147,65 @@ class TestAddContributorEmailThrottle(ApiTestCase):
         assert_equal(mock_anon_allow.call_count, 2)
         assert_equal(mock_user_allow.call_count, 1)
         assert_equal(mock_contrib_allow.call_count, 1)
+
+
+class AtomicCounterThrottle(BaseThrottle, UserRateThrottle):
+
+    scope = 'test-atomic'
+    rate = '5/minute'
+    atomic_counters = True
+
+
+class TestAtomicCounterThrottle(ApiTestCase):
+
+    def setUp(self):
+        super(TestAtomicCounterThrottle, self).setUp()
+        # Requests are identified by their throttle token, which keeps each test on its own counters
+        self.request = Request(APIRequestFactory().get('/', HTTP_X_THROTTLE_TOKEN=fake.md5()))
+
+    def allow_request_at(self, now):
+        throttle = AtomicCounterThrottle()
+        throttle.timer = lambda: now
+        return throttle.allow_request(self.request, None), throttle
+
+    def test_concurrent_requests_never_exceed_the_rate(self):
+        allowed = []
+        barrier = threading.Barrier(20)
+
+        def make_request():
+            barrier.wait()
+            allowed.append(AtomicCounterThrottle().allow_request(self.request, None))
+
+        threads = [threading.Thread(target=make_request) for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert_equal(allowed.count(True), 5)
+        assert_equal(allowed.count(False), 15)
+
+    def test_sliding_window(self):
+        start = 60 * 1000
+        assert_equal([self.allow_request_at(start + i)[0] for i in range(6)], [True] * 5 + [False])
+        # Half way through the next window, half of the previous window's requests still count
+        assert_equal([self.allow_request_at(start + 90 + i)[0] for i in range(4)], [True] * 2 + [False] * 2)
+        assert_equal([self.allow_request_at(start + 240 + i)[0] for i in range(6)], [True] * 5 + [False])
+
+    def test_counters_are_fixed_size(self):
+        start = 60 * 1000
+        for i in range(20):
+            allowed, throttle = self.allow_request_at(start + i)
+        assert_equal(throttle.cache.get('{}:{}'.format(throttle.key, 1000)), 5)
+
+    def test_wait(self):
+        start = 60 * 1000
+        for i in range(5):
+            self.allow_request_at(start)
+        allowed, throttle = self.allow_request_at(start + 20)
+        assert_false(allowed)
+        assert_equal(throttle.wait(), 40)
+
+    def test_bypass_token(self):
+        request = Request(APIRequestFactory().get('/', HTTP_X_THROTTLE_TOKEN=settings.BYPASS_THROTTLE_TOKEN))
+        assert_true(all(AtomicCounterThrottle().allow_request(request, None) for _ in range(10)))
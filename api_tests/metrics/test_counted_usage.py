@@ -11,6 +11,8 @@ from osf_tests.factories import (
     # UserFactory,
 )
 from api_tests.utils import create_test_file
+from osf.metrics import counted_usage
+from osf.metrics.counted_usage import CountedAuthUsage, fill_counted_usages
 
 
 COUNTED_USAGE_URL = '/_/metrics/events/counted_usage/'
@@ -351,3 +353,119 @@ class TestGuidFields:
                 'surrounding_guids': None,
             },
         )
+
+
+@pytest.mark.django_db
+class TestBufferedIngestion:
+    @pytest.fixture(autouse=True)
+    def buffer(self):
+        buffer = counted_usage.CountedUsageBuffer()
+        with mock.patch.object(counted_usage, 'counted_usage_buffer', buffer), \
+                mock.patch.object(counted_usage.settings, 'COUNTED_USAGE_BUFFER_SIZE', 3), \
+                mock.patch.object(counted_usage.settings, 'COUNTED_USAGE_BUFFER_SECONDS', 60):
+            yield buffer
+
+    @pytest.fixture(autouse=True)
+    def mock_domain(self):
+        with mock.patch('api.metrics.serializers.website_settings.DOMAIN', new='http://example.foo/'):
+            yield
+
+    @pytest.fixture(autouse=True)
+    def mock_now(self):
+        timestamp = datetime(1981, 1, 1, 0, 1, 31, tzinfo=timezone.utc)
+        with mock.patch('django.utils.timezone.now', return_value=timestamp):
+            yield timestamp
+
+    @pytest.fixture()
+    def bulk_actions(self):
+        actions = []
+        with mock.patch.object(counted_usage, 'bulk', side_effect=lambda client, batch: actions.extend(batch)):
+            yield actions
+
+    @pytest.fixture()
+    def preprint(self):
+        return PreprintFactory(is_public=True, is_published=True)
+
+    def test_usages_are_written_in_bulk(self, app, mock_save, bulk_actions, buffer):
+        payload = counted_usage_payload(
+            client_session_id='hello',
+            item_guid='zyxwv',
+            action_labels=['view', 'api'],
+            pageview_info={'page_url': 'http://example.foo/blahblah/blee'},
+        )
+        for _ in range(2):
+            resp = app.post_json_api(COUNTED_USAGE_URL, payload, headers={'User-Agent': 'haha'})
+            assert resp.status_code == 201
+        assert len(buffer) == 2
+        assert bulk_actions == []
+
+        resp = app.post_json_api(COUNTED_USAGE_URL, payload, headers={'User-Agent': 'haha'})
+        assert resp.status_code == 201
+        assert len(buffer) == 0
+        assert not mock_save.called
+        assert len(bulk_actions) == 3
+        for action in bulk_actions:
+            # same document id as a single save, so the repeated usages still land on one document
+            assert action['_id'] == '55fffffdc0d674d15a5e8763d14e4ae90f658fbfb6fbf94f88a5d24978f02e72'
+            assert action['_index'] == CountedAuthUsage.get_index_name(datetime(1981, 1, 1, tzinfo=timezone.utc))
+            assert action['_source']['pageview_info']['page_path'] == '/blahblah/blee'
+
+    def test_buffer_is_flushed_after_buffer_seconds(self, buffer, bulk_actions):
+        with mock.patch.object(counted_usage.threading, 'Timer') as mock_timer:
+            for _ in range(2):
+                buffer.add(CountedAuthUsage(
+                    timestamp=datetime(1981, 1, 1, tzinfo=timezone.utc),
+                    platform_iri='http://example.foo/',
+                    item_guid='zyxwv',
+                    session_id='hello',
+                ))
+        mock_timer.assert_called_once_with(60, buffer.flush, kwargs={'queue': True})
+        assert len(buffer) == 2
+        assert bulk_actions == []
+
+        # the timer fires without waiting for another usage to be added
+        buffer.flush(**mock_timer.call_args[1]['kwargs'])
+        assert len(buffer) == 0
+        assert len(bulk_actions) == 2
+
+    def test_timer_is_cancelled_when_full(self, buffer, bulk_actions):
+        with mock.patch.object(counted_usage.threading, 'Timer') as mock_timer:
+            for _ in range(3):
+                buffer.add(CountedAuthUsage(timestamp=datetime(1981, 1, 1, tzinfo=timezone.utc), item_guid='zyxwv'))
+        assert mock_timer.return_value.cancel.called
+        assert len(bulk_actions) == 3
+
+    def test_flush(self, buffer, bulk_actions):
+        buffer.add(CountedAuthUsage(timestamp=datetime(1981, 1, 1, tzinfo=timezone.utc), item_guid='zyxwv'))
+        buffer.flush()
+        assert len(bulk_actions) == 1
+        buffer.flush()
+        assert len(bulk_actions) == 1
+
+    def test_fill_matches_autofill(self, preprint):
+        file_guid = preprint.primary_file.get_guid(create=True)._id
+
+        def usages():
+            return [
+                CountedAuthUsage(
+                    timestamp=datetime(1981, 1, 1, 0, minute, tzinfo=timezone.utc),
+                    platform_iri='http://example.foo/',
+                    session_id='hello',
+                    item_guid=item_guid,
+                    action_labels=['view', 'web'],
+                    pageview_info={'page_url': 'http://example.foo/{}/'.format(item_guid)},
+                )
+                for minute, item_guid in enumerate([preprint._id, file_guid, preprint._id, 'nopes', file_guid.upper()])
+            ]
+
+        filled = usages()
+        with mock.patch.object(counted_usage, '_get_osfguid_info', wraps=counted_usage._get_osfguid_info) as mock_info:
+            fill_counted_usages(filled)
+        assert mock_info.call_count == 2
+
+        autofilled = usages()
+        for usage in autofilled:
+            counted_usage._autofill_fields(CountedAuthUsage, usage)
+        assert [usage.meta.id for usage in filled] == [usage.meta.id for usage in autofilled]
+        assert [usage.to_dict() for usage in filled] == [usage.to_dict() for usage in autofilled]
+
@@ -1,7 +1,12 @@
 import functools
+from unittest import mock
+
 import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
 from api.base.settings.defaults import API_BASE
+from api.nodes.views import NodeContributorsList, NodeDetail
 from framework.auth.core import Auth
 from osf_tests.factories import (
     ProjectFactory,
@@ -155,3 +160,32 @@ class TestNodeEmbeds:
         res = app.get(url, auth=write_contrib_one.auth)
         assert res.status_code == 200
         assert res.json['data']['embeds']['contributors']['meta']['total_bibliographic'] == 3
+
+    @pytest.mark.parametrize('embed', ['parent', 'contributors'])
+    def test_node_list_embeds_are_loaded_in_bulk(
+            self, app, user, make_public_node, root_node, child_one, child_two,
+            embed, django_assert_max_num_queries):
+        for _ in range(3):
+            make_public_node(parent=root_node)
+        url = '/{}users/{}/nodes/?embed={}'.format(API_BASE, user._id, embed)
+        app.get(url, auth=user.auth)  # warm up per-process caches
+
+        with mock.patch.object(NodeDetail, 'batch_embeds', False), \
+                mock.patch.object(NodeContributorsList, 'batch_embeds', False), \
+                CaptureQueriesContext(connection) as per_item_queries:
+            per_item = app.get(url, auth=user.auth)
+        embedded = [node for node in per_item.json['data'] if 'embeds' in node]
+        assert len(embedded) >= 5
+
+        # one query for the whole page instead of (at least) one per embedding node
+        with django_assert_max_num_queries(len(per_item_queries) - len(embedded) + 1):
+            res = app.get(url, auth=user.auth)
+        assert res.json == per_item.json
+
+    def test_node_list_embeds_keep_per_item_errors(self, app, user, write_contrib_one, subchild, child_two):
+        url = '/{}users/{}/nodes/?embed=parent&embed=contributors'.format(API_BASE, write_contrib_one._id)
+        res = app.get(url, auth=write_contrib_one.auth)
+        embeds = {node['id']: node['embeds'] for node in res.json['data'] if 'embeds' in node}
+        assert embeds[subchild._id]['parent']['errors'][0]['detail'] == exceptions.PermissionDenied.default_detail
+        contributor_ids = [contributor['id'] for contributor in embeds[subchild._id]['contributors']['data']]
+        assert '{}-{}'.format(subchild._id, write_contrib_one._id) in contributor_ids
@@ -1,7 +1,9 @@
 import pytest
+from unittest import mock
 
 from django.core.management import call_command
 
+from api_tests.share._utils import expect_ingest_request
 from osf_tests.factories import (
     PreprintFactory,
     PreprintProviderFactory,
@@ -34,10 +36,26 @@ class TestReindexProvider:
     def user(self):
         return AuthUserFactory()
 
-    def test_reindex_provider_preprint(self, mock_update_share, preprint_provider, preprint):
-        call_command('reindex_provider', f'--providers={preprint_provider._id}')
-        assert mock_update_share.called_once_with(preprint)
-
-    def test_reindex_provider_registration(self, mock_update_share, registration_provider, registration):
-        call_command('reindex_provider', f'--providers={registration_provider._id}')
-        assert mock_update_share.called_once_with(registration)
+    @pytest.mark.enable_enqueue_task
+    def test_reindex_provider_preprint(self, mock_share_responses, preprint_provider, preprint):
+        with expect_ingest_request(mock_share_responses, preprint._id, token=preprint_provider.access_token):
+            call_command('reindex_provider', f'--providers={preprint_provider._id}')
+
+    @pytest.mark.enable_enqueue_task
+    def test_reindex_provider_registration(self, mock_share_responses, registration_provider, registration):
+        with expect_ingest_request(
+            mock_share_responses,
+            registration._id,
+            token=registration_provider.access_token,
+            delete=not registration.is_public,
+        ):
+            call_command('reindex_provider', f'--providers={registration_provider._id}')
+
+    def test_reindex_provider_batches(self, mock_share_responses, preprint_provider, preprint):
+        others = [PreprintFactory(provider=preprint_provider) for _ in range(2)]
+        with mock.patch('website.settings.SHARE_UPDATE_BATCH_SIZE', 2), \
+                mock.patch('api.share.utils.task__update_share_batch') as mock_batch_task:
+            call_command('reindex_provider', f'--providers={preprint_provider._id}')
+        batches = [_call[0][0] for _call in mock_batch_task.s.call_args_list]
+        assert sorted(sum(batches, [])) == sorted([preprint._id, *(other._id for other in others)])
+        assert [len(batch) for batch in batches] == [2, 1]
@@ -0,0 +1,182 @@
+import threading
+from unittest import mock
+from urllib.parse import urlsplit
+
+import pytest
+import requests
+import responses
+from django.core.cache.backends.locmem import LocMemCache
+from django.http import QueryDict
+
+from api.share import utils as share_utils
+from api.share.utils import shtrove_ingest_url, task__schedule_update_share, task__update_share_batch, update_share
+from osf.models import Guid
+from osf_tests.factories import ProjectFactory
+from website import settings
+
+
+def _record_identifiers(mock_share_responses, method='POST'):
+    return [
+        QueryDict(urlsplit(_call.request.path_url).query)['record_identifier']
+        for _call in mock_share_responses.calls
+        if _call.request.url.startswith(shtrove_ingest_url()) and _call.request.method == method
+    ]
+
+
+@pytest.mark.django_db
+class TestUpdateShareBatch:
+
+    @pytest.fixture()
+    def projects(self):
+        return [ProjectFactory(is_public=True) for _ in range(3)]
+
+    def test_each_guid_pushed_once(self, mock_share_responses, projects):
+        _guids = [projects[0]._id, projects[1]._id, projects[0]._id.upper(), projects[2]._id, projects[1]._id]
+        task__update_share_batch.apply(kwargs={'guids': _guids})
+        assert _record_identifiers(mock_share_responses) == [project._id for project in projects]
+
+    def test_private_resources_are_deleted(self, mock_share_responses, projects):
+        projects[1].is_public = False
+        projects[1].save()
+        task__update_share_batch.apply(kwargs={'guids': [project._id for project in projects]})
+        assert _record_identifiers(mock_share_responses) == [projects[0]._id, projects[2]._id]
+        assert _record_identifiers(mock_share_responses, method='DELETE') == [projects[1]._id]
+
+    def test_unknown_guids_are_skipped(self, mock_share_responses, projects):
+        result = task__update_share_batch.apply(kwargs={'guids': ['notaguid', projects[0]._id]}).get()
+        assert result == {projects[0]._id: 200}
+
+    def test_guids_are_loaded_together(self, mock_share_responses, projects):
+        with mock.patch.object(Guid, 'load', wraps=Guid.load) as mock_load:
+            task__update_share_batch.apply(kwargs={'guids': [project._id for project in projects]})
+        assert not mock_load.called
+        assert len(_record_identifiers(mock_share_responses)) == len(projects)
+
+    def test_session_is_reused(self, mock_share_responses, projects):
+        with mock.patch.object(share_utils, '_local', threading.local()), \
+                mock.patch.object(share_utils.requests, 'Session', wraps=requests.Session) as mock_session:
+            task__update_share_batch.apply(kwargs={'guids': [project._id for project in projects]})
+            task__update_share_batch.apply(kwargs={'guids': [projects[0]._id]})
+        assert mock_session.call_count == 1
+        assert len(_record_identifiers(mock_share_responses)) == 4
+
+    def test_only_server_errors_are_retried(self, mock_share_responses, projects):
+        def _respond(request):
+            _record_identifier = QueryDict(urlsplit(request.path_url).query)['record_identifier']
+            return {
+                projects[0]._id: (500, {}, ''),
+                projects[1]._id: (400, {}, ''),
+            }.get(_record_identifier, (200, {}, ''))
+        mock_share_responses.replace(responses.POST, shtrove_ingest_url())
+        mock_share_responses.add_callback(responses.POST, shtrove_ingest_url(), callback=_respond)
+
+        with mock.patch.object(task__update_share_batch, 'retry') as mock_retry, \
+                mock.patch.object(share_utils, 'log_exception') as mock_log_exception:
+            # called positionally, as update_share_batch and the coalesced push do
+            result = task__update_share_batch.apply(args=([project._id for project in projects],)).get()
+
+        assert result == {projects[0]._id: 500, projects[1]._id: 400, projects[2]._id: 200}
+        assert mock_log_exception.call_count == 1
+        # retry replaces both args and kwargs, so the guids are not passed twice
+        _retry_kwargs = mock_retry.call_args[1]
+        assert _retry_kwargs['args'] == ([projects[0]._id],)
+        assert _retry_kwargs['kwargs'] == {'is_backfill': False}
+        mock_share_responses.calls.reset()
+        task__update_share_batch.apply(args=_retry_kwargs['args'], kwargs=_retry_kwargs['kwargs'])
+        assert _record_identifiers(mock_share_responses) == [projects[0]._id]
+
+    def test_request_errors_do_not_stop_the_batch(self, mock_share_responses, projects):
+        def _respond(request):
+            _record_identifier = QueryDict(urlsplit(request.path_url).query)['record_identifier']
+            if _record_identifier == projects[0]._id:
+                raise requests.ConnectionError('nope')
+            return (200, {}, '')
+        mock_share_responses.replace(responses.POST, shtrove_ingest_url())
+        mock_share_responses.add_callback(responses.POST, shtrove_ingest_url(), callback=_respond)
+
+        with mock.patch.object(task__update_share_batch, 'retry') as mock_retry:
+            result = task__update_share_batch.apply(args=([project._id for project in projects],)).get()
+
+        assert result == {projects[0]._id: None, projects[1]._id: 200, projects[2]._id: 200}
+        assert mock_retry.call_args[1]['args'] == ([projects[0]._id],)
+
+
+@pytest.mark.django_db
+class TestCoalescedUpdateShare:
+
+    @pytest.fixture(autouse=True)
+    def coalesce(self):
+        with mock.patch.object(settings, 'SHARE_ENABLED', True), \
+                mock.patch.object(settings, 'SHARE_UPDATE_COALESCE_SECONDS', 10):
+            yield
+
+    @pytest.fixture()
+    def mock_enqueue_task(self):
+        with mock.patch.object(share_utils, 'enqueue_task') as mock_enqueue:
+            yield mock_enqueue
+
+    @pytest.fixture()
+    def mock_apply_async(self):
+        with mock.patch.object(task__update_share_batch, 'apply_async') as mock_apply_async:
+            yield mock_apply_async
+
+    def _schedule_signatures(self, mock_enqueue_task):
+        return [
+            _call[0][0] for _call in mock_enqueue_task.call_args_list
+            if _call[0][0].task == task__schedule_update_share.name
+        ]
+
+    def _is_pending(self, project, cache=None):
+        cache = cache or share_utils.share_update_cache()
+        return cache.get(share_utils.SHARE_UPDATE_PENDING_KEY.format(project._id)) is not None
+
+    def test_updates_within_window_are_coalesced(self, mock_enqueue_task, mock_apply_async, mock_share_responses):
+        project = ProjectFactory(is_public=True)
+        for _ in range(3):
+            update_share(project)
+        for _signature in self._schedule_signatures(mock_enqueue_task):
+            _signature.apply()
+
+        mock_apply_async.assert_called_once_with(args=([project._id],), countdown=10)
+
+        # once the waiting push runs, the next update needs a push of its own
+        task__update_share_batch.apply(args=mock_apply_async.call_args[1]['args'])
+        assert _record_identifiers(mock_share_responses) == [project._id]
+        update_share(project)
+        self._schedule_signatures(mock_enqueue_task)[-1].apply()
+        assert mock_apply_async.call_count == 2
+
+    def test_discarded_updates_leave_nothing_pending(self, mock_enqueue_task, mock_apply_async):
+        project = ProjectFactory(is_public=True)
+        # e.g. the request failed, so its queued tasks were thrown away
+        update_share(project)
+        assert not self._is_pending(project)
+
+        update_share(project)
+        self._schedule_signatures(mock_enqueue_task)[-1].apply()
+        assert self._is_pending(project)
+        assert mock_apply_async.call_count == 1
+
+    def test_pending_updates_are_shared_between_processes(self, mock_enqueue_task, mock_apply_async, mock_share_responses):
+        # like redis, two cache clients (two celery workers) over the same storage
+        scheduling_cache = LocMemCache('share-update-test', {})
+        pushing_cache = LocMemCache('share-update-test', {})
+        project = ProjectFactory(is_public=True)
+        scheduling_cache.clear()
+        mock_enqueue_task.reset_mock()
+
+        update_share(project)
+        update_share(project)
+        with mock.patch.object(share_utils, 'share_update_cache', return_value=scheduling_cache):
+            for _signature in self._schedule_signatures(mock_enqueue_task):
+                _signature.apply()
+        assert mock_apply_async.call_count == 1
+
+        with mock.patch.object(share_utils, 'share_update_cache', return_value=pushing_cache):
+            task__update_share_batch.apply(args=mock_apply_async.call_args[1]['args'])
+        assert not self._is_pending(project, cache=scheduling_cache)
+
+        update_share(project)
+        with mock.patch.object(share_utils, 'share_update_cache', return_value=scheduling_cache):
+            self._schedule_signatures(mock_enqueue_task)[-1].apply()
+        assert mock_apply_async.call_count == 2
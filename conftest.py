@@ -4,6 +4,7 @@ import logging
 import os
 import re
 
+from django.conf import settings as django_conf_settings
 from django.core.management import call_command
 from django.db import transaction
 from elasticsearch_dsl.connections import connections
@@ -60,6 +61,16 @@ def override_settings():
     website_settings.SENDGRID_API_KEY = None
     # or try to contact a SHARE
     website_settings.SHARE_ENABLED = False
+    # Don't let cached OAuth2 token lookups leak between tests
+    website_settings.CAS_PROFILE_CACHE_TTL = 0
+    # Write counted usages as they are recorded
+    website_settings.COUNTED_USAGE_BUFFER_SIZE = 0
+    # Push to SHARE on every update
+    website_settings.SHARE_UPDATE_COALESCE_SECONDS = 0
+    # Caches shared between processes in production (redis) are per-process in tests
+    django_conf_settings.SHARE_UPDATE_CACHE_NAME = 'default'
+    django_conf_settings.CAS_PROFILE_CACHE_NAME = 'default'
+    django_conf_settings.NODE_LINEAGE_CACHE_NAME = 'default'
     # Set this here instead of in SILENT_LOGGERS, in case developers
     # call setLevel in local.py
     logging.getLogger('website.mails.mails').setLevel(logging.CRITICAL)
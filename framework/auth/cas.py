@@ -1,4 +1,7 @@
 import furl
+import hashlib
+from django.conf import settings as django_conf_settings
+from django.core.cache import caches
 from django.utils import timezone
 from rest_framework import status as http_status
 import json
@@ -16,6 +19,10 @@ from framework.exceptions import HTTPError
 from website import settings
 
 
+CAS_PROFILE_CACHE_KEY = 'cas_profile:{}'
+CAS_PROFILE_GENERATION_KEY = 'cas_profile_generation'
+
+
 class CasError(HTTPError):
     """General CAS-related error."""
 
@@ -54,6 +61,77 @@ class CasResponse(object):
         self.attributes = attributes or {}
 
 
+class CasProfileCache(object):
+    """Short-lived cache of successful CAS profile lookups, shared between processes.
+
+    Entries live in the `CAS_PROFILE_CACHE_NAME` cache (redis), keyed by a hash of the access
+    token, and hold the user's GUID and attributes (including scopes) but not the token itself.
+    Each entry records the generation it was looked up under; revoking tokens bumps the shared
+    generation, so no process serves an entry cached before the revocation.
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def cache(self):
+        return caches[django_conf_settings.CAS_PROFILE_CACHE_NAME]
+
+    @staticmethod
+    def _key(access_token):
+        return CAS_PROFILE_CACHE_KEY.format(hashlib.sha256(access_token.encode()).hexdigest())
+
+    @property
+    def generation(self):
+        return self.cache.get(CAS_PROFILE_GENERATION_KEY, 0)
+
+    def get(self, access_token):
+        key = self._key(access_token)
+        cached = self.cache.get_many([key, CAS_PROFILE_GENERATION_KEY])
+        entry = cached.get(key)
+        if entry is None or entry[0] != cached.get(CAS_PROFILE_GENERATION_KEY, 0):
+            self.misses += 1
+            return None
+        self.hits += 1
+        _, user, attributes = entry
+        resp = CasResponse(authenticated=True, user=user, attributes=dict(attributes))
+        resp.attributes['accessToken'] = access_token
+        resp.attributes['accessTokenScope'] = set(attributes['accessTokenScope'])
+        return resp
+
+    def set(self, access_token, resp, generation):
+        """Cache `resp` as looked up under `generation`; it is ignored once tokens are revoked."""
+        ttl = settings.CAS_PROFILE_CACHE_TTL
+        if not ttl or not resp.authenticated:
+            return
+        attributes = {key: value for key, value in resp.attributes.items() if key != 'accessToken'}
+        attributes['accessTokenScope'] = frozenset(attributes.get('accessTokenScope', ()))
+        self.cache.set(self._key(access_token), (generation, resp.user, attributes), ttl)
+
+    def invalidate(self, access_token):
+        self.cache.delete(self._key(access_token))
+        # Also drop lookups of this token that are still in flight
+        self._next_generation()
+
+    def clear(self):
+        self._next_generation()
+
+    def _next_generation(self):
+        try:
+            self.cache.incr(CAS_PROFILE_GENERATION_KEY)
+        except ValueError:
+            if not self.cache.add(CAS_PROFILE_GENERATION_KEY, 1, None):
+                self.cache.incr(CAS_PROFILE_GENERATION_KEY)
+
+    @property
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+profile_cache = CasProfileCache()
+
+
 class CasClient(object):
     """HTTP client for the CAS server."""
 
@@ -133,11 +211,16 @@ class CasClient(object):
     def profile(self, access_token):
         """
         Send request to get profile information, given an access token.
+        Successful lookups are cached briefly in `profile_cache`.
 
         :param str access_token: CAS access_token.
         :rtype: CasResponse
         :raises: CasError if an unexpected response is returned.
         """
+        cached = profile_cache.get(access_token)
+        if cached is not None:
+            return cached
+        generation = profile_cache.generation
 
         url = self.get_profile_url()
         headers = {
@@ -145,7 +228,9 @@ class CasClient(object):
         }
         resp = requests.get(url, headers=headers)
         if resp.status_code == 200:
-            return self._parse_profile(resp.content, access_token)
+            cas_resp = self._parse_profile(resp.content, access_token)
+            profile_cache.set(access_token, cas_resp, generation)
+            return cas_resp
         else:
             self._handle_error(resp)
 
@@ -197,6 +282,11 @@ class CasClient(object):
         url = self.get_auth_token_revocation_url()
 
         resp = requests.post(url, data=payload)
+        # Invalidate whatever the outcome; the cache can't tell which tokens belong to an application
+        if 'token' in payload:
+            profile_cache.invalidate(payload['token'])
+        else:
+            profile_cache.clear()
         if resp.status_code == 204:
             return True
         else:
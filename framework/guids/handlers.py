@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+import logging
+import threading
+from collections import Counter
+
+from website import settings
+
+_local = threading.local()
+logger = logging.getLogger(__name__)
+
+def guid_identity_map():
+    """
+    Request-scoped ``{(model, guid): instance}`` map of the objects loaded by guid, so that repeated
+    ``load()`` calls within a request return the same instance without a query. ``None`` outside of a request.
+    """
+    return getattr(_local, 'guid_identity_map', None)
+
+def record_duplicate_guid_load(model, guid):
+    duplicate_loads = getattr(_local, 'duplicate_guid_loads', None)
+    if duplicate_loads is not None:
+        duplicate_loads[(model.__name__, guid)] += 1
+
+def forget_guid(guid):
+    """Drop every object loaded by ``guid`` from the identity map, e.g. when the guid is repointed or deleted."""
+    identity_map = guid_identity_map()
+    if identity_map:
+        for key in [key for key in identity_map if key[1] == guid]:
+            del identity_map[key]
+
+def forget_guid_referent(instance, keep=False):
+    """
+    Drop the objects loaded for the row of ``instance`` from the identity map. With ``keep``, ``instance``
+    itself stays mapped and only other, now stale, instances of the row are dropped.
+    """
+    identity_map = guid_identity_map()
+    if not identity_map:
+        return
+    concrete_model = instance._meta.concrete_model
+    for key, loaded in list(identity_map.items()):
+        if loaded.pk == instance.pk and loaded._meta.concrete_model is concrete_model and not (keep and loaded is instance):
+            del identity_map[key]
+
+def guids_before_request():
+    _local.guid_identity_map = {}
+    _local.duplicate_guid_loads = Counter() if settings.DEBUG_MODE else None
+
+def guids_after_request(response=None):
+    duplicate_loads = getattr(_local, 'duplicate_guid_loads', None)
+    if duplicate_loads:
+        logger.info('{} duplicate guid loads served by the identity map: {}'.format(
+            sum(duplicate_loads.values()),
+            ', '.join('{}({}) x{}'.format(model, guid, count) for (model, guid), count in duplicate_loads.most_common()),
+        ))
+    _local.guid_identity_map = None
+    _local.duplicate_guid_loads = None
+    return response
+
+def guids_teardown_request(exception=None):
+    _local.guid_identity_map = None
+    _local.duplicate_guid_loads = None
+
+handlers = {
+    'before_request': guids_before_request,
+    'after_request': guids_after_request,
+    'teardown_request': guids_teardown_request,
+}
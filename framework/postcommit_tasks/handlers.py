@@ -13,6 +13,7 @@ from celery.local import PromiseProxy
 from gevent.pool import Pool
 from flask import _app_ctx_stack as context_stack
 
+from api.base.api_globals import api_globals
 from website import settings
 
 _local = threading.local()
@@ -28,14 +29,29 @@ def postcommit_celery_queue():
         _local.postcommit_celery_queue = OrderedDict()
     return _local.postcommit_celery_queue
 
+def postcommit_collection(name):
+    """
+    Request-scoped list for postcommit tasks that batch work across a request, e.g. collecting
+    every cache ban so a single task can send them. Cleared along with the postcommit queues.
+
+    Returns None outside of a request, where nothing would run the tasks or clear the list.
+    """
+    if context_stack.top is None and getattr(api_globals, 'request', None) is None:
+        return None
+    if not hasattr(_local, 'postcommit_collections'):
+        _local.postcommit_collections = {}
+    return _local.postcommit_collections.setdefault(name, [])
+
 def postcommit_before_request():
     _local.postcommit_queue = OrderedDict()
     _local.postcommit_celery_queue = OrderedDict()
+    _local.postcommit_collections = {}
 
 def postcommit_after_request(response, base_status_error_code=500):
     if response.status_code >= base_status_error_code:
         _local.postcommit_queue = OrderedDict()
         _local.postcommit_celery_queue = OrderedDict()
+        _local.postcommit_collections = {}
         return response
     try:
         if postcommit_queue():
@@ -84,20 +84,56 @@ def prepare_private_key():
         return redirect(new_url, code=http_status.HTTP_307_TEMPORARY_REDIRECT)
 
 
+def _request_session_memo():
+    """Return the ``{session_key: SessionStore}`` memo of the current Flask or Django request, or ``None`` when
+    called outside of a request.
+    """
+    from osf.utils.requests import DummyRequest, get_current_request
+    req = get_current_request()
+    if isinstance(req, DummyRequest):
+        return None
+    memo = getattr(req, '_osf_session_memo', None)
+    if memo is None:
+        memo = req._osf_session_memo = {}
+    return memo
+
+
+def load_session(session_key):
+    """Return the Django ``SessionStore`` object for ``session_key``.
+
+    Within a request, the same ``SessionStore`` object is returned for the same ``session_key`` so that the session
+    data is fetched from the backend at most once per request, whether it is first used by the V1/Flask stack or by
+    the API/Django stack. Session data is loaded lazily on first access.
+    """
+    memo = _request_session_memo()
+    if memo is None:
+        return SessionStore(session_key=session_key)
+    if session_key not in memo:
+        memo[session_key] = SessionStore(session_key=session_key)
+    return memo[session_key]
+
+
+def is_valid_session(session):
+    """Return whether ``session`` exists in the backend and is a valid OSF session.
+
+    Loading the session data is the only backend hit: for expired or nonexistent sessions, both the DB and the Cache
+    backends reset ``session_key`` to ``None`` and load empty data. Currently, authenticated session must have key
+    `auth_user_id` and anonymous session for ORCiD SSO must have key 'auth_user_external_first_login'.
+    """
+    has_must_have_key = session.get('auth_user_id', None) or session.get('auth_user_external_first_login', None)
+    return bool(has_must_have_key) and session.session_key is not None
+
+
 def flask_get_session_from_cookie(cookie):
     """Return a Django ``SessionStore`` object if cookie is valid and session_key exists.
     Raise ``InvalidCookieOrSessionError`` otherwise.
 
-    When using DB backend, for expired sessions, SessionStore().exists(session_key=session_key) returns true while
-    SessionStore(session_key=session_key) doesn't load the session data. Thus, we need to check must-have keys in
-    session data to eliminate expired sessions. Currently, authenticated session must have key `auth_user_id` and
-    anonymous session for ORCiD SSO must have key 'auth_user_external_first_login'.
+    Existence and expiry are validated from the single load of the session data, see ``is_valid_session()``.
     """
     try:
         session_key = ensure_str(itsdangerous.Signer(settings.SECRET_KEY).unsign(cookie))
-        session = SessionStore(session_key=session_key)
-        is_valid_session = session.get('auth_user_id', None) or session.get('auth_user_external_first_login', None)
-        if not SessionStore().exists(session_key=session_key) or not is_valid_session:
+        session = load_session(session_key)
+        if not is_valid_session(session):
             raise InvalidCookieOrSessionError
         return session
     except (itsdangerous.BadSignature, TypeError):
@@ -0,0 +1,56 @@
+import logging
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from osf.models import NodeClosure
+
+logger = logging.getLogger(__name__)
+
+
+def backfill_node_closure(verify_only=False, dry_run=False):
+    missing, extra = NodeClosure.verify()
+    logger.info(f'Node closure table has {missing} missing or incorrect rows and {extra} extraneous rows.')
+    if verify_only or not (missing or extra):
+        return missing, extra
+
+    with transaction.atomic():
+        count = NodeClosure.rebuild()
+        logger.info(f'Rebuilt node closure table with {count} rows.')
+        missing, extra = NodeClosure.verify()
+        if missing or extra:
+            raise RuntimeError(f'Node closure table still has {missing} missing and {extra} extraneous rows after rebuilding.')
+        if dry_run:
+            transaction.set_rollback(True)
+            logger.warning('Dry run mode, rolling back the rebuilt node closure table.')
+    return missing, extra
+
+
+class Command(BaseCommand):
+    """
+    Verify the osf_nodeclosure ancestor/descendant table against osf_noderelation and rebuild it if they disagree.
+    """
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            dest='verify_only',
+            help='Only report how many rows are missing or extraneous',
+        )
+        parser.add_argument(
+            '--dry',
+            action='store_true',
+            dest='dry_run',
+            help='Rebuild the table and verify it, then roll back',
+        )
+
+    def handle(self, *args, **options):
+        missing, extra = backfill_node_closure(
+            verify_only=options.get('verify_only', False),
+            dry_run=options.get('dry_run', False),
+        )
+        if missing or extra:
+            self.stdout.write(self.style.WARNING(f'{missing} missing and {extra} extraneous node closure rows'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Node closure table is consistent'))
@@ -0,0 +1,59 @@
+import logging
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from addons.osfstorage.models import OsfStorageFileNode, OsfStorageFile, OsfStorageFolder
+from osf.models import BaseFileNode
+
+logger = logging.getLogger(__name__)
+
+
+def backfill_osfstorage_materialized_paths(batch_size=1000, dry_run=False):
+    """Store materialized paths for osfstorage files and folders saved before paths were stored."""
+    missing = BaseFileNode.objects.filter(
+        Q(_materialized_path='') | Q(_materialized_path__isnull=True),
+        type__in=OsfStorageFile._typedmodels_subtypes + OsfStorageFolder._typedmodels_subtypes,
+    ).order_by('id').values_list('id', flat=True)
+    total = 0
+    last_id = 0
+    while True:
+        ids = list(missing.filter(id__gt=last_id)[:batch_size])
+        if not ids:
+            break
+        last_id = ids[-1]
+        paths = OsfStorageFileNode.materialized_paths_for(ids)
+        if not dry_run:
+            file_nodes = list(BaseFileNode.objects.filter(id__in=paths).only('id', 'type'))
+            for file_node in file_nodes:
+                file_node._materialized_path = paths[file_node.id]
+            BaseFileNode.objects.bulk_update(file_nodes, ['_materialized_path'], batch_size=batch_size)
+        total += len(paths)
+        logger.info(f'{"[DRY RUN] " if dry_run else ""}Stored materialized paths for {total} file nodes')
+    return total
+
+
+class Command(BaseCommand):
+    """
+    Store materialized paths for osfstorage file nodes that were saved before osfstorage kept them up to date.
+    """
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            '--batch_size',
+            type=int,
+            default=1000,
+            help='How many file nodes to compute paths for at once',
+        )
+        parser.add_argument(
+            '--dry',
+            action='store_true',
+            dest='dry_run',
+            help='Compute paths without storing them',
+        )
+
+    def handle(self, *args, **options):
+        backfill_osfstorage_materialized_paths(
+            batch_size=options['batch_size'],
+            dry_run=options.get('dry_run', False),
+        )
@@ -1,7 +1,10 @@
+from concurrent.futures import ThreadPoolExecutor
 import datetime
 import logging
+import time
 
 from django.core.management.base import BaseCommand
+from django.db import connection
 from django.utils import timezone
 
 from framework import sentry
@@ -14,27 +17,79 @@ logger = logging.getLogger(__name__)
 
 
 @celery_app.task(name='management.commands.daily_reporters_go')
-def daily_reporters_go(also_send_to_keen=False, report_date=None, reporter_filter=None):
+def daily_reporters_go(also_send_to_keen=False, report_date=None, reporter_filter=None, parallel=None):
+    errors, _ = run_daily_reporters(
+        also_send_to_keen=also_send_to_keen,
+        report_date=report_date,
+        reporter_filter=reporter_filter,
+        parallel=parallel,
+    )
+    return errors
+
+
+def run_daily_reporters(also_send_to_keen=False, report_date=None, reporter_filter=None, parallel=None):
+    """run the daily reporters, `parallel` at a time if given
+
+    return a mapping from reporter name to error for the reporters that failed,
+    and a mapping from reporter name to seconds taken
+    """
     init_app()  # OSF-specific setup
 
     if report_date is None:  # default to yesterday
         report_date = (timezone.now() - datetime.timedelta(days=1)).date()
 
+    reporter_classes = [
+        reporter_class
+        for reporter_class in DAILY_REPORTERS
+        if not reporter_filter or (reporter_filter.lower() in reporter_class.__name__.lower())
+    ]
+
+    if parallel and parallel > 1:
+        # reporters spend most of their time waiting on postgres and elasticsearch,
+        # so threads (each with its own db connection) are enough to overlap them
+        with ThreadPoolExecutor(max_workers=parallel) as executor:
+            results = list(executor.map(
+                lambda reporter_class: _run_reporter_in_thread(reporter_class, report_date, also_send_to_keen),
+                reporter_classes,
+            ))
+    else:
+        results = [
+            _run_reporter(reporter_class, report_date, also_send_to_keen)
+            for reporter_class in reporter_classes
+        ]
+
     errors = {}
-    for reporter_class in DAILY_REPORTERS:
-        if reporter_filter and (reporter_filter.lower() not in reporter_class.__name__.lower()):
-            continue
-        try:
-            reporter_class().run_and_record_for_date(
-                report_date=report_date,
-                also_send_to_keen=also_send_to_keen,
-            )
-        except Exception as e:
-            errors[reporter_class.__name__] = repr(e)
-            logger.exception(e)
-            sentry.log_exception()
-            # continue with the next reporter
-    return errors
+    timings = {}
+    for reporter_class, (error, seconds) in zip(reporter_classes, results):
+        timings[reporter_class.__name__] = seconds
+        if error is not None:
+            errors[reporter_class.__name__] = error
+    return errors, timings
+
+
+def _run_reporter(reporter_class, report_date, also_send_to_keen):
+    start = time.perf_counter()
+    error = None
+    try:
+        reporter_class().run_and_record_for_date(
+            report_date=report_date,
+            also_send_to_keen=also_send_to_keen,
+        )
+    except Exception as e:
+        error = repr(e)
+        logger.exception(e)
+        sentry.log_exception()
+        # continue with the next reporter
+    seconds = time.perf_counter() - start
+    logger.info(f'{reporter_class.__name__} took {seconds:.2f}s')
+    return error, seconds
+
+
+def _run_reporter_in_thread(reporter_class, report_date, also_send_to_keen):
+    try:
+        return _run_reporter(reporter_class, report_date, also_send_to_keen)
+    finally:
+        connection.close()  # the thread's own connection; don't leave it for the pool to leak
 
 
 def date_fromisoformat(date_str):
@@ -59,12 +114,21 @@ class Command(BaseCommand):
             type=str,
             help='filter by reporter name (by partial case-insensitive match)'
         )
+        parser.add_argument(
+            '--parallel',
+            type=int,
+            default=None,
+            help='run this many reporters at a time (default: one after another)',
+        )
     def handle(self, *args, **options):
-        errors = daily_reporters_go(
+        errors, timings = run_daily_reporters(
             report_date=options.get('date'),
             also_send_to_keen=options['keen'],
             reporter_filter=options.get('filter'),
+            parallel=options.get('parallel'),
         )
+        for reporter_name, seconds in sorted(timings.items(), key=lambda item: item[1], reverse=True):
+            self.stdout.write(f'{reporter_name}: {seconds:.2f}s')
         for error_key, error_val in errors.items():
             self.stdout.write(self.style.ERROR(f'error running {error_key}: ') + error_val)
         self.stdout.write(self.style.SUCCESS('done.'))
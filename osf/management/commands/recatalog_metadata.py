@@ -5,7 +5,8 @@ import logging
 from django.core.management.base import BaseCommand
 from addons.osfstorage.models import OsfStorageFile
 from osf.models import AbstractProvider, Registration, Preprint, Node, OSFUser
-from api.share.utils import task__update_share
+from api.share.utils import task__update_share_batch
+from website import settings
 from website.settings import CeleryConfig
 
 
@@ -27,6 +28,7 @@ def recatalog_chunk(queryset, start_id, chunk_size):
         queryset
         .filter(id__gte=start_id)
         .order_by('id')
+        .prefetch_related('guids')
         [:chunk_size]
     )
     last_id = None
@@ -34,15 +36,18 @@ def recatalog_chunk(queryset, start_id, chunk_size):
         first_id = item_chunk[0].id
         last_id = item_chunk[-1].id
 
+        guids = []
         for item in item_chunk:
-            guid = item.guids.values_list('_id', flat=True).first()
+            guid = item.guids.first()
             if guid:
-                task__update_share.apply_async(
-                    kwargs={'guid': guid, 'is_backfill': True},
-                    queue=CeleryConfig.task_low_queue,  # "low priority" queue
-                )
+                guids.append(guid._id)
             else:
                 logger.debug('skipping item without guid: %s', item)
+        for batch_start in range(0, len(guids), settings.SHARE_UPDATE_BATCH_SIZE):
+            task__update_share_batch.apply_async(
+                kwargs={'guids': guids[batch_start:batch_start + settings.SHARE_UPDATE_BATCH_SIZE], 'is_backfill': True},
+                queue=CeleryConfig.task_low_queue,  # "low priority" queue
+            )
 
         logger.info(f'Queued metadata recataloguing for {len(item_chunk)} {queryset.model.__name__}ses (ids in range [{first_id},{last_id}])')
     else:
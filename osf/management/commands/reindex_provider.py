@@ -3,7 +3,7 @@ import logging
 
 from django.core.management.base import BaseCommand
 from osf.models import AbstractProvider, AbstractNode, Preprint
-from api.share.utils import update_share
+from api.share.utils import update_share_batch
 
 logger = logging.getLogger(__name__)
 
@@ -12,14 +12,12 @@ def reindex_provider(provider):
     preprints = Preprint.objects.filter(provider=provider)
     if preprints:
         logger.info('Sending {} preprints to SHARE...'.format(provider.preprints.count()))
-        for preprint in preprints:
-            update_share(preprint)
+        update_share_batch(preprints.prefetch_related('guids'))
 
     nodes = AbstractNode.objects.filter(provider=provider)
     if nodes:
         logger.info('Sending {} AbstractNodes to SHARE...'.format(AbstractNode.objects.filter(provider=provider).count()))
-        for abstract_node in nodes:
-            update_share(abstract_node)
+        update_share_batch(nodes.prefetch_related('guids'))
 
 
 class Command(BaseCommand):
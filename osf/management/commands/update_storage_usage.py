@@ -2,10 +2,10 @@ import datetime
 import logging
 
 from osf.models import AbstractNode
-from api.caching.tasks import update_storage_usage_cache
+from api.caching.tasks import reconcile_storage_usage
 
 from django.core.management.base import BaseCommand
-from datetime import timezone
+from django.utils import timezone
 from framework.celery_tasks import app as celery_app
 from django.db import transaction
 
@@ -15,19 +15,29 @@ DAYS = 1
 
 @celery_app.task(name='management.commands.update_storage_usage')
 def update_storage_usage(dry_run=False, days=DAYS):
+    """Reconcile the storage usage counters of recently modified nodes against a full recount.
+
+    Counters are maintained incrementally from Waterbutler file events, so this only corrects
+    drift (missed or duplicated events) and reports how much was found.
+    """
     with transaction.atomic():
-        modified_limit = timezone.now() - timezone.timedelta(days=days)
+        modified_limit = timezone.now() - datetime.timedelta(days=days)
         recently_modified = AbstractNode.objects.filter(modified__gt=modified_limit)
+        reconciled = drifted = 0
         for modified_node in recently_modified:
             file_op_occurred = modified_node.logs.filter(action__contains='file', created__gt=modified_limit).exists()
             if not modified_node.is_quickfiles and file_op_occurred:
-                update_storage_usage_cache(modified_node.id, modified_node._id)
+                drift = reconcile_storage_usage(modified_node.id, modified_node._id)
+                reconciled += 1
+                if drift:
+                    drifted += 1
+        logger.info('Reconciled storage usage for {} nodes, {} had drifted'.format(reconciled, drifted))
 
         if dry_run:
             raise RuntimeError('Dry run -- Transaction rolled back')
 
 class Command(BaseCommand):
-    help = '''Updates the storage usage for all nodes modified in the last day'''
+    help = '''Reconciles the storage usage counters of all nodes with file changes in the last day'''
 
     def add_arguments(self, parser):
         parser.add_argument(
@@ -1,6 +1,7 @@
 from .basket import Basket
 from .focus import Focus
 from .gatherer import gatherer as er
+from .session import GatherSession
 
 
-__all__ = ('Basket', 'Focus', 'er')
+__all__ = ('Basket', 'Focus', 'GatherSession', 'er')
@@ -9,16 +9,21 @@ from osf.metadata import rdfutils
 from .focus import Focus
 from .gatherer import get_gatherers, Gatherer
 
+if typing.TYPE_CHECKING:
+    from .session import GatherSession
+
 
 class Basket:
     focus: Focus                     # the thing to gather metadata from.
     gathered_metadata: rdflib.Graph  # heap of metadata already gathered.
     _gathertasks_done: set           # memory of gatherings already done.
     _known_focus_dict: dict
+    session: typing.Optional['GatherSession']  # memory shared with other baskets, if any.
 
-    def __init__(self, focus: Focus):
+    def __init__(self, focus: Focus, session=None):
         assert isinstance(focus, Focus)
         self.focus = focus
+        self.session = session
         self.reset()  # start with an empty basket (except the focus itself)
 
     def reset(self):
@@ -125,7 +130,10 @@ class Basket:
         '''
         if (gatherer, focus) not in self._gathertasks_done:
             self._gathertasks_done.add((gatherer, focus))  # eager
-            yield from gatherer(focus)
+            if self.session is None:
+                yield from gatherer(focus)
+            else:  # maybe another basket in the session already did it
+                yield from self.session.gathertask_results(gatherer, focus)
 
     def _add_focus_reference(self, focus: Focus):
         (
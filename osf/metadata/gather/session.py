@@ -0,0 +1,62 @@
+'''a gather.GatherSession shares gathered metadata between baskets.
+
+'''
+import collections
+import typing
+
+from .basket import Basket
+from .focus import Focus
+from .gatherer import Gatherer
+
+
+class GatherSession:
+    '''memory of gathertasks done, shared by the baskets of a session
+
+    a gatherer gathers the same triples every time it is given the same focus,
+    so when gathering metadata about many items (which share creators, affiliations...)
+    each (gatherer, focus) pair need only be invoked once per session.
+
+    keeps the most recently used `maxsize` results; the rest are forgotten (and
+    gathered again if needed). nothing notices database changes, so keep sessions
+    short-lived (like one batch of items).
+    '''
+    DEFAULT_MAXSIZE = 10000
+
+    maxsize: int
+    hits: int                                # gathertasks answered from memory
+    misses: int                              # gathertasks actually done
+    _gathered: collections.OrderedDict       # (gatherer, focus) -> tuple of triples
+
+    def __init__(self, maxsize=None):
+        self.maxsize = self.DEFAULT_MAXSIZE if maxsize is None else maxsize
+        self.hits = 0
+        self.misses = 0
+        self._gathered = collections.OrderedDict()
+
+    def basket(self, focus: Focus) -> Basket:
+        return Basket(focus, session=self)
+
+    def pls_gather(self, foci: typing.Iterable[Focus], predicate_map) -> typing.List[Basket]:
+        '''gather metadata about many foci at once (see Basket.pls_gather)
+        '''
+        baskets = []
+        for focus in foci:
+            basket = self.basket(focus)
+            basket.pls_gather(predicate_map)
+            baskets.append(basket)
+        return baskets
+
+    def gathertask_results(self, gatherer: Gatherer, focus: Focus) -> tuple:
+        key = (gatherer, focus)
+        try:
+            triples = self._gathered[key]
+        except KeyError:
+            self.misses += 1
+            triples = tuple(gatherer(focus))
+            self._gathered[key] = triples
+            if len(self._gathered) > self.maxsize:
+                self._gathered.popitem(last=False)
+        else:
+            self.hits += 1
+            self._gathered.move_to_end(key)
+        return triples
@@ -38,13 +38,14 @@ logger = logging.getLogger(__name__)
 ##### BEGIN "public" api #####
 
 
-def pls_get_magic_metadata_basket(osf_item) -> gather.Basket:
+def pls_get_magic_metadata_basket(osf_item, session=None) -> gather.Basket:
     '''for when you just want a basket of rdf metadata about a thing
 
     @osf_item: the thing (an instance of osf.models.base.GuidMixin or a 5-ish character osf:id string)
+    @session: optional gather.GatherSession, to share gathered metadata with other baskets
     '''
     focus = OsfFocus(osf_item)
-    return gather.Basket(focus)
+    return gather.Basket(focus, session=session)
 
 
 def osfmap_for_type(rdftype_iri: str):
@@ -3,6 +3,7 @@
 import typing
 
 from osf.models.base import coerce_guid
+from osf.metadata.gather import GatherSession
 from osf.metadata.osf_gathering import pls_get_magic_metadata_basket
 from osf.metadata.serializers import get_metadata_serializer
 
@@ -26,18 +27,34 @@ def pls_gather_metadata_as_dict(osf_item, format_key, serializer_config=None):
     return serializer.metadata_as_dict()
 
 
-def pls_gather_metadata_file(osf_item, format_key, serializer_config=None) -> SerializedMetadataFile:
+def pls_gather_metadata_file(osf_item, format_key, serializer_config=None, gather_session=None) -> SerializedMetadataFile:
     '''for when you want metadata in a file (for saving or downloading)
 
     @osf_item: the thing (osf model instance or 5-ish character guid string)
     @format_key: str (must be known by osf.metadata.serializers)
     @serializer_config: optional dict (use only when you know the serializer will understand)
+    @gather_session: optional GatherSession, to reuse metadata gathered for other items
     '''
     osfguid = coerce_guid(osf_item, create_if_needed=True)
-    basket = pls_get_magic_metadata_basket(osfguid.referent)
+    basket = pls_get_magic_metadata_basket(osfguid.referent, session=gather_session)
     serializer = get_metadata_serializer(format_key, basket, serializer_config)
     return SerializedMetadataFile(
         mediatype=serializer.mediatype,
         filename=serializer.filename_for_itemid(osfguid._id),
         serialized_metadata=serializer.serialize(),
     )
+
+
+def pls_gather_metadata_files(osf_items, format_key, serializer_config=None, gather_session=None) -> typing.Iterator[SerializedMetadataFile]:
+    '''for when you want metadata files for many things at once
+
+    metadata about things shared by the items (like their creators) is gathered once, not per item
+
+    @osf_items: iterable of things (osf model instances or 5-ish character guid strings)
+    @format_key: str (must be known by osf.metadata.serializers)
+    @serializer_config: optional dict (use only when you know the serializer will understand)
+    @gather_session: optional GatherSession (by default, a new one for these items)
+    '''
+    _session = gather_session or GatherSession()
+    for osf_item in osf_items:
+        yield pls_gather_metadata_file(osf_item, format_key, serializer_config, gather_session=_session)
@@ -1,16 +1,25 @@
+import atexit
 from datetime import datetime
 import enum
 import logging
+import threading
 from urllib.parse import urlsplit
 
+from elasticsearch.exceptions import TransportError
+from elasticsearch.helpers import BulkIndexError, bulk
 from elasticsearch_dsl import InnerDoc, analyzer, tokenizer
+from elasticsearch_dsl.connections import get_connection
 from elasticsearch_metrics import metrics
 from elasticsearch_metrics.signals import pre_save
 from django.dispatch import receiver
+from django.utils import timezone
 import pytz
 
+from framework.celery_tasks import app as celery_app
+from framework.celery_tasks.handlers import enqueue_task
 from osf.metrics.utils import stable_key
-from osf.models import Guid
+from osf.models import AbstractNode, Guid, NodeClosure
+from website import settings
 
 
 logger = logging.getLogger(__name__)
@@ -93,6 +102,125 @@ def _autofill_fields(sender, instance, **kwargs):
     _fill_document_id(instance)
 
 
+def record_counted_usage(**kwargs):
+    """Record a CountedAuthUsage, through the write-behind buffer if it is enabled.
+
+    Buffered usages are enriched and written in bulk by `ingest_counted_usages`, so the
+    returned instance is not autofilled yet.
+    """
+    usage = CountedAuthUsage(timestamp=timezone.now(), **kwargs)
+    if settings.COUNTED_USAGE_BUFFER_SIZE:
+        counted_usage_buffer.add(usage)
+    else:
+        usage.save()
+    return usage
+
+
+class CountedUsageBuffer:
+    """Process-local buffer of CountedAuthUsages, flushed to `ingest_counted_usages` once it holds
+    COUNTED_USAGE_BUFFER_SIZE usages, or by a timer COUNTED_USAGE_BUFFER_SECONDS after the oldest
+    buffered usage was added. Whatever is left is flushed at exit.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._usages = []
+        self._timer = None
+
+    def __len__(self):
+        return len(self._usages)
+
+    def add(self, usage):
+        with self._lock:
+            self._usages.append(usage)
+            if len(self._usages) < settings.COUNTED_USAGE_BUFFER_SIZE:
+                if self._timer is None:
+                    self._timer = threading.Timer(
+                        settings.COUNTED_USAGE_BUFFER_SECONDS,
+                        self.flush,
+                        kwargs={'queue': True},
+                    )
+                    self._timer.daemon = True
+                    self._timer.start()
+                return
+            usages = self._take()
+        self._send(usages)
+
+    def flush(self, queue=False):
+        """Send whatever is buffered. With `queue`, the batch always goes to the celery queue;
+        outside of a request `enqueue_task` would ingest it in the calling (e.g. timer) thread.
+        """
+        with self._lock:
+            usages = self._take()
+        if usages:
+            self._send(usages, queue=queue)
+
+    def _take(self):
+        if self._timer is not None:
+            self._timer.cancel()
+        usages, self._usages, self._timer = self._usages, [], None
+        return usages
+
+    def _send(self, usages, queue=False):
+        signature = ingest_counted_usages.s([_to_payload(usage) for usage in usages])
+        if queue:
+            signature.apply_async()
+        else:
+            enqueue_task(signature)
+
+
+def _to_payload(usage):
+    payload = usage.to_dict()
+    payload['timestamp'] = usage.timestamp.isoformat()
+    return payload
+
+
+counted_usage_buffer = CountedUsageBuffer()
+atexit.register(counted_usage_buffer.flush)
+
+
+@celery_app.task(
+    name='osf.metrics.counted_usage.ingest_counted_usages',
+    autoretry_for=(TransportError, BulkIndexError),
+    max_retries=5,
+    default_retry_delay=60,
+)
+def ingest_counted_usages(payloads):
+    """Autofill a batch of buffered CountedAuthUsages and write them with a single bulk request.
+
+    Document ids are computed as for single saves, so repeated usages still overwrite each other
+    (and a retried batch does not count anything twice).
+    """
+    usages = []
+    for payload in payloads:
+        usage = CountedAuthUsage(**dict(payload, timestamp=datetime.fromisoformat(payload['timestamp'])))
+        usage.meta.index = CountedAuthUsage.get_index_name(usage.timestamp)
+        usages.append(usage)
+    fill_counted_usages(usages)
+    bulk(get_connection(), (usage.to_dict(include_meta=True) for usage in usages))
+
+
+def fill_counted_usages(usages):
+    """The bulk counterpart of `_autofill_fields`: load every item guid of the batch with one query
+    and compute the guid info once per distinct item.
+    """
+    item_guids = {usage.item_guid.lower() for usage in usages if getattr(usage, 'item_guid', None)}
+    referents = {
+        guid._id: guid.referent
+        for guid in Guid.objects.filter(_id__in=item_guids).prefetch_related('referent')
+    }
+    filled_infos = {}
+    for usage in usages:
+        if getattr(usage, 'pageview_info', None):
+            _fill_pageview_info(usage)
+        item_guid = (getattr(usage, 'item_guid', None) or '').lower()
+        if referents.get(item_guid):
+            if item_guid not in filled_infos:
+                filled_infos[item_guid] = _get_osfguid_info(referents[item_guid])
+            _apply_osfguid_info(usage, filled_infos[item_guid])
+        _fill_document_id(usage)
+
+
 def _fill_pageview_info(counted_usage):
     pageview = counted_usage.pageview_info
     pageview.hour_of_day = counted_usage.timestamp.hour
@@ -110,6 +238,23 @@ def _fill_osfguid_info(counted_usage, guid_referent):
         counted_usage.provider_id = _get_provider_id(guid_referent)
 
 
+def _get_osfguid_info(guid_referent):
+    return {
+        'item_public': _get_ispublic(guid_referent),
+        'item_type': type(guid_referent).__name__.lower(),
+        'surrounding_guids': _get_surrounding_guids(guid_referent),
+        'provider_id': _get_provider_id(guid_referent),
+    }
+
+
+def _apply_osfguid_info(counted_usage, osfguid_info):
+    counted_usage.item_public = osfguid_info['item_public']
+    counted_usage.item_type = osfguid_info['item_type']
+    counted_usage.surrounding_guids = osfguid_info['surrounding_guids']
+    if not counted_usage.provider_id:
+        counted_usage.provider_id = osfguid_info['provider_id']
+
+
 def _fill_document_id(counted_usage):
     # set the document id to a hash of "unique together"
     # values to get "ON CONFLICT UPDATE" behavior -- if
@@ -184,6 +329,10 @@ def _get_surrounding_guids(guid_referent):
     surrounding_guids = []
     current_referent = guid_referent
     while current_referent:
+        if isinstance(current_referent, AbstractNode):
+            # the rest of the way up is the node's (cached) lineage
+            surrounding_guids.extend(NodeClosure.ancestor_guids(current_referent.pk))
+            break
         next_referent = _get_immediate_wrapper(current_referent)
         if next_referent:
             surrounding_guids.append(next_referent._id)
@@ -1,6 +1,7 @@
 import logging
+from collections import defaultdict
 
-from django.db.models import Q
+from django.db.models import Count, F, Q
 
 from osf.metrics.reports import (
     InstitutionSummaryReport,
@@ -8,87 +9,130 @@ from osf.metrics.reports import (
     NodeRunningTotals,
     RegistrationRunningTotals,
 )
-from osf.models import Institution
+from osf.models import AbstractNode, Institution, InstitutionAffiliation
 from ._base import DailyReporter
 
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
+# types that `AbstractNodeQuerySet.get_roots` never considers a root
+NON_PROJECT_TYPES = ['osf.collection', 'osf.quickfilesnode', 'osf.draftnode']
+
+
+def institution_user_counts(date):
+    """map institution id to the running totals of its affiliated users"""
+    user_counts = (
+        InstitutionAffiliation.objects
+        .values('institution_id')
+        .annotate(
+            total=Count('pk', filter=Q(user__is_active=True)),
+            total_daily=Count('pk', filter=Q(user__date_confirmed__date=date)),
+        )
+    )
+    counts_by_institution = defaultdict(lambda: {'total': 0, 'total_daily': 0})
+    counts_by_institution.update(
+        (counts.pop('institution_id'), counts)
+        for counts in user_counts
+    )
+    return counts_by_institution
+
+
+def institution_node_counts(date):
+    """map institution id to the running totals of its affiliated nodes and registrations,
+    keyed like `nodes_public_daily` or `registered_projects_embargoed`
+    """
+    public_query = Q(abstractnode__is_public=True)
+    private_query = Q(abstractnode__is_public=False)
+    daily_query = Q(abstractnode__created__date=date)
+
+    # `embargoed` used private status to determine embargoes, but old registrations could be private and unapproved registrations can also be private
+    # `embargoed_v2` uses future embargo end dates on root
+    embargo_v2_query = Q(abstractnode__root__embargo__end_date__date__gt=date)
+
+    # projects (and registered projects) are the affiliated nodes that are their own root
+    root_query = Q(abstractnode__root_id=F('abstractnode_id')) & ~Q(abstractnode__type__in=NON_PROJECT_TYPES)
+    registration_query = Q(abstractnode__type='osf.registration')
+
+    node_totals = {
+        'total': Q(),
+        'public': public_query,
+        'private': private_query,
+        'total_daily': daily_query,
+        'public_daily': public_query & daily_query,
+        'private_daily': private_query & daily_query,
+    }
+    registration_totals = {
+        'total': Q(),
+        'public': public_query,
+        'embargoed': private_query,
+        'embargoed_v2': private_query & embargo_v2_query,
+        'total_daily': daily_query,
+        'public_daily': public_query & daily_query,
+        'embargoed_daily': private_query & daily_query,
+        'embargoed_v2_daily': private_query & daily_query & embargo_v2_query,
+    }
+    groups = {
+        'nodes': (~registration_query, node_totals),
+        'projects': (~registration_query & root_query, node_totals),
+        'registered_nodes': (registration_query, registration_totals),
+        'registered_projects': (registration_query & root_query, registration_totals),
+    }
+
+    aggregates = {
+        f'{group}_{field}': Count('pk', filter=(group_query & field_query))
+        for group, (group_query, totals) in groups.items()
+        for field, field_query in totals.items()
+    }
+    node_counts = (
+        AbstractNode.affiliated_institutions.through.objects
+        .filter(
+            abstractnode__deleted__isnull=True,
+            abstractnode__created__date__lte=date,
+        )
+        .values('institution_id')
+        .annotate(**aggregates)
+    )
+    counts_by_institution = defaultdict(lambda: dict.fromkeys(aggregates, 0))
+    counts_by_institution.update(
+        (counts.pop('institution_id'), counts)
+        for counts in node_counts
+    )
+    return counts_by_institution
+
+
+def _running_totals(totals_class, counts, group):
+    prefix = f'{group}_'
+    return totals_class(**{
+        key[len(prefix):]: count
+        for key, count in counts.items()
+        if key.startswith(prefix)
+    })
+
 
 class InstitutionSummaryReporter(DailyReporter):
     def report(self, date):
-        institutions = Institution.objects.all()
-        reports = []
+        user_counts = institution_user_counts(date)
+        node_counts = institution_node_counts(date)
 
-        daily_query = Q(created__date=date)
-        public_query = Q(is_public=True)
-        private_query = Q(is_public=False)
-
-        # `embargoed` used private status to determine embargoes, but old registrations could be private and unapproved registrations can also be private
-        # `embargoed_v2` uses future embargo end dates on root
-        embargo_v2_query = Q(root__embargo__end_date__date__gt=date)
-
-        for institution in institutions:
-            node_qs = institution.nodes.filter(
-                deleted__isnull=True,
-                created__date__lte=date,
-            ).exclude(type='osf.registration')
-            registration_qs = institution.nodes.filter(
-                deleted__isnull=True,
-                created__date__lte=date,
-                type='osf.registration',
-            )
+        reports = []
+        for institution in Institution.objects.all():
+            users = user_counts[institution.id]
+            nodes = node_counts[institution.id]
 
             report = InstitutionSummaryReport(
                 report_date=date,
                 institution_id=institution._id,
                 institution_name=institution.name,
                 users=RunningTotal(
-                    total=institution.get_institution_users().filter(is_active=True).count(),
-                    total_daily=institution.get_institution_users().filter(date_confirmed__date=date).count(),
-                ),
-                nodes=NodeRunningTotals(
-                    total=node_qs.count(),
-                    public=node_qs.filter(public_query).count(),
-                    private=node_qs.filter(private_query).count(),
-
-                    total_daily=node_qs.filter(daily_query).count(),
-                    public_daily=node_qs.filter(public_query & daily_query).count(),
-                    private_daily=node_qs.filter(private_query & daily_query).count(),
-                ),
-                # Projects use get_roots to remove children
-                projects=NodeRunningTotals(
-                    total=node_qs.get_roots().count(),
-                    public=node_qs.filter(public_query).get_roots().count(),
-                    private=node_qs.filter(private_query).get_roots().count(),
-
-                    total_daily=node_qs.filter(daily_query).get_roots().count(),
-                    public_daily=node_qs.filter(public_query & daily_query).get_roots().count(),
-                    private_daily=node_qs.filter(private_query & daily_query).get_roots().count(),
-                ),
-                registered_nodes=RegistrationRunningTotals(
-                    total=registration_qs.count(),
-                    public=registration_qs.filter(public_query).count(),
-                    embargoed=registration_qs.filter(private_query).count(),
-                    embargoed_v2=registration_qs.filter(private_query & embargo_v2_query).count(),
-
-                    total_daily=registration_qs.filter(daily_query).count(),
-                    public_daily=registration_qs.filter(public_query & daily_query).count(),
-                    embargoed_daily=registration_qs.filter(private_query & daily_query).count(),
-                    embargoed_v2_daily=registration_qs.filter(private_query & daily_query & embargo_v2_query).count(),
-                ),
-                registered_projects=RegistrationRunningTotals(
-                    total=registration_qs.get_roots().count(),
-                    public=registration_qs.filter(public_query).get_roots().count(),
-                    embargoed=registration_qs.filter(private_query).get_roots().count(),
-                    embargoed_v2=registration_qs.filter(private_query & embargo_v2_query).get_roots().count(),
-
-                    total_daily=registration_qs.filter(daily_query).get_roots().count(),
-                    public_daily=registration_qs.filter(public_query & daily_query).get_roots().count(),
-                    embargoed_daily=registration_qs.filter(private_query & daily_query).get_roots().count(),
-                    embargoed_v2_daily=registration_qs.filter(private_query & daily_query & embargo_v2_query).get_roots().count(),
+                    total=users['total'],
+                    total_daily=users['total_daily'],
                 ),
+                nodes=_running_totals(NodeRunningTotals, nodes, 'nodes'),
+                # Projects are root nodes
+                projects=_running_totals(NodeRunningTotals, nodes, 'projects'),
+                registered_nodes=_running_totals(RegistrationRunningTotals, nodes, 'registered_nodes'),
+                registered_projects=_running_totals(RegistrationRunningTotals, nodes, 'registered_projects'),
             )
 
             reports.append(report)
@@ -0,0 +1,49 @@
+# Generated by Django 3.2.17 on 2026-10-18 12:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('osf', '0020_abstractprovider_advertise_on_discover_page'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NodeClosure',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveIntegerField()),
+                ('ancestor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='osf.abstractnode')),
+                ('descendant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='osf.abstractnode')),
+            ],
+            options={
+                'unique_together': {('ancestor', 'descendant')},
+                'index_together': {('descendant', 'depth')},
+            },
+        ),
+        migrations.RunSQL(
+            [
+                """
+                WITH RECURSIVE expected (ancestor_id, descendant_id, depth) AS (
+                    SELECT parent_id, child_id, 1
+                    FROM osf_noderelation
+                    WHERE is_node_link IS FALSE
+                  UNION
+                    SELECT E.ancestor_id, R.child_id, E.depth + 1
+                    FROM expected AS E
+                      JOIN osf_noderelation AS R ON R.parent_id = E.descendant_id
+                    WHERE R.is_node_link IS FALSE
+                      AND E.depth < 1000
+                )
+                INSERT INTO osf_nodeclosure (ancestor_id, descendant_id, depth)
+                SELECT ancestor_id, descendant_id, MIN(depth)
+                FROM expected
+                GROUP BY ancestor_id, descendant_id;
+                """
+            ],
+            migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,25 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('osf', '0021_nodeclosure'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            [
+                """
+                CREATE INDEX IF NOT EXISTS osf_basefilenode_checked_out_target_index
+                ON public.osf_basefilenode USING btree (target_content_type_id, target_object_id)
+                WHERE (checkout_id IS NOT NULL);
+                """
+            ],
+            [
+                """
+                DROP INDEX IF EXISTS osf_basefilenode_checked_out_target_index;
+                """
+            ],
+        ),
+    ]
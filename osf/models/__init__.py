@@ -57,7 +57,7 @@ from .metaschema import (
     RegistrationSchemaBlock,
 )
 from .node import AbstractNode, Node
-from .node_relation import NodeRelation
+from .node_relation import NodeRelation, NodeClosure
 from .nodelog import NodeLog
 from .notable_domain import NotableDomain, DomainReference
 from .notifications import NotificationDigest, NotificationSubscription
@@ -1,27 +1,39 @@
+import contextlib
+import functools
 import logging
 import random
+import threading
 from typing import Iterable
 
 import bson
 from django.contrib.contenttypes.fields import (GenericForeignKey,
                                                 GenericRelation)
+from django.conf import settings as django_conf_settings
 from django.contrib.contenttypes.models import ContentType
+from django.core.cache import caches
 from django.core.exceptions import MultipleObjectsReturned
 from django.core.exceptions import ValidationError as DjangoValidationError
 from django.db import connections, models
 from django.db.models import ForeignKey
 from django.db.models.query import QuerySet
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from django_extensions.db.models import TimeStampedModel
 from past.builtins import basestring
 
+from framework.guids.handlers import (
+    forget_guid,
+    forget_guid_referent,
+    guid_identity_map,
+    record_duplicate_guid_load,
+)
 from website import settings as website_settings
 from osf.utils.caching import cached_property
 from osf.exceptions import ValidationError
 from osf.utils.fields import LowercaseCharField, NonNaiveDateTimeField
 
 ALPHABET = '23456789abcdefghjkmnpqrstuvwxyz'
+GUID_REFERENT_CACHE_KEY = 'guid_referent:{}'
 
 logger = logging.getLogger(__name__)
 
@@ -30,7 +42,61 @@ def _check_blacklist(guid):
     return BlackListGuid.objects.filter(guid=guid).exists()
 
 
+_guid_pool = threading.local()
+
+
+def generate_guids(count, length=5):
+    """Return ``count`` distinct guids that are neither blacklisted nor taken.
+
+    Candidates are checked against both tables a round at a time, with one query per table.
+    """
+    guids = set()
+    while len(guids) < count:
+        needed = count - len(guids)
+        # Oversample a little so that a round is rarely short of candidates
+        candidates = {''.join(random.sample(ALPHABET, length)) for _ in range(needed + needed // 10 + 1)} - guids
+        candidates -= set(BlackListGuid.objects.filter(guid__in=candidates).values_list('guid', flat=True))
+        candidates -= set(Guid.objects.filter(_id__in=candidates).values_list('_id', flat=True))
+        guids.update(list(candidates)[:needed])
+    return list(guids)
+
+
+@contextlib.contextmanager
+def preallocated_guids(count, length=5):
+    """Draw the guids generated within the block from batches of ``count`` guids allocated by ``generate_guids()``.
+
+    Nested blocks share the outermost batch. Guids left over at the end of the block are never used.
+    """
+    if getattr(_guid_pool, 'guids', None) is not None:
+        yield
+        return
+    _guid_pool.guids, _guid_pool.length, _guid_pool.batch_size = generate_guids(count, length), length, max(count, 1)
+    try:
+        yield
+    finally:
+        _guid_pool.guids = None
+
+
+def preallocates_guids(count):
+    """Decorate a method that creates guid-bearing objects to run it in ``preallocated_guids(count(self))``."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapped(self, *args, **kwargs):
+            if getattr(_guid_pool, 'guids', None) is not None:
+                return func(self, *args, **kwargs)
+            with preallocated_guids(count(self)):
+                return func(self, *args, **kwargs)
+        return wrapped
+    return decorator
+
+
 def generate_guid(length=5):
+    pool = getattr(_guid_pool, 'guids', None)
+    if pool is not None and length == _guid_pool.length:
+        if not pool:
+            pool.extend(generate_guids(_guid_pool.batch_size, length))
+        return pool.pop()
+
     while True:
         guid_id = ''.join(random.sample(ALPHABET, length))
 
@@ -43,6 +109,12 @@ def generate_guid(length=5):
             return guid_id
 
 
+def guid_referent_cache():
+    """The shared cache of guid -> (content type id, object id), or None if it is disabled."""
+    cache_name = getattr(django_conf_settings, 'GUID_LOAD_CACHE_NAME', None)
+    return caches[cache_name] if cache_name else None
+
+
 def generate_object_id():
     return str(bson.ObjectId())
 
@@ -205,10 +277,21 @@ class Guid(BaseModel):
     # Override load in order to load by GUID
     @classmethod
     def load(cls, data, select_for_update=False):
+        identity_map = guid_identity_map()
+        if identity_map is None or select_for_update or not isinstance(data, str):
+            try:
+                return cls.objects.get(_id=data) if not select_for_update else cls.objects.filter(_id=data).select_for_update().get()
+            except cls.DoesNotExist:
+                return None
+        key = (cls, data.lower())
+        if key in identity_map:
+            record_duplicate_guid_load(*key)
+            return identity_map[key]
         try:
-            return cls.objects.get(_id=data) if not select_for_update else cls.objects.filter(_id=data).select_for_update().get()
+            guid = identity_map[key] = cls.objects.get(_id=data)
         except cls.DoesNotExist:
             return None
+        return guid
 
     class Meta:
         ordering = ['-created']
@@ -400,13 +483,46 @@ class GuidMixin(BaseIDMixin):
         # Minor optimization--no need to query if q is None or ''
         if not q:
             return None
+        identity_map = guid_identity_map()
+        if identity_map is None or select_for_update or not isinstance(q, str):
+            return cls._load_by_guid(q, select_for_update=select_for_update)
+        # Repeated loads within a request return the instance loaded first
+        key = (cls, q.lower())
+        if key in identity_map:
+            record_duplicate_guid_load(*key)
+            return identity_map[key]
+        instance = cls._load_by_guid(q)
+        if instance is not None:
+            identity_map[key] = instance
+        return instance
+
+    @classmethod
+    def _load_by_guid(cls, q, select_for_update=False):
+        referent_cache = guid_referent_cache() if isinstance(q, str) and not select_for_update else None
+        if referent_cache is not None:
+            referent = referent_cache.get(GUID_REFERENT_CACHE_KEY.format(q.lower()))
+            if referent is not None:
+                content_type_id, object_id = referent
+                if content_type_id != ContentType.objects.get_for_model(cls).id:
+                    return None
+                try:
+                    return cls.objects.filter(pk=object_id)[:1].get()
+                except cls.DoesNotExist:
+                    return None
         try:
             # guids___id__isnull=False forces an INNER JOIN
             if select_for_update:
                 return cls.objects.filter(guids___id__isnull=False, guids___id=q).select_for_update()[:1].get()
-            return cls.objects.filter(guids___id__isnull=False, guids___id=q)[:1].get()
+            instance = cls.objects.filter(guids___id__isnull=False, guids___id=q)[:1].get()
         except cls.DoesNotExist:
             return None
+        if referent_cache is not None:
+            referent_cache.set(
+                GUID_REFERENT_CACHE_KEY.format(q.lower()),
+                (ContentType.objects.get_for_model(cls).id, instance.pk),
+                django_conf_settings.GUID_LOAD_CACHE_TIMEOUT,
+            )
+        return instance
 
     @property
     def deep_url(self):
@@ -445,3 +561,26 @@ def ensure_guid(sender, instance, created, **kwargs):
             del instance._prefetched_objects_cache['guids']
         Guid.objects.create(object_id=instance.pk, content_type=ContentType.objects.get_for_model(instance),
                             _id=generate_guid(instance.__guid_min_length__))
+
+
+@receiver(post_save, sender=Guid)
+@receiver(post_delete, sender=Guid)
+def invalidate_guid_referent(sender, instance, created=False, **kwargs):
+    """Guids can be repointed or deleted (along with their referent): forget where they pointed."""
+    forget_guid(instance._id)
+    referent_cache = guid_referent_cache()
+    if referent_cache is not None and not created:
+        referent_cache.delete(GUID_REFERENT_CACHE_KEY.format(instance._id))
+
+
+@receiver(post_save)
+def refresh_guid_identity_map(sender, instance, **kwargs):
+    # Other instances of the saved row that were loaded within the request are stale now
+    if guid_identity_map() and issubclass(sender, GuidMixin):
+        forget_guid_referent(instance, keep=True)
+
+
+@receiver(post_delete)
+def forget_deleted_guid_referent(sender, instance, **kwargs):
+    if guid_identity_map() and issubclass(sender, GuidMixin):
+        forget_guid_referent(instance)
@@ -18,12 +18,11 @@ from django.core.exceptions import ImproperlyConfigured
 from django.core.paginator import Paginator
 from django.urls import reverse
 from django.db import models, connection
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.utils import timezone
 from django.utils.functional import cached_property
 from keen import scoped_keys
-from psycopg2._psycopg import AsIs
 from typedmodels.models import TypedModel, TypedModelManager
 from guardian.models import (
     GroupObjectPermissionBase,
@@ -47,7 +46,7 @@ from .metadata import GuidMetadataRecord
 from .mixins import (AddonModelMixin, CommentableMixin, Loggable, GuardianMixin,
                                NodeLinkMixin, SpamOverrideMixin, RegistrationResponseMixin,
                                EditableFieldsMixin)
-from .node_relation import NodeRelation
+from .node_relation import NodeRelation, NodeClosure
 from .nodelog import NodeLog
 from .private_link import PrivateLink
 from .tag import Tag
@@ -78,7 +77,7 @@ from osf.utils.permissions import (
 )
 from website.util.metrics import OsfSourceTags, CampaignSourceTags
 from website.util import api_url_for, api_v2_url, web_url_for
-from .base import BaseModel, GuidMixin, GuidMixinQuerySet
+from .base import BaseModel, GuidMixin, GuidMixinQuerySet, preallocates_guids
 from api.caching.tasks import update_storage_usage
 from api.caching import settings as cache_settings
 from api.caching.utils import storage_usage_cache
@@ -88,6 +87,11 @@ from api.share.utils import update_share
 logger = logging.getLogger(__name__)
 
 
+def subtree_guid_count(node):
+    """Number of guids needed to copy ``node`` and its components, e.g. by forking or registering it."""
+    return NodeClosure.objects.filter(ancestor_id=node.pk, descendant__is_deleted=False).count() + 1
+
+
 class AbstractNodeQuerySet(GuidMixinQuerySet):
 
     def get_roots(self):
@@ -102,46 +106,14 @@ class AbstractNodeQuerySet(GuidMixinQuerySet):
                 query = query.filter(is_deleted=False)
             return query
         else:
-            sql = """
-                WITH RECURSIVE descendants AS (
-                SELECT
-                    parent_id,
-                    child_id,
-                    1 AS LEVEL,
-                    ARRAY[parent_id] as pids
-                FROM %s
-                %s
-                WHERE is_node_link IS FALSE AND parent_id = %s %s
-                UNION ALL
-                SELECT
-                    d.parent_id,
-                    s.child_id,
-                    d.level + 1,
-                    d.pids || s.parent_id
-                FROM descendants AS d
-                    JOIN %s AS s
-                    ON d.child_id = s.parent_id
-                WHERE s.is_node_link IS FALSE AND %s = ANY(pids)
-                ) SELECT array_agg(DISTINCT child_id)
-                FROM descendants
-                WHERE parent_id = %s;
-            """
-            with connection.cursor() as cursor:
-                node_relation_table = AsIs(NodeRelation._meta.db_table)
-                cursor.execute(sql, [
-                    node_relation_table,
-                    AsIs('LEFT JOIN osf_abstractnode ON {}.child_id = osf_abstractnode.id'.format(node_relation_table) if active else ''),
-                    root.pk,
-                    AsIs('AND osf_abstractnode.is_deleted IS FALSE' if active else ''),
-                    node_relation_table,
-                    root.pk,
-                    root.pk])
-                row = cursor.fetchone()[0]
-                if not row:
-                    return AbstractNode.objects.filter(id=root.pk) if include_root else AbstractNode.objects.none()
-                if include_root:
-                    row.append(root.pk)
-                return AbstractNode.objects.filter(id__in=row)
+            descendant_ids = NodeClosure.objects.filter(ancestor_id=root.pk).values('descendant_id')
+            query = Q(id__in=descendant_ids)
+            if include_root:
+                query |= Q(id=root.pk)
+            query = AbstractNode.objects.filter(query)
+            if active:
+                query = query.filter(Q(is_deleted=False) | Q(id=root.pk)) if include_root else query.filter(is_deleted=False)
+            return query
 
     def can_view(self, user=None, private_link=None):
         qs = self.filter(is_public=True)
@@ -159,7 +131,7 @@ class AbstractNodeQuerySet(GuidMixinQuerySet):
             qs |= read_user_query
             qs |= self.extra(where=["""
                 "osf_abstractnode".id in (
-                    WITH RECURSIVE implicit_read AS (
+                    WITH implicit_admin AS (
                         SELECT N.id as node_id
                         FROM osf_abstractnode as N, auth_permission as P, osf_nodegroupobjectpermission as G, osf_osfuser_groups as UG
                         WHERE P.codename = 'admin_node'
@@ -168,12 +140,11 @@ class AbstractNodeQuerySet(GuidMixinQuerySet):
                         AND G.group_id = UG.group_id
                         AND G.content_object_id = N.id
                         AND N.type = 'osf.node'
+                    ) SELECT node_id FROM implicit_admin
                     UNION ALL
-                        SELECT "osf_noderelation"."child_id"
-                        FROM "implicit_read"
-                        LEFT JOIN "osf_noderelation" ON "osf_noderelation"."parent_id" = "implicit_read"."node_id"
-                        WHERE "osf_noderelation"."is_node_link" IS FALSE
-                    ) SELECT * FROM implicit_read
+                        SELECT "osf_nodeclosure"."descendant_id"
+                        FROM implicit_admin
+                        JOIN "osf_nodeclosure" ON "osf_nodeclosure"."ancestor_id" = implicit_admin.node_id
                 )
             """], params=(user.id, ))
         return qs.filter(is_deleted=False)
@@ -1301,39 +1272,15 @@ class AbstractNode(DirtyFieldsMixin, TypedModel, AddonModelMixin, IdentifierMixi
         return self.private_links.filter(is_deleted=True).values_list('key', flat=True)
 
     def get_root(self):
-        sql = """
-            WITH RECURSIVE ascendants AS (
-              SELECT
-                parent_id,
-                child_id,
-                1 AS LEVEL,
-                ARRAY[child_id] as cids
-              FROM %s
-              WHERE is_node_link IS FALSE and child_id = %s
-              UNION ALL
-              SELECT
-                S.parent_id,
-                D.child_id,
-                D.level + 1,
-                D.cids || S.child_id
-              FROM ascendants AS D
-                JOIN %s AS S
-                  ON D.parent_id = S.child_id
-              WHERE S.is_node_link IS FALSE
-                AND %s = ANY(cids)
-            ) SELECT parent_id
-              FROM ascendants
-              WHERE child_id = %s
-              ORDER BY level DESC
-              LIMIT 1;
-        """
-        with connection.cursor() as cursor:
-            node_relation_table = AsIs(NodeRelation._meta.db_table)
-            cursor.execute(sql, [node_relation_table, self.pk, node_relation_table, self.pk, self.pk])
-            res = cursor.fetchone()
-            if res:
-                return AbstractNode.objects.get(pk=res[0])
-            return self
+        root_id = (
+            NodeClosure.objects.filter(descendant_id=self.pk)
+            .order_by('-depth')
+            .values_list('ancestor_id', flat=True)
+            .first()
+        )
+        if root_id:
+            return AbstractNode.objects.get(pk=root_id)
+        return self
 
     def find_readable_antecedent(self, auth):
         """ Returns first antecendant node readable by <user>.
@@ -1373,6 +1320,7 @@ class AbstractNode(DirtyFieldsMixin, TypedModel, AddonModelMixin, IdentifierMixi
                 contributor=user,
                 auth=None, email_template='default', permissions=perm)
 
+    @preallocates_guids(subtree_guid_count)
     def register_node(self, schema, auth, draft_registration, parent=None, child_ids=None, provider=None):
         """Make a frozen copy of a node.
 
@@ -1568,6 +1516,7 @@ class AbstractNode(DirtyFieldsMixin, TypedModel, AddonModelMixin, IdentifierMixi
             new.affiliated_institutions.add(affiliation)
 
     # TODO: Optimize me (e.g. use bulk create)
+    @preallocates_guids(subtree_guid_count)
     def fork_node(self, auth, title=None, parent=None):
         """Recursively fork a node.
 
@@ -1713,6 +1662,7 @@ class AbstractNode(DirtyFieldsMixin, TypedModel, AddonModelMixin, IdentifierMixi
             ]
             NodeLog.objects.bulk_create(logs_to_create)
 
+    @preallocates_guids(subtree_guid_count)
     def use_as_template(self, auth, changes=None, top_level=True, parent=None):
         """Create a new project, using an existing project as a template.
 
@@ -2517,6 +2467,20 @@ def add_default_node_addons(sender, instance, created, **kwargs):
             if 'node' in addon.added_default:
                 instance.add_addon(addon.short_name, auth=None, log=False)
 
+@receiver(post_save, sender=NodeRelation)
+def add_node_closure(sender, instance, created, *args, **kwargs):
+    # Component relations are created here via set_parent_and_root and directly by the
+    # fork, registration and template paths, so the closure table follows the relation itself
+    if created and not instance.is_node_link:
+        NodeClosure.add_relation(instance.parent_id, instance.child_id)
+        NodeClosure.invalidate_lineage(instance.child_id)
+
+@receiver(post_delete, sender=NodeRelation)
+def remove_node_closure(sender, instance, *args, **kwargs):
+    if not instance.is_node_link:
+        NodeClosure.remove_relation(instance.parent_id, instance.child_id)
+        NodeClosure.invalidate_lineage(instance.child_id)
+
 @receiver(post_save, sender=Node)
 @receiver(post_save, sender='osf.Registration')
 @receiver(post_save, sender='osf.QuickFilesNode')
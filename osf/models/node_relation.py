@@ -1,7 +1,17 @@
-from django.db import models
+from django.conf import settings
+from django.core.cache import caches
+from django.db import models, connection
 
 from .base import BaseModel, ObjectIDMixin
 
+NODE_LINEAGE_CACHE_KEY = 'node_lineage:{}'
+
+
+def node_lineage_cache():
+    """The cache of node id -> ancestor guids, or None if it is disabled."""
+    cache_name = getattr(settings, 'NODE_LINEAGE_CACHE_NAME', None)
+    return caches[cache_name] if cache_name else None
+
 
 class NodeRelation(ObjectIDMixin, BaseModel):
     parent = models.ForeignKey('AbstractNode', related_name='node_relations', on_delete=models.CASCADE)
@@ -25,3 +35,148 @@ class NodeRelation(ObjectIDMixin, BaseModel):
         index_together = (
             ('is_node_link', 'child', 'parent'),
         )
+
+
+class NodeClosure(models.Model):
+    """Ancestor/descendant pairs of the component tree (NodeRelations that are not node links).
+
+    Every node has one row per ancestor, with `depth` being the number of component relations
+    between them. Rows are maintained by the NodeRelation signals in osf.models.node and can be
+    rebuilt from osf_noderelation with the `backfill_node_closure` management command.
+    """
+    ancestor = models.ForeignKey('AbstractNode', related_name='+', on_delete=models.CASCADE)
+    descendant = models.ForeignKey('AbstractNode', related_name='+', on_delete=models.CASCADE)
+    depth = models.PositiveIntegerField()
+
+    # All (ancestor, descendant, depth) triples derivable from osf_noderelation
+    EXPECTED_CLOSURE_SQL = """
+        WITH RECURSIVE expected (ancestor_id, descendant_id, depth) AS (
+            SELECT parent_id, child_id, 1
+            FROM osf_noderelation
+            WHERE is_node_link IS FALSE
+          UNION
+            SELECT E.ancestor_id, R.child_id, E.depth + 1
+            FROM expected AS E
+              JOIN osf_noderelation AS R ON R.parent_id = E.descendant_id
+            WHERE R.is_node_link IS FALSE
+              AND E.depth < %s
+        ), expected_closure AS (
+            SELECT ancestor_id, descendant_id, MIN(depth) AS depth
+            FROM expected
+            GROUP BY ancestor_id, descendant_id
+        )
+    """
+    # Guards against cycles in osf_noderelation
+    MAX_DEPTH = 1000
+
+    class Meta:
+        unique_together = ('ancestor', 'descendant')
+        index_together = (
+            ('descendant', 'depth'),
+        )
+
+    def __unicode__(self):
+        return 'ancestor={}, descendant={}, depth={}'.format(self.ancestor_id, self.descendant_id, self.depth)
+
+    @classmethod
+    def add_relation(cls, parent_id, child_id):
+        """Connect `parent_id` and all of its ancestors to `child_id` and all of its descendants."""
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO osf_nodeclosure (ancestor_id, descendant_id, depth)
+                SELECT A.ancestor_id, D.descendant_id, A.depth + D.depth + 1
+                FROM (
+                    SELECT %(parent_id)s AS ancestor_id, 0 AS depth
+                  UNION ALL
+                    SELECT ancestor_id, depth FROM osf_nodeclosure WHERE descendant_id = %(parent_id)s
+                ) AS A CROSS JOIN (
+                    SELECT %(child_id)s AS descendant_id, 0 AS depth
+                  UNION ALL
+                    SELECT descendant_id, depth FROM osf_nodeclosure WHERE ancestor_id = %(child_id)s
+                ) AS D
+                ON CONFLICT (ancestor_id, descendant_id) DO NOTHING;
+            """, {'parent_id': parent_id, 'child_id': child_id})
+
+    @classmethod
+    def remove_relation(cls, parent_id, child_id):
+        """Disconnect `child_id` and its descendants from `parent_id` and its ancestors."""
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                DELETE FROM osf_nodeclosure
+                WHERE ancestor_id IN (
+                    SELECT %(parent_id)s
+                  UNION
+                    SELECT ancestor_id FROM osf_nodeclosure WHERE descendant_id = %(parent_id)s
+                ) AND descendant_id IN (
+                    SELECT %(child_id)s
+                  UNION
+                    SELECT descendant_id FROM osf_nodeclosure WHERE ancestor_id = %(child_id)s
+                );
+            """, {'parent_id': parent_id, 'child_id': child_id})
+
+    @classmethod
+    def ancestor_guids(cls, node_id):
+        """Guids of the ancestors of `node_id`, nearest first, from a single query or the lineage cache."""
+        cache = node_lineage_cache()
+        key = NODE_LINEAGE_CACHE_KEY.format(node_id)
+        lineage = cache.get(key) if cache is not None else None
+        if lineage is not None:
+            return lineage
+        rows = (
+            cls.objects.filter(descendant_id=node_id, ancestor__guids___id__isnull=False)
+            # The guid of a node with several is its latest (see GuidMixin._id)
+            .order_by('depth', '-ancestor__guids__created')
+            .values_list('depth', 'ancestor__guids___id')
+        )
+        lineage, depths = [], set()
+        for depth, guid in rows:
+            if depth not in depths:
+                depths.add(depth)
+                lineage.append(guid)
+        lineage = tuple(lineage)
+        if cache is not None:
+            cache.set(key, lineage, settings.NODE_LINEAGE_CACHE_TIMEOUT)
+        return lineage
+
+    @classmethod
+    def invalidate_lineage(cls, node_id):
+        """Forget the cached lineage of `node_id` and of its descendants, e.g. when it is moved."""
+        cache = node_lineage_cache()
+        if cache is None:
+            return
+        node_ids = [node_id, *cls.objects.filter(ancestor_id=node_id).values_list('descendant_id', flat=True)]
+        cache.delete_many([NODE_LINEAGE_CACHE_KEY.format(node_id) for node_id in node_ids])
+
+    @classmethod
+    def rebuild(cls):
+        """Replace the contents of the closure table with what osf_noderelation implies.
+        Returns the number of rows written.
+        """
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM osf_nodeclosure;')
+            cursor.execute(cls.EXPECTED_CLOSURE_SQL + """
+                INSERT INTO osf_nodeclosure (ancestor_id, descendant_id, depth)
+                SELECT ancestor_id, descendant_id, depth FROM expected_closure;
+            """, [cls.MAX_DEPTH])
+            return cursor.rowcount
+
+    @classmethod
+    def verify(cls):
+        """Compare the closure table against osf_noderelation.
+        Returns a tuple of (missing or wrong rows, extraneous rows).
+        """
+        with connection.cursor() as cursor:
+            cursor.execute(cls.EXPECTED_CLOSURE_SQL + """
+                SELECT
+                  (SELECT COUNT(*) FROM expected_closure AS E
+                   WHERE NOT EXISTS (
+                     SELECT 1 FROM osf_nodeclosure AS C
+                     WHERE C.ancestor_id = E.ancestor_id AND C.descendant_id = E.descendant_id AND C.depth = E.depth
+                   )),
+                  (SELECT COUNT(*) FROM osf_nodeclosure AS C
+                   WHERE NOT EXISTS (
+                     SELECT 1 FROM expected_closure AS E
+                     WHERE C.ancestor_id = E.ancestor_id AND C.descendant_id = E.descendant_id
+                   ));
+            """, [cls.MAX_DEPTH])
+            return cursor.fetchone()
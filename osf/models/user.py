@@ -52,7 +52,7 @@ from osf.utils.datetime_aware_jsonfield import DateTimeAwareJSONField
 from osf.utils.fields import NonNaiveDateTimeField, LowercaseEmailField, ensure_str
 from osf.utils.names import impute_names
 from osf.utils.requests import check_select_for_update
-from osf.utils.permissions import API_CONTRIBUTOR_PERMISSIONS, MANAGER, MEMBER, MANAGE, ADMIN
+from osf.utils.permissions import API_CONTRIBUTOR_PERMISSIONS, MANAGER, MEMBER, MANAGE, ADMIN, READ_NODE
 from website import settings as website_settings
 from website import filters, mails
 from website.project import new_bookmark_collection
@@ -1613,6 +1613,24 @@ class OSFUser(DirtyFieldsMixin, GuidMixin, BaseModel, AbstractBaseUser, Permissi
         """Returns number of "shared projects" (projects that both users are contributors or group members for)"""
         return self._projects_in_common_query(other_user).count()
 
+    def n_projects_in_common_by_user(self, other_user_ids):
+        """Like `n_projects_in_common`, for many users with a single grouped query.
+
+        :param other_user_ids: Primary keys of the other users
+        :returns dict mapping each other user's pk to the number of shared projects; users
+            without any shared project are left out
+        """
+        NodeGroupObjectPermission = apps.get_model('osf', 'NodeGroupObjectPermission')
+        shared_node_ids = self.contributor_or_group_member_to.exclude(type='osf.collection').values('id')
+        counts = NodeGroupObjectPermission.objects.filter(
+            content_object_id__in=shared_node_ids,
+            permission__codename=READ_NODE,
+            group__user__in=other_user_ids,
+        ).order_by().values('group__user').annotate(
+            n_projects=Count('content_object_id', distinct=True),
+        ).values_list('group__user', 'n_projects')
+        return dict(counts)
+
     def add_unclaimed_record(self, claim_origin, referrer, given_name, email=None):
         """Add a new project entry in the unclaimed records dictionary.
 
@@ -0,0 +1,88 @@
+import pytest
+
+from osf.management.commands.backfill_node_closure import backfill_node_closure
+from osf.models import AbstractNode, NodeClosure, NodeRelation
+from osf_tests.factories import (
+    NodeFactory,
+    ProjectFactory,
+    RegistrationFactory,
+    UserFactory,
+)
+
+
+@pytest.mark.django_db
+class TestNodeClosure:
+
+    @pytest.fixture()
+    def user(self):
+        return UserFactory()
+
+    @pytest.fixture()
+    def project(self, user):
+        return ProjectFactory(creator=user)
+
+    @pytest.fixture()
+    def component(self, user, project):
+        return NodeFactory(creator=user, parent=project)
+
+    @pytest.fixture()
+    def subcomponent(self, user, component):
+        return NodeFactory(creator=user, parent=component)
+
+    @pytest.fixture()
+    def subsubcomponent(self, user, subcomponent):
+        return NodeFactory(creator=user, parent=subcomponent)
+
+    def test_closure_rows_follow_component_relations(self, project, component, subcomponent, subsubcomponent):
+        ancestry = {
+            (row.ancestor_id, row.descendant_id): row.depth
+            for row in NodeClosure.objects.filter(ancestor_id__in=[project.id, component.id, subcomponent.id])
+        }
+        assert ancestry == {
+            (project.id, component.id): 1,
+            (project.id, subcomponent.id): 2,
+            (project.id, subsubcomponent.id): 3,
+            (component.id, subcomponent.id): 1,
+            (component.id, subsubcomponent.id): 2,
+            (subcomponent.id, subsubcomponent.id): 1,
+        }
+
+    def test_node_links_are_not_in_closure(self, user, project, component):
+        linked = ProjectFactory(creator=user)
+        NodeRelation.objects.create(parent=component, child=linked, is_node_link=True)
+        assert not NodeClosure.objects.filter(descendant_id=linked.id).exists()
+
+    def test_get_root_and_children(self, project, component, subcomponent, subsubcomponent):
+        assert subsubcomponent.get_root() == project
+        assert project.get_root() == project
+        assert set(AbstractNode.objects.get_children(component)) == {subcomponent, subsubcomponent}
+        assert set(AbstractNode.objects.get_children(component, include_root=True)) == {component, subcomponent, subsubcomponent}
+        assert not AbstractNode.objects.get_children(subsubcomponent).exists()
+
+        subsubcomponent.is_deleted = True
+        subsubcomponent.save()
+        assert set(AbstractNode.objects.get_children(component, active=True)) == {subcomponent}
+
+    def test_registration_tree_is_in_closure(self, user, project, component, subcomponent):
+        registration = RegistrationFactory(project=project, creator=user)
+        registered_subcomponent = registration.descendants.get(registered_from=subcomponent)
+        assert registered_subcomponent.get_root() == registration
+
+    def test_removing_relation_removes_closure(self, project, component, subcomponent, subsubcomponent):
+        NodeRelation.objects.get(parent=component, child=subcomponent).delete()
+        assert not NodeClosure.objects.filter(descendant_id__in=[subcomponent.id, subsubcomponent.id], ancestor_id__in=[project.id, component.id]).exists()
+        assert NodeClosure.objects.filter(ancestor_id=subcomponent.id, descendant_id=subsubcomponent.id).exists()
+
+    def test_backfill_and_verify(self, project, component, subcomponent, subsubcomponent):
+        assert backfill_node_closure(verify_only=True) == (0, 0)
+
+        NodeClosure.objects.filter(ancestor_id=project.id).delete()
+        NodeClosure.objects.create(ancestor_id=subsubcomponent.id, descendant_id=project.id, depth=1)
+        assert backfill_node_closure(verify_only=True) == (3, 1)
+        assert backfill_node_closure(dry_run=True) == (0, 0)
+        assert NodeClosure.verify() == (3, 1)
+
+        assert backfill_node_closure() == (0, 0)
+        assert NodeClosure.verify() == (0, 0)
+        assert subsubcomponent.get_root() == project
+
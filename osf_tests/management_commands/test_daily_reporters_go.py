@@ -0,0 +1,65 @@
+import datetime
+import threading
+from unittest import mock
+
+import pytest
+
+from osf.management.commands import daily_reporters_go as command
+
+
+REPORT_DATE = datetime.date(2022, 5, 18)
+
+
+class FakeReporter:
+    ran = []
+
+    def run_and_record_for_date(self, report_date, also_send_to_keen=False):
+        assert report_date == REPORT_DATE
+        self.ran.append((self.__class__.__name__, threading.get_ident()))
+
+
+class FakeCountReporter(FakeReporter):
+    pass
+
+
+class FakeSummaryReporter(FakeReporter):
+    pass
+
+
+class FakeBrokenReporter(FakeReporter):
+    def run_and_record_for_date(self, report_date, also_send_to_keen=False):
+        raise ValueError('broken')
+
+
+class TestDailyReportersGo:
+
+    @pytest.fixture(autouse=True)
+    def reporters(self):
+        FakeReporter.ran = []
+        reporters = (FakeCountReporter, FakeBrokenReporter, FakeSummaryReporter)
+        with mock.patch.object(command, 'DAILY_REPORTERS', reporters), \
+                mock.patch.object(command, 'init_app'), \
+                mock.patch.object(command.sentry, 'log_exception'):
+            yield reporters
+
+    @pytest.mark.parametrize('parallel', [None, 1, 3])
+    def test_errors_and_timings(self, parallel):
+        errors, timings = command.run_daily_reporters(report_date=REPORT_DATE, parallel=parallel)
+
+        assert errors == {'FakeBrokenReporter': repr(ValueError('broken'))}
+        assert set(timings) == {'FakeCountReporter', 'FakeBrokenReporter', 'FakeSummaryReporter'}
+        assert all(seconds >= 0 for seconds in timings.values())
+        assert sorted(name for name, _ in FakeReporter.ran) == ['FakeCountReporter', 'FakeSummaryReporter']
+
+    def test_parallel_runs_off_the_calling_thread(self):
+        command.run_daily_reporters(report_date=REPORT_DATE, parallel=2)
+        assert all(thread_id != threading.get_ident() for _, thread_id in FakeReporter.ran)
+
+    def test_filter(self):
+        errors, timings = command.run_daily_reporters(report_date=REPORT_DATE, reporter_filter='summary', parallel=2)
+        assert errors == {}
+        assert list(timings) == ['FakeSummaryReporter']
+
+    def test_task_returns_errors(self):
+        errors = command.daily_reporters_go(report_date=REPORT_DATE, parallel=2)
+        assert errors == {'FakeBrokenReporter': repr(ValueError('broken'))}
@@ -20,7 +20,7 @@ class TestRecatalogMetadata:
 
     @pytest.fixture
     def mock_update_share_task(self):
-        with mock.patch('osf.management.commands.recatalog_metadata.task__update_share') as _shmock:
+        with mock.patch('osf.management.commands.recatalog_metadata.task__update_share_batch') as _shmock:
             yield _shmock
 
     @pytest.fixture
@@ -183,6 +183,18 @@ class TestRecatalogMetadata:
 
         mock_update_share_task.reset_mock()
 
+        # batching within a chunk
+        with mock.patch('website.settings.SHARE_UPDATE_BATCH_SIZE', 3):
+            call_command(
+                'recatalog_metadata',
+                '--registrations',
+                '--providers',
+                registration_provider._id,
+            )
+        assert mock_update_share_task.apply_async.mock_calls == expected_apply_async_calls(registrations, batch_size=3)
+
+        mock_update_share_task.reset_mock()
+
         # datacite custom types
         call_command(
             'recatalog_metadata',
@@ -190,8 +202,9 @@ class TestRecatalogMetadata:
         )
         _expected_osfids = set(_iter_osfids(items_with_custom_datacite_type))
         _actual_osfids = {
-            _call[-1]['kwargs']['guid']
+            _osfid
             for _call in mock_update_share_task.apply_async.mock_calls
+            for _osfid in _call[-1]['kwargs']['guids']
         }
         assert _expected_osfids == _actual_osfids
 
@@ -199,16 +212,17 @@ class TestRecatalogMetadata:
 ###
 # local utils
 
-def expected_apply_async_calls(items):
+def expected_apply_async_calls(items, batch_size=100):
+    _osfids = list(_iter_osfids(items))
     return [
         mock.call(
             kwargs={
-                'guid': _osfid,
+                'guids': _osfids[_start:_start + batch_size],
                 'is_backfill': True,
             },
             queue='low',
         )
-        for _osfid in _iter_osfids(items)
+        for _start in range(0, len(_osfids), batch_size)
     ]
 
 
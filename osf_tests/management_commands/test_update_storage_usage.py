@@ -0,0 +1,121 @@
+from unittest import mock
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api.caching import settings as cache_settings
+from api.caching.tasks import (
+    apply_storage_usage_delta,
+    apply_storage_usage_deltas,
+    compute_storage_usage,
+    reconcile_storage_usage,
+)
+from api.caching.utils import storage_usage_cache
+from api_tests.utils import create_test_file
+from osf.management.commands.update_storage_usage import update_storage_usage
+from osf.models import NodeLog
+from osf_tests.factories import ProjectFactory, UserFactory
+from website import settings
+
+
+@pytest.mark.django_db
+class TestStorageUsageReconciliation:
+
+    @pytest.fixture()
+    def user(self):
+        return UserFactory()
+
+    @pytest.fixture()
+    def project(self, user):
+        project = ProjectFactory(creator=user)
+        for i in range(5):
+            create_test_file(project, user, filename='file_{}'.format(i), size=100 + i)
+        return project
+
+    @pytest.fixture()
+    def key(self, project):
+        return cache_settings.STORAGE_USAGE_KEY.format(target_id=project._id)
+
+    def test_compute_storage_usage_pages_by_key(self, project):
+        expected = sum(100 + i for i in range(5))
+        assert compute_storage_usage(project.id) == expected
+        assert compute_storage_usage(project.id, per_page=2) == expected
+        assert compute_storage_usage(project.id, per_page=5) == expected
+        assert compute_storage_usage(project.id, per_page=1) == expected
+
+    def test_compute_storage_usage_ignores_deleted_files(self, project, user):
+        deleted = create_test_file(project, user, filename='deleted', size=1000)
+        deleted.delete()
+        assert compute_storage_usage(project.id, per_page=2) == sum(100 + i for i in range(5))
+
+    def test_apply_storage_usage_delta(self, project, key):
+        storage_usage_cache.set(key, 500, settings.STORAGE_USAGE_CACHE_TIMEOUT)
+
+        apply_storage_usage_delta(project, 25)
+        assert storage_usage_cache.get(key) == 525
+
+        apply_storage_usage_delta(project, -1000)
+        assert storage_usage_cache.get(key) == 0
+
+    def test_apply_storage_usage_delta_locks_target(self, project, key):
+        storage_usage_cache.set(key, 500, settings.STORAGE_USAGE_CACHE_TIMEOUT)
+
+        with CaptureQueriesContext(connection) as queries:
+            apply_storage_usage_delta(project, 25)
+        assert [query['sql'] for query in queries if 'pg_advisory_xact_lock' in query['sql']] == [
+            'SELECT pg_advisory_xact_lock({}, {})'.format(cache_settings.STORAGE_USAGE_LOCK_ID, project.pk),
+        ]
+        # the node's row is left alone
+        assert not any('FOR UPDATE' in query['sql'] for query in queries)
+        assert storage_usage_cache.get(key) == 525
+
+    def test_apply_storage_usage_deltas_locks_in_pk_order(self, project, user, key):
+        other = ProjectFactory(creator=user)
+        other_key = cache_settings.STORAGE_USAGE_KEY.format(target_id=other._id)
+        storage_usage_cache.set(key, 500, settings.STORAGE_USAGE_CACHE_TIMEOUT)
+        storage_usage_cache.set(other_key, 0, settings.STORAGE_USAGE_CACHE_TIMEOUT)
+
+        with CaptureQueriesContext(connection) as queries:
+            apply_storage_usage_deltas([(other, 25), (project, -25)])
+        assert [query['sql'] for query in queries if 'pg_advisory_xact_lock' in query['sql']] == [
+            'SELECT pg_advisory_xact_lock({}, {})'.format(cache_settings.STORAGE_USAGE_LOCK_ID, pk)
+            for pk in sorted([project.pk, other.pk])
+        ]
+        assert storage_usage_cache.get(key) == 475
+        assert storage_usage_cache.get(other_key) == 25
+
+    def test_apply_storage_usage_delta_after_cull(self, project, key):
+        # a counter culled past STORAGE_USAGE_MAX_ENTRIES is recomputed, not restarted from the delta
+        storage_usage_cache.set(key, 500, settings.STORAGE_USAGE_CACHE_TIMEOUT)
+        storage_usage_cache.delete(key)
+
+        with mock.patch('api.caching.tasks.update_storage_usage') as mock_update_storage_usage:
+            apply_storage_usage_delta(project, 25)
+        mock_update_storage_usage.assert_called_once_with(project)
+        assert storage_usage_cache.get(key) is None
+
+    def test_reconcile_reports_drift(self, project, key):
+        storage_usage_cache.set(key, 10, settings.STORAGE_USAGE_CACHE_TIMEOUT)
+
+        assert reconcile_storage_usage(project.id, project._id) == 500
+        assert storage_usage_cache.get(key) == 510
+        assert reconcile_storage_usage(project.id, project._id) == 0
+
+    def test_reconcile_without_counter(self, project, key):
+        storage_usage_cache.delete(key)
+
+        assert reconcile_storage_usage(project.id, project._id) is None
+        assert storage_usage_cache.get(key) == 510
+
+    def test_command_reconciles_nodes_with_file_changes(self, project, user, key):
+        other = ProjectFactory(creator=user)
+        other_key = cache_settings.STORAGE_USAGE_KEY.format(target_id=other._id)
+        project.add_log(NodeLog.FILE_ADDED, params={'node': project._id}, auth=None)
+        storage_usage_cache.set(key, 0, settings.STORAGE_USAGE_CACHE_TIMEOUT)
+        storage_usage_cache.set(other_key, 42, settings.STORAGE_USAGE_CACHE_TIMEOUT)
+
+        update_storage_usage()
+
+        assert storage_usage_cache.get(key) == 510
+        assert storage_usage_cache.get(other_key) == 42
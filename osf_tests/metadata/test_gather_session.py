@@ -0,0 +1,78 @@
+from unittest import mock
+import uuid
+
+import pytest
+import rdflib
+
+from osf.metadata import gather
+from osf.metadata.gather.gatherer import get_gatherers
+from osf.metadata.tools import pls_gather_metadata_file, pls_gather_metadata_files
+from osf_tests import factories
+
+
+@pytest.fixture
+def blarg():
+    # a namespace per test, since gatherers stay registered
+    return rdflib.Namespace(f'https://blarg.example/{uuid.uuid4()}/')
+
+
+@pytest.fixture
+def mock_gatherers(blarg):
+    mock_gatherers = {
+        blarg.creator: mock.Mock(side_effect=lambda focus: iter((
+            (focus.iri, blarg.creator, gather.Focus(blarg.person, blarg.Person)),
+        ))),
+        blarg.name: mock.Mock(side_effect=lambda focus: iter((
+            (focus.iri, blarg.name, rdflib.Literal('blarg')),
+        ))),
+    }
+    gather.er(blarg.creator, focustype_iris=[blarg.Item])(mock_gatherers[blarg.creator])
+    gather.er(blarg.name, focustype_iris=[blarg.Person])(mock_gatherers[blarg.name])
+    return mock_gatherers
+
+
+def test_shared_focus_gathered_once(blarg, mock_gatherers):
+    session = gather.GatherSession()
+    foci = [gather.Focus(blarg[f'item{i}'], blarg.Item) for i in range(3)]
+    baskets = session.pls_gather(foci, {blarg.creator: {blarg.name: None}})
+
+    assert [basket.focus for basket in baskets] == foci
+    for basket in baskets:
+        assert set(basket[blarg.creator]) == {blarg.person}
+        assert set(basket[blarg.creator / blarg.name]) == {rdflib.Literal('blarg')}
+    assert mock_gatherers[blarg.creator].call_count == 3  # once per item
+    assert mock_gatherers[blarg.name].call_count == 1     # once per session
+    assert (session.misses, session.hits) == (4, 2)
+
+
+def test_baskets_without_session(blarg, mock_gatherers):
+    for i in range(2):
+        basket = gather.Basket(gather.Focus(blarg[f'item{i}'], blarg.Item))
+        basket.pls_gather({blarg.creator: {blarg.name: None}})
+        assert set(basket[blarg.creator / blarg.name]) == {rdflib.Literal('blarg')}
+    assert mock_gatherers[blarg.name].call_count == 2
+
+
+def test_least_recently_used_forgotten(blarg, mock_gatherers):
+    session = gather.GatherSession(maxsize=2)
+    foci = [gather.Focus(blarg[f'item{i}'], blarg.Item) for i in range(3)]
+    (gatherer,) = get_gatherers(blarg.Item, [blarg.creator])
+    for focus in (foci[0], foci[1], foci[0], foci[2]):
+        session.gathertask_results(gatherer, focus)
+    assert mock_gatherers[blarg.creator].call_count == 3
+    session.gathertask_results(gatherer, foci[0])  # still remembered
+    assert mock_gatherers[blarg.creator].call_count == 3
+    session.gathertask_results(gatherer, foci[1])  # forgotten
+    assert mock_gatherers[blarg.creator].call_count == 4
+    assert len(session._gathered) == 2
+
+
+@pytest.mark.django_db
+def test_metadata_files_match_unshared():
+    user = factories.UserFactory()
+    projects = [factories.ProjectFactory(creator=user, is_public=True) for _ in range(3)]
+    expected = [pls_gather_metadata_file(project, 'turtle') for project in projects]
+
+    session = gather.GatherSession()
+    assert list(pls_gather_metadata_files(projects, 'turtle', gather_session=session)) == expected
+    assert session.hits  # e.g. the shared creator
@@ -0,0 +1,201 @@
+import datetime
+
+import pytest
+from django.db.models import Q
+from django.utils import timezone
+
+from osf.metrics.reporters.institution_summary import InstitutionSummaryReporter
+from osf.metrics.reports import (
+    InstitutionSummaryReport,
+    RunningTotal,
+    NodeRunningTotals,
+    RegistrationRunningTotals,
+)
+from osf.models import AbstractNode, Institution
+from osf_tests.factories import (
+    AuthUserFactory,
+    DraftNodeFactory,
+    EmbargoFactory,
+    InstitutionFactory,
+    NodeFactory,
+    ProjectFactory,
+    RegistrationFactory,
+    UserFactory,
+)
+
+
+def legacy_institution_summary_reports(date):
+    """the per-institution queries InstitutionSummaryReporter used to run, kept for parity"""
+    reports = []
+    daily_query = Q(created__date=date)
+    public_query = Q(is_public=True)
+    private_query = Q(is_public=False)
+    embargo_v2_query = Q(root__embargo__end_date__date__gt=date)
+
+    for institution in Institution.objects.all():
+        node_qs = institution.nodes.filter(
+            deleted__isnull=True,
+            created__date__lte=date,
+        ).exclude(type='osf.registration')
+        registration_qs = institution.nodes.filter(
+            deleted__isnull=True,
+            created__date__lte=date,
+            type='osf.registration',
+        )
+        reports.append(InstitutionSummaryReport(
+            report_date=date,
+            institution_id=institution._id,
+            institution_name=institution.name,
+            users=RunningTotal(
+                total=institution.get_institution_users().filter(is_active=True).count(),
+                total_daily=institution.get_institution_users().filter(date_confirmed__date=date).count(),
+            ),
+            nodes=NodeRunningTotals(
+                total=node_qs.count(),
+                public=node_qs.filter(public_query).count(),
+                private=node_qs.filter(private_query).count(),
+                total_daily=node_qs.filter(daily_query).count(),
+                public_daily=node_qs.filter(public_query & daily_query).count(),
+                private_daily=node_qs.filter(private_query & daily_query).count(),
+            ),
+            projects=NodeRunningTotals(
+                total=node_qs.get_roots().count(),
+                public=node_qs.filter(public_query).get_roots().count(),
+                private=node_qs.filter(private_query).get_roots().count(),
+                total_daily=node_qs.filter(daily_query).get_roots().count(),
+                public_daily=node_qs.filter(public_query & daily_query).get_roots().count(),
+                private_daily=node_qs.filter(private_query & daily_query).get_roots().count(),
+            ),
+            registered_nodes=RegistrationRunningTotals(
+                total=registration_qs.count(),
+                public=registration_qs.filter(public_query).count(),
+                embargoed=registration_qs.filter(private_query).count(),
+                embargoed_v2=registration_qs.filter(private_query & embargo_v2_query).count(),
+                total_daily=registration_qs.filter(daily_query).count(),
+                public_daily=registration_qs.filter(public_query & daily_query).count(),
+                embargoed_daily=registration_qs.filter(private_query & daily_query).count(),
+                embargoed_v2_daily=registration_qs.filter(private_query & daily_query & embargo_v2_query).count(),
+            ),
+            registered_projects=RegistrationRunningTotals(
+                total=registration_qs.get_roots().count(),
+                public=registration_qs.filter(public_query).get_roots().count(),
+                embargoed=registration_qs.filter(private_query).get_roots().count(),
+                embargoed_v2=registration_qs.filter(private_query & embargo_v2_query).get_roots().count(),
+                total_daily=registration_qs.filter(daily_query).get_roots().count(),
+                public_daily=registration_qs.filter(public_query & daily_query).get_roots().count(),
+                embargoed_daily=registration_qs.filter(private_query & daily_query).get_roots().count(),
+                embargoed_v2_daily=registration_qs.filter(private_query & daily_query & embargo_v2_query).get_roots().count(),
+            ),
+        ))
+    return reports
+
+
+def _affiliate(institution, *nodes):
+    for node in nodes:
+        node.affiliated_institutions.add(institution)
+
+
+def _set_created(created, *nodes):
+    AbstractNode.objects.filter(id__in=[node.id for node in nodes]).update(created=created)
+
+
+@pytest.mark.django_db
+class TestInstitutionSummaryReporter:
+
+    @pytest.fixture()
+    def today(self):
+        return timezone.now().date()
+
+    @pytest.fixture()
+    def institution(self):
+        return InstitutionFactory()
+
+    @pytest.fixture()
+    def other_institution(self):
+        return InstitutionFactory()
+
+    @pytest.fixture()
+    def empty_institution(self):
+        return InstitutionFactory()
+
+    @pytest.fixture()
+    def users(self, institution, other_institution):
+        yesterday = timezone.now() - datetime.timedelta(days=1)
+        active = AuthUserFactory(date_confirmed=timezone.now())
+        old = AuthUserFactory(date_confirmed=yesterday)
+        inactive = UserFactory(is_active=False, date_confirmed=None)
+        for user in (active, old, inactive):
+            user.add_or_update_affiliated_institution(institution)
+        old.add_or_update_affiliated_institution(other_institution)
+        return active, old, inactive
+
+    @pytest.fixture()
+    def nodes(self, institution, other_institution, today):
+        last_week = timezone.now() - datetime.timedelta(days=7)
+
+        public_project = ProjectFactory(is_public=True)
+        private_project = ProjectFactory(is_public=False)
+        public_component = NodeFactory(parent=public_project, is_public=True)
+        private_component = NodeFactory(parent=public_project, is_public=False)
+        orphaned_component = NodeFactory(parent=ProjectFactory(is_public=True), is_public=True)
+        old_project = ProjectFactory(is_public=True)
+        deleted_project = ProjectFactory(is_public=True)
+        deleted_project.is_deleted = True
+        deleted_project.deleted = timezone.now()
+        deleted_project.save()
+        draft_node = DraftNodeFactory()
+        _set_created(last_week, old_project)
+
+        _affiliate(
+            institution,
+            public_project, private_project, public_component, private_component,
+            orphaned_component, old_project, deleted_project, draft_node,
+        )
+        _affiliate(other_institution, private_project, private_component)
+
+        public_registration = RegistrationFactory(project=public_project, is_public=True)
+        embargoed_registration = RegistrationFactory(
+            is_public=False,
+            embargo=EmbargoFactory(end_date=timezone.now() + datetime.timedelta(days=30)),
+        )
+        expired_embargo_registration = RegistrationFactory(
+            is_public=False,
+            embargo=EmbargoFactory(end_date=timezone.now() - datetime.timedelta(days=30)),
+        )
+        old_registration = RegistrationFactory(is_public=True)
+        _set_created(last_week, old_registration)
+        registrations = [
+            public_registration, embargoed_registration, expired_embargo_registration, old_registration,
+            *public_registration.get_descendants_recursive(),
+        ]
+        _affiliate(institution, *registrations)
+        _affiliate(other_institution, embargoed_registration)
+
+    def test_parity_with_legacy_reports(self, institution, other_institution, empty_institution, users, nodes, today):
+        for date in (today, today - datetime.timedelta(days=1), today - datetime.timedelta(days=7)):
+            reports = InstitutionSummaryReporter().report(date)
+            legacy_reports = legacy_institution_summary_reports(date)
+
+            assert len(reports) == len(legacy_reports) == 3
+            assert (
+                {report.institution_id: report.to_dict() for report in reports}
+                == {report.institution_id: report.to_dict() for report in legacy_reports}
+            )
+
+    def test_counts(self, institution, empty_institution, users, nodes, today):
+        reports = {
+            report.institution_id: report
+            for report in InstitutionSummaryReporter().report(today)
+        }
+
+        report = reports[institution._id]
+        assert report.users.to_dict() == {'total': 2, 'total_daily': 1}
+        assert report.nodes.total == 7
+        assert report.projects.total == 3
+        assert report.projects.total_daily == 2
+        assert report.registered_nodes.embargoed_v2 == 1
+
+        empty_report = reports[empty_institution._id]
+        assert empty_report.users.to_dict() == {'total': 0, 'total_daily': 0}
+        assert empty_report.nodes.total == 0
+        assert empty_report.registered_projects.total == 0
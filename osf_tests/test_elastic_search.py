@@ -1,30 +1,40 @@
 # -*- coding: utf-8 -*-
 from __future__ import absolute_import, division, print_function, unicode_literals
 
+import datetime
+import json
 import mock
 import time
 import unittest
 import logging
 import functools
+import unicodedata
 
 from nose.tools import *  # noqa: F403
 import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 
 from framework.auth.core import Auth
 
 from website import settings
 import website.search.search as search
 from website.search import elastic_search
-from website.search.util import build_query
+from website.search.util import build_query, clean_splitters
 from website.search_migration.migrate import migrate
 from osf.models import (
+    AbstractNode,
+    GuidMetadataRecord,
     Retraction,
     NodeLicense,
     OSFGroup,
     Tag,
     Preprint,
 )
+from osf.models.licenses import serialize_node_license_record
 from addons.wiki.models import WikiPage
+from addons.wiki.tests.factories import WikiFactory, WikiVersionFactory
 from addons.osfstorage.models import OsfStorageFile
 from addons.osfstorage import settings as osfstorage_settings
 
@@ -1101,6 +1111,33 @@ class TestAddContributor(OsfTestCase):
         contribs = search.search_contributor(unreg.fullname)
         assert_equal(len(contribs['users']), 0)
 
+    def test_projects_in_common(self):
+        with run_celery_tasks():
+            others = [factories.UserFactory(fullname='Brian{} May'.format(i)) for i in range(3)]
+        project = factories.ProjectFactory(creator=self.user)
+        for other in others[:2]:
+            project.add_contributor(other, auth=Auth(self.user), save=True)
+
+        contribs = search.search_contributor('Brian', current_user=self.user)
+        n_projects_in_common = {contrib['id']: contrib['n_projects_in_common'] for contrib in contribs['users']}
+        assert_equal(n_projects_in_common, {others[0]._id: 1, others[1]._id: 1, others[2]._id: 0})
+
+        contribs = search.search_contributor(self.name1, current_user=self.user)
+        assert_equal(contribs['users'][0]['n_projects_in_common'], -1)
+
+    def test_hydration_queries_do_not_grow_with_page_size(self):
+        with run_celery_tasks():
+            for i in range(6):
+                factories.UserFactory(fullname='Freddie{} Mercury'.format(i))
+
+        def count_queries(size):
+            with CaptureQueriesContext(connection) as queries:
+                contribs = search.search_contributor('Freddie', size=size, current_user=self.user)
+            return len(contribs['users']), len(queries)
+
+        assert_equal(count_queries(2)[1], count_queries(6)[1])
+        assert_equal(count_queries(6)[0], 6)
+
     def test_unreg_users_do_show_on_projects(self):
         with run_celery_tasks():
             unreg = factories.UnregUserFactory(fullname='Robert Paulson')
@@ -1344,6 +1381,226 @@ class TestSearchExceptions(OsfTestCase):
         self.project.save()
 
 
+@pytest.mark.enable_search
+@pytest.mark.enable_enqueue_task
+class TestStreamBulkUpdate(OsfTestCase):
+
+    def setUp(self):
+        super(TestStreamBulkUpdate, self).setUp()
+        self.user = factories.UserFactory(fullname='John Deacon')
+        self.groups = [
+            OSFGroup.objects.create(name='Killer Queen {}'.format(i), creator=self.user)
+            for i in range(5)
+        ]
+        self.queryset = OSFGroup.objects.filter(id__in=[group.id for group in self.groups])
+        search.delete_index(elastic_search.INDEX)
+        search.create_index(elastic_search.INDEX)
+        self.serialize = functools.partial(search.update_group, index=elastic_search.INDEX, bulk=True, async_update=False)
+
+    def test_iter_queryset_chunks(self):
+        chunks = list(elastic_search.iter_queryset_chunks(self.queryset, chunk_size=2))
+        assert_equal([len(chunk) for chunk in chunks], [2, 2, 1])
+        assert_equal([group.id for chunk in chunks for group in chunk], sorted(group.id for group in self.groups))
+
+    def test_stream_bulk_update_nodes(self):
+        assert_equal(len(query('Killer Queen')['results']), 0)
+
+        indexed, failed = search.stream_bulk_update_nodes(self.serialize, self.queryset, index=elastic_search.INDEX, chunk_size=2)
+
+        assert_equal((indexed, failed), (5, 0))
+        assert_equal(len(query('Killer Queen')['results']), 5)
+
+    def test_stream_bulk_update_nodes_refreshes_once(self):
+        with mock.patch.object(elastic_search.helpers, 'streaming_bulk', wraps=elastic_search.helpers.streaming_bulk) as mock_bulk:
+            with mock.patch.object(elastic_search.client().indices, 'refresh', wraps=elastic_search.client().indices.refresh) as mock_refresh:
+                search.stream_bulk_update_nodes(self.serialize, self.queryset, index=elastic_search.INDEX, chunk_size=2)
+
+        assert_equal(mock_bulk.call_args[1]['refresh'], False)
+        assert_equal(mock_refresh.call_count, 1)
+
+
+@pytest.mark.enable_search
+@pytest.mark.enable_enqueue_task
+class TestContributorUpdates(OsfTestCase):
+
+    def setUp(self):
+        super(TestContributorUpdates, self).setUp()
+        search.delete_index(elastic_search.INDEX)
+        search.create_index(elastic_search.INDEX)
+        self.user = factories.UserFactory(fullname='Brian May')
+        self.other = factories.UserFactory(fullname='Roger Taylor')
+        with run_celery_tasks():
+            self.project = factories.ProjectFactory(title='Bohemian', creator=self.user, is_public=True)
+            self.project.add_contributor(self.other, auth=Auth(self.user), save=True)
+            self.component = factories.NodeFactory(title='Rhapsody', parent=self.project, creator=self.user, is_public=True)
+            self.private = factories.ProjectFactory(title='Innuendo', creator=self.user, is_public=False)
+
+    def test_serialize_contributors_for_nodes(self):
+        contributors = elastic_search.serialize_contributors_for_nodes([self.project.id, self.component.id])
+        assert_equal(contributors[self.project.id], elastic_search.serialize_contributors(self.project)['contributors'])
+        assert_equal(contributors[self.component.id], elastic_search.serialize_contributors(self.component)['contributors'])
+
+    def test_contributor_name_change_updates_public_nodes_only(self):
+        with run_celery_tasks():
+            self.user.fullname = 'Freddie Mercury'
+            self.user.save()
+            self.user.update_search_nodes_contributors()
+
+        docs = query('Bohemian')['results'] + query('Rhapsody')['results']
+        assert_equal(len(docs), 2)
+        for doc in docs:
+            assert_in('Freddie Mercury', [contributor['fullname'] for contributor in doc['contributors']])
+        assert_equal(len(query('Innuendo')['results']), 0)
+
+    def test_stream_contributor_updates(self):
+        with mock.patch.object(elastic_search.client().indices, 'refresh', wraps=elastic_search.client().indices.refresh) as mock_refresh:
+            updated, failed = elastic_search.stream_contributor_updates(
+                self.user.visible_contributor_to, index=elastic_search.INDEX, chunk_size=2
+            )
+        assert_equal((updated, failed), (2, 0))
+        assert_equal(mock_refresh.call_count, 1)
+
+
+def legacy_serialize_node(node, category):
+    """serialize_node as it was before relations were loaded per batch, kept for parity"""
+    parent_id = node.parent_id
+    normalized_title = unicodedata.normalize('NFKD', node.title)
+    elastic_document = {
+        **elastic_search.serialize_guid_metadata(node._id),
+        'id': node._id,
+        'contributors': [
+            {
+                'fullname': x['user__fullname'],
+                'url': '/{}/'.format(x['user__guids___id']) if x['user__is_active'] else None
+            }
+            for x in node.contributor_set.filter(visible=True).order_by('_order')
+            .values('user__fullname', 'user__guids___id', 'user__is_active')
+        ],
+        'groups': [
+            {
+                'name': x['name'],
+                'url': '/{}/'.format(x['_id'])
+            }
+            for x in node.osf_groups.values('name', '_id')
+        ],
+        'title': node.title,
+        'normalized_title': normalized_title,
+        'category': category,
+        'public': node.is_public,
+        'tags': list(node.tags.filter(system=False).values_list('name', flat=True)),
+        'description': node.description,
+        'url': node.url,
+        'is_registration': node.is_registration,
+        'is_pending_registration': node.is_pending_registration,
+        'is_retracted': node.is_retracted,
+        'is_pending_retraction': node.is_pending_retraction,
+        'embargo_end_date': node.embargo_end_date.strftime('%A, %b. %d, %Y') if node.embargo_end_date else False,
+        'is_pending_embargo': node.is_pending_embargo,
+        'registered_date': node.registered_date,
+        'wikis': {},
+        'parent_id': parent_id,
+        'date_created': node.created,
+        'license': serialize_node_license_record(node.license),
+        'affiliated_institutions': list(node.affiliated_institutions.values_list('name', flat=True)),
+        'boost': int(not node.is_registration) + 1,
+        'extra_search_terms': clean_splitters(node.title),
+    }
+    if not node.is_retracted:
+        for wiki in WikiPage.objects.get_wiki_pages_latest(node):
+            elastic_document['wikis'][wiki.wiki_page.page_name.replace('.', ' ')] = wiki.raw_text(node)
+    return elastic_document
+
+
+class TestSerializeNodes(OsfTestCase):
+
+    def setUp(self):
+        super(TestSerializeNodes, self).setUp()
+        self.user = factories.AuthUserFactory()
+        auth = Auth(self.user)
+        self.project = factories.ProjectFactory(creator=self.user, is_public=True, title='Sheer Heart Attack')
+        self.project.node_license = factories.NodeLicenseRecordFactory()
+        self.project.add_tag('queen', auth=auth)
+        self.project.add_system_tag('qatest-ignored')
+        self.project.affiliated_institutions.add(factories.InstitutionFactory())
+        self.deactivated_institution = factories.InstitutionFactory(deactivated=timezone.now())
+        self.project.affiliated_institutions.add(self.deactivated_institution)
+        self.project.add_contributor(factories.UserFactory(is_active=False), auth=auth, visible=True)
+        self.project.add_contributor(factories.UserFactory(), auth=auth, visible=False)
+        self.project.save()
+        group = factories.OSFGroupFactory(creator=self.user)
+        self.project.add_osf_group(group, auth=auth)
+        GuidMetadataRecord.objects.for_guid(self.project._id).update(new_values={'language': 'en'}, auth=self.user)
+        wiki = WikiFactory(node=self.project, page_name='home.page', user=self.user)
+        WikiVersionFactory(wiki_page=wiki, user=self.user, identifier=1, content='first')
+        WikiVersionFactory(wiki_page=wiki, user=self.user, identifier=2, content='second')
+
+        self.component = factories.NodeFactory(parent=self.project, creator=self.user, is_public=True)
+        self.deep_component = factories.NodeFactory(parent=self.component, creator=self.user, is_public=True)
+        self.deep_component.add_tag('brighton', auth=auth)
+        self.registration = factories.RegistrationFactory(project=self.project, is_public=True)
+        self.embargoed = factories.RegistrationFactory(
+            project=self.project,
+            embargo=factories.EmbargoFactory(end_date=timezone.now() + datetime.timedelta(days=30), user=self.user),
+        )
+        self.retracted = factories.RegistrationFactory(project=self.project, is_public=True)
+        self.retracted.retract_registration(self.user)
+        self.retracted.retraction.state = Retraction.APPROVED
+        self.retracted.retraction.save()
+
+    def nodes(self):
+        ids = [
+            self.project.id, self.component.id, self.deep_component.id,
+            self.registration.id, *self.registration.nodes_primary.values_list('id', flat=True),
+            self.embargoed.id, self.retracted.id,
+        ]
+        return list(AbstractNode.objects.filter(id__in=ids).order_by('id'))
+
+    def test_documents_match_per_node_serialization(self):
+        nodes = self.nodes()
+        elastic_search.prefetch_search_relations(nodes)
+        documents = [elastic_search.serialize_node(node, 'project') for node in nodes]
+
+        for node, document in zip(self.nodes(), documents):
+            assert_equal(document, legacy_serialize_node(node, 'project'))
+            # Byte-identical once encoded as well
+            assert_equal(json.dumps(document, default=str, sort_keys=True),
+                         json.dumps(legacy_serialize_node(node, 'project'), default=str, sort_keys=True))
+
+    def test_single_node_matches(self):
+        node = AbstractNode.objects.get(id=self.project.id)
+        assert_equal(elastic_search.serialize_node(node, 'project'), legacy_serialize_node(node, 'project'))
+
+    def test_deactivated_institutions_are_excluded(self):
+        nodes = self.nodes()
+        elastic_search.prefetch_search_relations(nodes)
+        project = next(node for node in nodes if node.id == self.project.id)
+        institutions = elastic_search.serialize_node(project, 'project')['affiliated_institutions']
+        assert_equal(len(institutions), 1)
+        assert_not_in(self.deactivated_institution.name, institutions)
+
+    def test_queries_do_not_grow_with_batch_size(self):
+        def count_queries(nodes):
+            elastic_search.prefetch_search_relations(nodes)
+            with CaptureQueriesContext(connection) as queries:
+                for node in nodes:
+                    elastic_search.serialize_node(node, 'project')
+            return len(queries)
+
+        query_count = count_queries(self.nodes())
+        for _ in range(5):
+            factories.NodeFactory(parent=self.component, creator=self.user, is_public=True)
+        more_nodes = self.nodes() + list(AbstractNode.objects.get_children(self.component))
+        assert_equal(count_queries(more_nodes), query_count)
+
+    def test_relations_are_cleared_after_bulk_update(self):
+        nodes = self.nodes()
+        serialize = functools.partial(search.update_node, bulk=True, async_update=False)
+        with mock.patch.object(elastic_search.helpers, 'bulk'):
+            for _ in elastic_search._bulk_update_actions(serialize, nodes, elastic_search.INDEX):
+                pass
+        assert_false(any(hasattr(node, '_search_relations') for node in nodes))
+
+
 @pytest.mark.enable_search
 @pytest.mark.enable_enqueue_task
 class TestSearchMigration(OsfTestCase):
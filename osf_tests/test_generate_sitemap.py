@@ -1,10 +1,11 @@
+import gzip
 import os
 
 import pytest
 import mock
 import shutil
 import tempfile
-import xml
+import xml.etree.ElementTree
 from future.moves.urllib.parse import urljoin
 from django.utils import timezone
 
@@ -14,22 +15,32 @@ from osf_tests.factories import (AuthUserFactory, ProjectFactory, RegistrationFa
 from website import settings
 
 
+NAMESPACE = '{http://www.sitemaps.org/schemas/sitemap/0.9}'
+
+
+def read_sitemap_urls(sitemap_dir):
+    """Urls of every sitemap listed in the index"""
+    # Note: namespace was defined in the XML file, therefore necessary to include in tag
+    with open(os.path.join(sitemap_dir, 'sitemap_index.xml')) as f:
+        index = xml.etree.ElementTree.parse(f)
+    urls = []
+    for loc in index.iter(NAMESPACE + 'loc'):
+        with open(os.path.join(sitemap_dir, os.path.basename(loc.text))) as f:
+            tree = xml.etree.ElementTree.parse(f)
+        urls.extend(element.text for element in tree.iter(NAMESPACE + 'loc'))
+    return urls
+
+
 def get_all_sitemap_urls():
     # Create temporary directory for the sitemaps to be generated
 
     generate_sitemap.main()
 
-    # Parse the generated XML sitemap file
-    with open(os.path.join(settings.STATIC_FOLDER, 'sitemaps/sitemap_0.xml')) as f:
-        tree = xml.etree.ElementTree.parse(f)
+    # Parse the generated XML sitemap files
+    urls = read_sitemap_urls(os.path.join(settings.STATIC_FOLDER, 'sitemaps'))
 
     shutil.rmtree(settings.STATIC_FOLDER)
 
-    # Get all the urls in the sitemap
-    # Note: namespace was defined in the XML file, therefore necessary to include in tag
-    namespace = '{http://www.sitemaps.org/schemas/sitemap/0.9}'
-    urls = [element.text for element in tree.iter(namespace + 'loc')]
-
     return urls
 
 
@@ -186,3 +197,35 @@ class TestGenerateSitemap:
             urls = get_all_sitemap_urls()
 
         assert urljoin(settings.DOMAIN, project_deleted.url) not in urls
+
+    def test_gzipped_sitemaps_match(self, create_tmp_directory):
+        with mock.patch('website.settings.STATIC_FOLDER', create_tmp_directory), \
+                mock.patch('website.settings.SITEMAP_URL_MAX', 4):
+            generate_sitemap.main()
+            sitemap_dir = os.path.join(create_tmp_directory, 'sitemaps')
+            sitemap_files = sorted(name for name in os.listdir(sitemap_dir) if name.endswith('.xml') and name != 'sitemap_index.xml')
+
+            assert 'sitemap_node_1.xml' in sitemap_files
+            for name in sitemap_files:
+                with open(os.path.join(sitemap_dir, name), 'rb') as f, gzip.open(os.path.join(sitemap_dir, name + '.gz')) as gz:
+                    assert f.read() == gz.read()
+                with open(os.path.join(sitemap_dir, name)) as f:
+                    assert len(list(xml.etree.ElementTree.parse(f).iter(NAMESPACE + 'url'))) <= 4
+
+    def test_incremental_regenerates_changed_sections(self, create_tmp_directory, all_included_links, project_private):
+        with mock.patch('website.settings.STATIC_FOLDER', create_tmp_directory):
+            sitemap_dir = os.path.join(create_tmp_directory, 'sitemaps')
+            generate_sitemap.Sitemap(incremental=True).generate()
+
+            with mock.patch.object(generate_sitemap.SitemapWriter, 'add_url') as mock_add_url:
+                generate_sitemap.Sitemap(incremental=True).generate()
+            assert not mock_add_url.called
+            assert set(read_sitemap_urls(sitemap_dir)) == set(all_included_links)
+
+            project_private.is_public = True
+            project_private.save()
+            with mock.patch.object(generate_sitemap.Sitemap, 'write_user_urls') as mock_write_users:
+                manifest = generate_sitemap.Sitemap(incremental=True).generate()
+            assert not mock_write_users.called
+            assert manifest['user']['files']
+            assert set(read_sitemap_urls(sitemap_dir)) == set(all_included_links + [urljoin(settings.DOMAIN, project_private.url)])
@@ -4,9 +4,15 @@ from future.moves.urllib.parse import quote
 from django.utils import timezone
 from django.core.exceptions import MultipleObjectsReturned
 
-from osf.models import Guid, NodeLicenseRecord, OSFUser
+from django.test import override_settings
+
+from framework.guids import handlers as guid_handlers
+from osf.models import AbstractNode, Guid, NodeLicenseRecord, OSFUser, Registration
+from osf.models import base as models_base
+from osf.models.base import GUID_REFERENT_CACHE_KEY, guid_referent_cache, BlackListGuid
 from osf_tests.factories import AuthUserFactory, UserFactory, NodeFactory, NodeLicenseRecordFactory, \
-    RegistrationFactory, PreprintFactory, PreprintProviderFactory
+    RegistrationFactory, PreprintFactory, PreprintProviderFactory, ProjectFactory
+from framework.auth import Auth
 from osf.utils.permissions import ADMIN
 from tests.base import OsfTestCase
 from tests.test_websitefiles import TestFile
@@ -129,6 +135,148 @@ class TestReferent:
             pytest.fail('Multiple objects returned for {} with multiple guids. {}'.format(Factory._meta.model, ex))
 
 
+@pytest.mark.django_db
+class TestGuidIdentityMap:
+
+    @pytest.fixture(autouse=True)
+    def request_scope(self):
+        guid_handlers.guids_before_request()
+        yield
+        guid_handlers.guids_teardown_request()
+
+    def test_repeated_loads_return_the_same_instance(self, django_assert_num_queries):
+        user = UserFactory()
+        loaded = OSFUser.load(user._id)
+        with django_assert_num_queries(0):
+            assert OSFUser.load(user._id) is loaded
+            assert OSFUser.load(user._id.upper()) is loaded
+            assert Guid.load(user._id) is Guid.load(user._id)
+
+    def test_loads_are_keyed_by_model(self):
+        node = NodeFactory()
+        assert AbstractNode.load(node._id) == node
+        assert Registration.load(node._id) is None
+        assert OSFUser.load(node._id) is None
+
+    def test_missing_objects_are_not_remembered(self):
+        assert OSFUser.load('abcde') is None
+        user = UserFactory()
+        user._id = 'abcde'
+        assert OSFUser.load('abcde') == user
+
+    def test_select_for_update_bypasses_the_identity_map(self):
+        user = UserFactory()
+        loaded = OSFUser.load(user._id)
+        assert OSFUser.load(user._id, select_for_update=True) is not loaded
+
+    def test_saving_another_instance_forgets_stale_instances(self):
+        user = UserFactory()
+        loaded = OSFUser.load(user._id)
+        user.fullname = 'Changed Name'
+        user.save()
+        assert OSFUser.load(user._id) is not loaded
+        assert OSFUser.load(user._id).fullname == 'Changed Name'
+
+    def test_saving_the_loaded_instance_keeps_it(self):
+        user = UserFactory()
+        loaded = OSFUser.load(user._id)
+        loaded.save()
+        assert OSFUser.load(user._id) is loaded
+
+    def test_deleting_forgets_the_instance(self):
+        node = NodeFactory()
+        assert AbstractNode.load(node._id) == node
+        node.guids.all().delete()
+        assert AbstractNode.load(node._id) is None
+
+    def test_no_identity_map_outside_of_requests(self):
+        guid_handlers.guids_teardown_request()
+        user = UserFactory()
+        assert OSFUser.load(user._id) is not OSFUser.load(user._id)
+
+    def test_duplicate_loads_are_reported_in_debug_mode(self):
+        user = UserFactory()
+        with mock.patch.object(guid_handlers.settings, 'DEBUG_MODE', True):
+            guid_handlers.guids_before_request()
+            for _ in range(3):
+                OSFUser.load(user._id)
+            with mock.patch.object(guid_handlers.logger, 'info') as mock_info:
+                guid_handlers.guids_after_request()
+        assert mock_info.call_count == 1
+        assert 'OSFUser({}) x2'.format(user._id) in mock_info.call_args[0][0]
+
+
+@pytest.mark.django_db
+@override_settings(GUID_LOAD_CACHE_NAME='default')
+class TestGuidReferentCache:
+
+    def test_loads_fill_the_cache(self):
+        node = NodeFactory()
+        guid_referent_cache().delete(GUID_REFERENT_CACHE_KEY.format(node._id))
+        assert AbstractNode.load(node._id) == node
+        assert guid_referent_cache().get(GUID_REFERENT_CACHE_KEY.format(node._id)) == (
+            Guid.load(node._id).content_type_id, node.pk
+        )
+        assert AbstractNode.load(node._id) == node
+        assert Registration.load(node._id) is None
+        assert OSFUser.load(node._id) is None
+
+    def test_repointed_guids_are_invalidated(self):
+        node, other = NodeFactory(), NodeFactory()
+        assert AbstractNode.load(node._id) == node
+        guid = Guid.load(node._id)
+        guid.object_id = other.pk
+        guid.save()
+        assert guid_referent_cache().get(GUID_REFERENT_CACHE_KEY.format(node._id)) is None
+        assert AbstractNode.load(node._id) == other
+
+    def test_deleted_guids_are_invalidated(self):
+        user = UserFactory()
+        assert OSFUser.load(user._id) == user
+        guid_id = user._id
+        user.guids.all().delete()
+        assert guid_referent_cache().get(GUID_REFERENT_CACHE_KEY.format(guid_id)) is None
+        assert OSFUser.load(guid_id) is None
+
+
+@pytest.mark.django_db
+class TestGuidAllocation:
+
+    def test_generate_guids(self, django_assert_num_queries):
+        with django_assert_num_queries(2):
+            guids = models_base.generate_guids(50)
+        assert len(set(guids)) == 50
+        assert all(len(guid) == 5 for guid in guids)
+
+    def test_generate_guids_skips_blacklisted_and_taken_guids(self):
+        taken = UserFactory()._id
+        BlackListGuid.objects.create(guid='bbbbb')
+        candidates = iter(['bbbbb', taken, 'ccccc', 'ddddd', 'ccccc'])
+        with mock.patch.object(models_base.random, 'sample', side_effect=lambda *args: next(candidates)):
+            assert sorted(models_base.generate_guids(2)) == ['ccccc', 'ddddd']
+
+    def test_preallocated_guids(self):
+        user = UserFactory()
+        with mock.patch.object(models_base, 'generate_guids', wraps=models_base.generate_guids) as mock_generate_guids:
+            with models_base.preallocated_guids(3):
+                allocated = set(models_base._guid_pool.guids)
+                with models_base.preallocated_guids(10):
+                    nodes = [NodeFactory(creator=user) for _ in range(3)]
+                assert {node._id for node in nodes} == allocated
+                # An exhausted pool is refilled with another batch
+                NodeFactory(creator=user)
+        assert mock_generate_guids.call_count == 2
+        assert models_base._guid_pool.guids is None
+
+    def test_fork_allocates_guids_once(self):
+        project = ProjectFactory()
+        NodeFactory(parent=NodeFactory(parent=project, creator=project.creator), creator=project.creator)
+        with mock.patch.object(models_base, 'generate_guids', wraps=models_base.generate_guids) as mock_generate_guids:
+            fork = project.fork_node(Auth(project.creator))
+        mock_generate_guids.assert_called_once_with(3, 5)
+        assert len(list(fork.node_and_primary_descendants())) == 3
+
+
 @pytest.mark.enable_bookmark_creation
 class TestResolveGuid(OsfTestCase):
 
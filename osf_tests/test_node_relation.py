@@ -0,0 +1,81 @@
+from unittest import mock
+
+import pytest
+from django.core.cache.backends.locmem import LocMemCache
+
+from osf.models import NodeClosure, NodeRelation, node_relation
+from osf_tests.factories import (
+    NodeFactory,
+    PreprintFactory,
+    ProjectFactory,
+    UserFactory,
+)
+from website.notifications.emails import get_node_lineage
+
+
+@pytest.mark.django_db
+class TestNodeLineage:
+
+    @pytest.fixture()
+    def user(self):
+        return UserFactory()
+
+    @pytest.fixture()
+    def project(self, user):
+        return ProjectFactory(creator=user)
+
+    @pytest.fixture()
+    def component(self, user, project):
+        return NodeFactory(creator=user, parent=project)
+
+    @pytest.fixture()
+    def subcomponent(self, user, component):
+        return NodeFactory(creator=user, parent=component)
+
+    @staticmethod
+    def walked_lineage(node):
+        """the parent_node walk get_node_lineage used to do"""
+        lineage = [node._id]
+        while node.parent_id:
+            node = node.parent_node
+            lineage = [node._id] + lineage
+        return lineage
+
+    def test_lineage_matches_parent_walk(self, project, component, subcomponent):
+        for node in (project, component, subcomponent):
+            assert get_node_lineage(node) == self.walked_lineage(node)
+        assert NodeClosure.ancestor_guids(subcomponent.id) == (component._id, project._id)
+        assert NodeClosure.ancestor_guids(project.id) == ()
+
+    def test_preprint_lineage(self):
+        preprint = PreprintFactory()
+        assert get_node_lineage(preprint) == [preprint._id]
+
+    def test_cached_lineage_is_a_single_lookup(self, project, component, subcomponent, django_assert_num_queries):
+        NodeClosure.ancestor_guids(subcomponent.id)
+        with django_assert_num_queries(0):
+            assert NodeClosure.ancestor_guids(subcomponent.id) == (component._id, project._id)
+
+    def test_invalidation_reaches_other_processes(self, user, project, component, subcomponent):
+        # like redis, two cache clients (two processes) over the same storage
+        one_process = LocMemCache('node-lineage-test', {})
+        other_process = LocMemCache('node-lineage-test', {})
+        one_process.clear()
+
+        with mock.patch.object(node_relation, 'node_lineage_cache', return_value=one_process):
+            assert NodeClosure.ancestor_guids(subcomponent.id) == (component._id, project._id)
+        with mock.patch.object(node_relation, 'node_lineage_cache', return_value=other_process):
+            NodeRelation.objects.get(parent=project, child=component).delete()
+        with mock.patch.object(node_relation, 'node_lineage_cache', return_value=one_process):
+            assert NodeClosure.ancestor_guids(subcomponent.id) == (component._id,)
+
+    def test_lineage_is_invalidated_when_reparented(self, user, project, component, subcomponent):
+        assert get_node_lineage(subcomponent) == [project._id, component._id, subcomponent._id]
+        other = ProjectFactory(creator=user)
+
+        NodeRelation.objects.get(parent=project, child=component).delete()
+        assert get_node_lineage(subcomponent) == [component._id, subcomponent._id]
+
+        NodeRelation.objects.create(parent=other, child=component)
+        assert get_node_lineage(subcomponent) == [other._id, component._id, subcomponent._id]
+        assert get_node_lineage(subcomponent) == self.walked_lineage(subcomponent)
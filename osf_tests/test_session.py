@@ -3,7 +3,8 @@ from importlib import import_module
 
 from django.conf import settings as django_conf_settings
 from django.contrib.sessions.models import Session
-from django.db import IntegrityError
+from django.db import IntegrityError, connection
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 import itsdangerous
 import pytest
@@ -16,7 +17,7 @@ from osf.management.commands.clear_expired_sessions import clear_expired_session
 from osf_tests.factories import AuthUserFactory
 from osf.exceptions import InvalidCookieOrSessionError
 from osf.models import UserSessionMap
-from tests.base import fake, AppTestCase
+from tests.base import fake, AppTestCase, test_app
 from website import settings as osf_settings
 
 SessionStore = import_module(django_conf_settings.SESSION_ENGINE).SessionStore
@@ -367,6 +368,39 @@ class TestSessions(AppTestCase):
         assert session.session_key == self.session_anonymous.session_key
         assert session.get('auth_user_external_first_login', False)
 
+    def test_flask_get_session_from_cookie_loads_session_once(self):
+        with mock.patch.object(SessionStore, 'load', autospec=True, side_effect=SessionStore.load) as mock_load, \
+                mock.patch.object(SessionStore, 'exists') as mock_exists:
+            session = flask_get_session_from_cookie(self.cookie)
+            assert flask_get_session_from_cookie(self.cookie) is session
+            assert drf_get_session_from_cookie(self.cookie) is session
+            assert session.get('auth_user_id', None) == self.user._primary_key
+        assert mock_load.call_count == 1
+        assert not mock_exists.called
+
+    def test_flask_get_session_from_cookie_with_session_gone_loads_session_once(self):
+        with mock.patch.object(SessionStore, 'load', autospec=True, side_effect=SessionStore.load) as mock_load:
+            for _ in range(2):
+                with pytest.raises(InvalidCookieOrSessionError):
+                    flask_get_session_from_cookie(self.cookie_session_removed)
+        assert mock_load.call_count == 1
+
+    def test_sessions_are_not_shared_across_requests(self):
+        with test_app.test_request_context():
+            session = flask_get_session_from_cookie(self.cookie)
+        with test_app.test_request_context():
+            assert flask_get_session_from_cookie(self.cookie) is not session
+
+    def test_second_session_lookup_in_request_runs_no_queries(self):
+        with test_app.test_request_context():
+            # ``before_request()`` and ``get_session()`` both look up the session of the cookie
+            session = flask_get_session_from_cookie(self.cookie)
+            assert session.get('auth_user_id', None) == self.user._primary_key
+            with CaptureQueriesContext(connection) as queries:
+                assert flask_get_session_from_cookie(self.cookie) is session
+                assert session.get('auth_user_id', None) == self.user._primary_key
+            assert len(queries) == 0
+
     @mock.patch('framework.sessions.flask_get_session_from_cookie')
     @mock.patch('flask.request.cookies.get')
     def test_get_session_with_cookie_in_request(self, mock_get, flask_mock_get_session_from_cookie):
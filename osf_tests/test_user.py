@@ -886,6 +886,32 @@ class TestProjectsInCommon:
         assert user.n_projects_in_common(user2) == 1
         assert user.n_projects_in_common(user3) == 1
 
+    def test_n_projects_in_common_by_user(self, user, auth):
+        contributor = UserFactory()
+        group_member = UserFactory()
+        both = UserFactory()
+        stranger = UserFactory()
+        group = OSFGroupFactory(name='Platform', creator=user)
+        group.make_member(group_member)
+        group.make_member(both)
+        for _ in range(2):
+            project = NodeFactory(creator=user)
+            project.add_contributor(contributor=contributor, auth=auth)
+            project.add_contributor(contributor=both, auth=auth)
+            project.add_osf_group(group)
+            project.save()
+        deleted = NodeFactory(creator=user)
+        deleted.add_contributor(contributor=contributor, auth=auth)
+        deleted.remove_node(auth)
+        NodeFactory(creator=stranger)
+
+        others = [contributor, group_member, both, stranger]
+        counts = user.n_projects_in_common_by_user([other.id for other in others])
+
+        assert counts == {contributor.id: 2, group_member.id: 2, both.id: 2}
+        for other in others:
+            assert counts.get(other.id, 0) == user.n_projects_in_common(other)
+
 
 class TestCookieMethods:
 
@@ -1,13 +1,19 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 """Generate a sitemap for osf.io"""
+import argparse
 import boto3
 import datetime
+import glob
 import gzip
+import hashlib
+import json
+import multiprocessing
 import os
 import shutil
-from future.moves.urllib.parse import urlparse, urljoin
-import xml
+from concurrent.futures import ProcessPoolExecutor
+from future.moves.urllib.parse import urljoin
+from xml.sax.saxutils import escape
 
 import django
 django.setup()
@@ -16,9 +22,9 @@ import tempfile
 
 from framework import sentry
 from framework.celery_tasks import app as celery_app
-from django.db.models import Q
-from osf.models import OSFUser, AbstractNode, Preprint, PreprintProvider
-from osf.utils.workflows import DefaultStates
+from django.db import connections
+from django.db.models import Count, Max
+from osf.models import OSFUser, AbstractNode, Preprint
 from scripts import utils as script_utils
 from website import settings
 from website.app import init_app
@@ -26,13 +32,79 @@ from website.app import init_app
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
+SITEMAP_NAMESPACE = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+MANIFEST_FILE_NAME = 'sitemap_manifest.json'
+SECTIONS = ('static', 'user', 'node', 'preprint')
+
+
+def _date(value):
+    return value.strftime('%Y-%m-%d')
+
+
+class SitemapWriter(object):
+    """Streams the urls of one sitemap section into numbered xml files and their gzipped copies"""
+
+    def __init__(self, sitemap_dir, section):
+        self.sitemap_dir = sitemap_dir
+        self.section = section
+        self.file_names = []
+        self.url_count = 0
+        self.total_url_count = 0
+        self.files = None
+
+    def _write(self, text):
+        data = text.encode('utf-8')
+        for f in self.files:
+            f.write(data)
+
+    def new_file(self):
+        """Closes the current sitemap file, if any, and starts the next one"""
+        self.close()
+        file_name = 'sitemap_{}_{}.xml'.format(self.section, len(self.file_names))
+        file_path = os.path.join(self.sitemap_dir, file_name)
+        self.files = (open(file_path, 'wb'), gzip.open(file_path + '.gz', 'wb'))
+        self.file_names.append(file_name)
+        self.url_count = 0
+        self._write('<?xml version="1.0" encoding="utf-8"?>\n<urlset xmlns="{}">\n'.format(SITEMAP_NAMESPACE))
+
+    def add_url(self, config, **values):
+        """Adds a url built from a SITEMAP_*_CONFIG, with `values` overriding its defaults"""
+        if self.files is None or self.url_count >= settings.SITEMAP_URL_MAX:
+            self.new_file()
+        tags = ''.join(
+            '    <{0}>{1}</{0}>\n'.format(name, escape(values.get(name, default)))
+            for name, default in config.items()
+        )
+        self._write('  <url>\n{}  </url>\n'.format(tags))
+        self.url_count += 1
+        self.total_url_count += 1
+
+    def close(self):
+        if self.files is None:
+            return
+        print('Wrote `{}`: url_count = {}'.format(self.file_names[-1], self.url_count))
+        self._write('</urlset>\n')
+        for f in self.files:
+            f.close()
+        self.files = None
+
+
+def _generate_section_in_process(sitemap_dir, section):
+    return Sitemap(sitemap_dir=sitemap_dir).generate_section(section)
+
 
 class Sitemap(object):
-    def __init__(self):
-        self.sitemap_count = 0
+    def __init__(self, sitemap_dir=None, parallel=None, incremental=False):
+        """`parallel` generates the sections in that many processes; `incremental` only regenerates
+        the sections whose contents changed since the last run (see `section_signature`).
+        """
         self.errors = 0
-        self.new_doc()
-        if not settings.SITEMAP_TO_S3:
+        self.parallel = parallel
+        self.incremental = incremental
+        if sitemap_dir:
+            # Generating a section for another Sitemap, which ships the files
+            self.sitemap_dir = sitemap_dir
+        elif not settings.SITEMAP_TO_S3:
             self.sitemap_dir = os.path.join(settings.STATIC_FOLDER, 'sitemaps')
             if not os.path.exists(self.sitemap_dir):
                 print('Creating sitemap directory at `{}`'.format(self.sitemap_dir))
@@ -53,53 +125,6 @@ class Sitemap(object):
         if settings.SITEMAP_TO_S3:
             shutil.rmtree(self.sitemap_dir)
 
-    def new_doc(self):
-        """Creates new sitemap document and resets the url_count."""
-        self.doc = xml.dom.minidom.Document()
-        self.urlset = self.doc.createElement('urlset')
-        self.urlset.setAttribute('xmlns', 'http://www.sitemaps.org/schemas/sitemap/0.9')
-        self.doc.appendChild(self.urlset)
-        self.url_count = 0
-
-    def add_tag(self, name, text):
-        """Adds a tag to the current url"""
-        tag = self.doc.createElement(name)
-        self.url.appendChild(tag)
-        tag_text = self.doc.createTextNode(text)
-        tag.appendChild(tag_text)
-
-    def add_url(self, config):
-        """Adds a url to the current urlset"""
-        if self.url_count >= settings.SITEMAP_URL_MAX:
-            self.write_doc()
-            self.new_doc()
-        self.url = self.doc.createElement('url')
-        self.urlset.appendChild(self.url)
-
-        for k, v in config.items():
-            self.add_tag(k, v)
-        self.url_count += 1
-
-    def write_doc(self):
-        """Writes and gzips each sitemap xml file"""
-        file_name = 'sitemap_{}.xml'.format(str(self.sitemap_count))
-        file_path = os.path.join(self.sitemap_dir, file_name)
-        zip_file_name = file_name + '.gz'
-        zip_file_path = file_path + '.gz'
-        print('Writing and gzipping `{}`: url_count = {}'.format(file_path, str(self.url_count)))
-
-        xml_str = self.doc.toprettyxml(indent='  ', encoding='utf-8')
-        with open(file_path, 'wb') as f:
-            f.write(xml_str)
-
-        # Write zipped file
-        with open(file_path, 'rb') as f_in, gzip.open(zip_file_path, 'wb') as f_out:
-            shutil.copyfileobj(f_in, f_out)
-        if settings.SITEMAP_TO_S3:
-            self.ship_to_s3(file_name, file_path)
-            self.ship_to_s3(zip_file_name, zip_file_path)
-        self.sitemap_count += 1
-
     def ship_to_s3(self, name, path):
         data = open(path, 'rb')
         try:
@@ -110,35 +135,9 @@ class Sitemap(object):
             sentry.log_message('ERROR: Sitemaps could not be uploaded to s3, see `generate_sitemap` logs')
         data.close()
 
-    def write_sitemap_index(self):
-        """Writes the index file for all of the sitemap files"""
-        doc = xml.dom.minidom.Document()
-        sitemap_index = self.doc.createElement('sitemapindex')
-        sitemap_index.setAttribute('xmlns', 'http://www.sitemaps.org/schemas/sitemap/0.9')
-        doc.appendChild(sitemap_index)
-
-        for f in range(self.sitemap_count):
-            sitemap = doc.createElement('sitemap')
-            sitemap_index.appendChild(sitemap)
-
-            loc = doc.createElement('loc')
-            sitemap.appendChild(loc)
-            loc_text = self.doc.createTextNode(urljoin(settings.DOMAIN, 'sitemaps/sitemap_{}.xml'.format(str(f))))
-            loc.appendChild(loc_text)
-
-            datemod = doc.createElement('lastmod')
-            sitemap.appendChild(datemod)
-            datemod_text = self.doc.createTextNode(datetime.datetime.now().strftime('%Y-%m-%d'))
-            datemod.appendChild(datemod_text)
-
-        print('Writing `sitemap_index.xml`')
-        file_name = 'sitemap_index.xml'
-        file_path = os.path.join(self.sitemap_dir, file_name)
-        xml_str = doc.toprettyxml(indent='  ', encoding='utf-8')
-        with open(file_path, 'wb') as f:
-            f.write(xml_str)
+    def ship(self, name):
         if settings.SITEMAP_TO_S3:
-            self.ship_to_s3(file_name, file_path)
+            self.ship_to_s3(name, os.path.join(self.sitemap_dir, name))
 
     def log_errors(self, obj, obj_id, error):
         if not self.errors:
@@ -154,112 +153,189 @@ class Sitemap(object):
             sentry.log_message('ERROR: generate_sitemap stopped execution after reaching 1000 errors. See logs for details.')
             raise Exception('Too many errors generating sitemap.')
 
-    def generate(self):
-        print('Generating Sitemap')
+    # Sections
+
+    def user_queryset(self):
+        return OSFUser.objects.filter(is_active=True).exclude(date_confirmed__isnull=True)
+
+    def node_queryset(self):
+        # Nodes and Registrations, no Collections
+        return (AbstractNode.objects
+            .filter(is_public=True, is_deleted=False, retraction_id__isnull=True)
+            .exclude(type__in=['osf.collection', 'osf.quickfilesnode']))
+
+    def preprint_queryset(self):
+        return Preprint.objects.can_view()
+
+    def section_signature(self, section):
+        """Changes whenever the urls of `section` may have: rows were added or removed, or one was modified"""
+        signature = [settings.DOMAIN, settings.SITEMAP_URL_MAX]
+        if section == 'static':
+            signature.append(hashlib.sha256(json.dumps(settings.SITEMAP_STATIC_URLS).encode()).hexdigest())
+        else:
+            queryset = getattr(self, '{}_queryset'.format(section))()
+            aggregates = queryset.aggregate(count=Count('id'), modified=Max('modified'))
+            signature.extend([aggregates['count'], aggregates['modified'] and aggregates['modified'].isoformat()])
+        return signature
 
-        # Progress bar
-        progress = script_utils.Progress(precision=0)
+    def iterate(self, queryset, *fields):
+        # A server side cursor keeps memory flat however large the tables get
+        return queryset.values(*fields).iterator(chunk_size=settings.SITEMAP_QUERY_CHUNK_SIZE)
 
-        # Static urls
-        progress.start(len(settings.SITEMAP_STATIC_URLS), 'STAT: ')
+    def write_static_urls(self, writer):
         for config in settings.SITEMAP_STATIC_URLS:
-            config['loc'] = urljoin(settings.DOMAIN, config['loc'])
-            self.add_url(config)
-            progress.increment()
-        progress.stop()
-
-        # User urls
-        objs = OSFUser.objects.filter(is_active=True).exclude(date_confirmed__isnull=True).values_list('guids___id', flat=True)
-        progress.start(objs.count(), 'USER: ')
-        for obj in objs:
+            writer.add_url(config, loc=urljoin(settings.DOMAIN, config['loc']))
+
+    def write_user_urls(self, writer):
+        for obj in self.iterate(self.user_queryset(), 'guids___id'):
             try:
-                config = settings.SITEMAP_USER_CONFIG
-                config['loc'] = urljoin(settings.DOMAIN, '/{}/'.format(obj))
-                self.add_url(config)
+                writer.add_url(settings.SITEMAP_USER_CONFIG, loc=urljoin(settings.DOMAIN, '/{}/'.format(obj['guids___id'])))
             except Exception as e:
-                self.log_errors('USER', obj, e)
-            progress.increment()
-        progress.stop()
+                self.log_errors('USER', obj['guids___id'], e)
 
-        # AbstractNode urls (Nodes and Registrations, no Collections)
-        objs = (AbstractNode.objects
-            .filter(is_public=True, is_deleted=False, retraction_id__isnull=True)
-            .exclude(type__in=['osf.collection', 'osf.quickfilesnode'])
-            .values('guids___id', 'modified'))
-        progress.start(objs.count(), 'NODE: ')
-        for obj in objs:
+    def write_node_urls(self, writer):
+        for obj in self.iterate(self.node_queryset(), 'guids___id', 'modified'):
             try:
-                config = settings.SITEMAP_NODE_CONFIG
-                config['loc'] = urljoin(settings.DOMAIN, '/{}/'.format(obj['guids___id']))
-                config['lastmod'] = obj['modified'].strftime('%Y-%m-%d')
-                self.add_url(config)
+                writer.add_url(
+                    settings.SITEMAP_NODE_CONFIG,
+                    loc=urljoin(settings.DOMAIN, '/{}/'.format(obj['guids___id'])),
+                    lastmod=_date(obj['modified']),
+                )
             except Exception as e:
                 self.log_errors('NODE', obj['guids___id'], e)
-            progress.increment()
-        progress.stop()
-
-        # Preprint urls
 
-        objs = (Preprint.objects.can_view()
-                    .select_related('node', 'provider', 'primary_file'))
-        progress.start(objs.count() * 2, 'PREP: ')
+    def write_preprint_urls(self, writer):
+        objs = self.iterate(self.preprint_queryset(), 'guids___id', 'provider___id', 'modified', 'date_withdrawn')
         for obj in objs:
             try:
-                preprint_date = obj.modified.strftime('%Y-%m-%d')
-                config = settings.SITEMAP_PREPRINT_CONFIG
-                preprint_url = os.path.join('preprints', obj.provider._id, obj._id)
-                config['loc'] = urljoin(settings.DOMAIN, preprint_url)
-                config['lastmod'] = preprint_date
-                self.add_url(config)
+                preprint_date = _date(obj['modified'])
+                preprint_url = os.path.join('preprints', obj['provider___id'], obj['guids___id'])
+                writer.add_url(settings.SITEMAP_PREPRINT_CONFIG, loc=urljoin(settings.DOMAIN, preprint_url), lastmod=preprint_date)
 
                 # Preprint file urls
-                if not obj.is_retracted:
+                if obj['date_withdrawn'] is None:
                     # Withdrawn preprints may be viewed but not downloaded
-                    try:
-                        file_config = settings.SITEMAP_PREPRINT_FILE_CONFIG
-                        file_config['loc'] = urljoin(
-                            settings.DOMAIN,
-                            os.path.join(
-                                obj._id,
-                                'download',
-                                '?format=pdf'
-                            )
-                        )
-                        file_config['lastmod'] = preprint_date
-                        self.add_url(file_config)
-                    except Exception as e:
-                        self.log_errors(obj.primary_file, obj.primary_file._id, e)
-
+                    writer.add_url(
+                        settings.SITEMAP_PREPRINT_FILE_CONFIG,
+                        loc=urljoin(settings.DOMAIN, os.path.join(obj['guids___id'], 'download', '?format=pdf')),
+                        lastmod=preprint_date,
+                    )
             except Exception as e:
-                self.log_errors(obj, obj._id, e)
-            progress.increment(2)
-        progress.stop()
+                self.log_errors('PREPRINT', obj['guids___id'], e)
+
+    def generate_section(self, section):
+        """Writes the sitemap files of `section` and returns its manifest entry"""
+        print('Generating `{}` sitemaps'.format(section))
+        signature = self.section_signature(section)
+        errors = self.errors
+        for path in glob.glob(os.path.join(self.sitemap_dir, 'sitemap_{}_*.xml*'.format(section))):
+            os.remove(path)
+        writer = SitemapWriter(self.sitemap_dir, section)
+        try:
+            getattr(self, 'write_{}_urls'.format(section))(writer)
+        finally:
+            writer.close()
+        return {
+            'signature': signature,
+            'files': writer.file_names,
+            'url_count': writer.total_url_count,
+            'errors': self.errors - errors,
+            'lastmod': _date(datetime.datetime.now()),
+        }
+
+    def generate_sections(self, sections):
+        if not self.parallel or len(sections) < 2:
+            return {section: self.generate_section(section) for section in sections}
+        # Forked workers must not share the parent's database connections
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=self.parallel, mp_context=multiprocessing.get_context('fork')) as executor:
+            futures = {
+                section: executor.submit(_generate_section_in_process, self.sitemap_dir, section)
+                for section in sections
+            }
+            return {section: future.result() for section, future in futures.items()}
+
+    # Manifest and index
+
+    def load_manifest(self):
+        try:
+            if settings.SITEMAP_TO_S3:
+                data = self.s3.Object(settings.SITEMAP_AWS_BUCKET, 'sitemaps/{}'.format(MANIFEST_FILE_NAME)).get()['Body'].read()
+            else:
+                with open(os.path.join(self.sitemap_dir, MANIFEST_FILE_NAME), 'rb') as f:
+                    data = f.read()
+            return json.loads(data)
+        except Exception as e:
+            logger.info('No previous sitemap manifest, regenerating every section: {!r}'.format(e))
+            return {}
+
+    def write_manifest(self, manifest):
+        with open(os.path.join(self.sitemap_dir, MANIFEST_FILE_NAME), 'w') as f:
+            json.dump(manifest, f)
+        self.ship(MANIFEST_FILE_NAME)
 
-        # Final write
-        self.write_doc()
-        # Create index file
-        self.write_sitemap_index()
+    def write_sitemap_index(self, manifest):
+        """Writes the index file for all of the sitemap files"""
+        print('Writing `sitemap_index.xml`')
+        file_name = 'sitemap_index.xml'
+        with open(os.path.join(self.sitemap_dir, file_name), 'w', encoding='utf-8') as f:
+            f.write('<?xml version="1.0" encoding="utf-8"?>\n<sitemapindex xmlns="{}">\n'.format(SITEMAP_NAMESPACE))
+            for section in SECTIONS:
+                for sitemap_file in manifest[section]['files']:
+                    f.write('  <sitemap>\n    <loc>{}</loc>\n    <lastmod>{}</lastmod>\n  </sitemap>\n'.format(
+                        escape(urljoin(settings.DOMAIN, 'sitemaps/{}'.format(sitemap_file))),
+                        manifest[section]['lastmod'],
+                    ))
+            f.write('</sitemapindex>\n')
+        self.ship(file_name)
+
+    def generate(self):
+        print('Generating Sitemap')
+        previous = self.load_manifest() if self.incremental else {}
+        stale = [
+            section for section in SECTIONS
+            if section not in previous or previous[section]['signature'] != self.section_signature(section)
+        ]
+        print('Regenerating sections: {}'.format(', '.join(stale) or 'none'))
+
+        generated = self.generate_sections(stale)
+        for entry in generated.values():
+            for sitemap_file in entry['files']:
+                self.ship(sitemap_file)
+                self.ship(sitemap_file + '.gz')
+        manifest = dict(previous, **generated)
+        self.write_manifest(manifest)
+        self.write_sitemap_index(manifest)
 
         # TODO: once the sitemap is validated add a ping to google with sitemap index file location
-        # TODO: server side cursor query wrapper might be useful as the index gets larger.
         # Sitemap indexable limit check
-        if self.sitemap_count > settings.SITEMAP_INDEX_MAX * .90:  # 10% of urls remaining
+        sitemap_count = sum(len(manifest[section]['files']) for section in SECTIONS)
+        if sitemap_count > settings.SITEMAP_INDEX_MAX * .90:  # 10% of urls remaining
             sentry.log_message('WARNING: Max sitemaps nearly reached.')
-        print('Total url_count = {}'.format((self.sitemap_count - 1) * settings.SITEMAP_URL_MAX + self.url_count))
-        print('Total sitemap_count = {}'.format(str(self.sitemap_count)))
-        if self.errors:
+        print('Total url_count = {}'.format(sum(manifest[section]['url_count'] for section in SECTIONS)))
+        print('Total sitemap_count = {}'.format(sitemap_count))
+        errors = sum(entry['errors'] for entry in generated.values())
+        if errors:
             sentry.log_message('WARNING: Generate sitemap encountered errors. See logs for details.')
-            print('Total errors = {}'.format(str(self.errors)))
+            print('Total errors = {}'.format(errors))
         else:
             print('No errors')
+        return manifest
 
 @celery_app.task(name='scripts.generate_sitemap')
-def main():
+def main(parallel=None, incremental=None):
     init_app(routes=False)  # Sets the storage backends on all models
-    sitemap = Sitemap()
+    sitemap = Sitemap(
+        parallel=settings.SITEMAP_PARALLEL if parallel is None else parallel,
+        incremental=settings.SITEMAP_INCREMENTAL if incremental is None else incremental,
+    )
     sitemap.generate()
     sitemap.cleanup()
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate the sitemap for osf.io')
+    parser.add_argument('--parallel', type=int, default=None, help='Generate the sections in this many processes')
+    parser.add_argument('--incremental', action='store_true', default=None, help='Only regenerate the sections that changed')
+    args = parser.parse_args()
     init_app(set_backends=True, routes=False)
-    main()
+    main(parallel=args.parallel, incremental=args.incremental)
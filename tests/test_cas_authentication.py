@@ -5,6 +5,7 @@ import mock
 from nose.tools import *  # noqa: F403
 import pytest
 import unittest
+from django.core.cache.backends.locmem import LocMemCache
 
 from framework.auth import cas
 
@@ -231,6 +232,131 @@ class TestCASClient(OsfTestCase):
         assert 0
 
 
+class TestCasProfileCache(OsfTestCase):
+
+    def setUp(self):
+        OsfTestCase.setUp(self)
+        self.base_url = 'http://accounts.test.test'
+        self.client = cas.CasClient(self.base_url)
+        self.user = UserFactory()
+        self.token = fake.md5()
+        self.ttl_patcher = mock.patch.object(cas.settings, 'CAS_PROFILE_CACHE_TTL', 60)
+        self.ttl_patcher.start()
+        cas.profile_cache.cache.clear()
+        cas.profile_cache.hits = cas.profile_cache.misses = 0
+
+    def tearDown(self):
+        cas.profile_cache.cache.clear()
+        self.ttl_patcher.stop()
+        OsfTestCase.tearDown(self)
+
+    def add_profile_response(self, status=200):
+        responses.add(
+            responses.Response(
+                responses.GET,
+                self.client.get_profile_url(),
+                json={'id': self.user._id, 'scope': ['osf.full_read'], 'attributes': {'givenName': 'Freddie'}},
+                status=status,
+            )
+        )
+
+    def add_revocation_response(self, status=204):
+        responses.add(responses.Response(responses.POST, self.client.get_auth_token_revocation_url(), status=status))
+
+    def profile_lookups(self):
+        return len([call for call in responses.calls if call.request.method == 'GET'])
+
+    @responses.activate
+    def test_profile_is_cached(self):
+        self.add_profile_response()
+
+        first = self.client.profile(self.token)
+        second = self.client.profile(self.token)
+
+        assert_equal(len(responses.calls), 1)
+        assert_equal(cas.profile_cache.stats, {'hits': 1, 'misses': 1})
+        assert_equal(second.user, first.user)
+        assert_equal(second.attributes, first.attributes)
+        assert_equal(second.attributes['accessToken'], self.token)
+        assert_equal(second.attributes['accessTokenScope'], {'osf.full_read'})
+
+    @responses.activate
+    def test_cache_is_keyed_by_token_hash(self):
+        self.add_profile_response()
+        self.client.profile(self.token)
+        self.client.profile(fake.md5())
+
+        assert_equal(len(responses.calls), 2)
+        key = cas.profile_cache._key(self.token)
+        assert_not_in(self.token, key)
+        _, user, attributes = cas.profile_cache.cache.get(key)
+        assert_equal(user, self.user._id)
+        assert_not_in('accessToken', attributes)
+
+    @responses.activate
+    def test_errors_are_not_cached(self):
+        self.add_profile_response(status=500)
+        for _ in range(2):
+            with assert_raises(cas.CasHTTPError):
+                self.client.profile(self.token)
+        assert_equal(len(responses.calls), 2)
+
+    @responses.activate
+    def test_entries_expire_after_ttl(self):
+        self.add_profile_response()
+        with mock.patch.object(cas.profile_cache.cache, 'set', wraps=cas.profile_cache.cache.set) as mock_set:
+            self.client.profile(self.token)
+        assert_equal(mock_set.call_args[0][2], 60)
+
+    @responses.activate
+    def test_revoke_token_invalidates(self):
+        self.add_profile_response()
+        self.add_revocation_response()
+        self.client.profile(self.token)
+
+        self.client.revoke_tokens({'token': self.token})
+        self.client.profile(self.token)
+
+        assert_equal(self.profile_lookups(), 2)
+
+    @responses.activate
+    def test_revoke_application_tokens_clears(self):
+        self.add_profile_response()
+        self.add_revocation_response(status=400)
+        self.client.profile(self.token)
+
+        with assert_raises(cas.CasHTTPError):
+            self.client.revoke_application_tokens('fake_id', 'fake_secret')
+        self.client.profile(self.token)
+
+        assert_equal(self.profile_lookups(), 2)
+
+    @responses.activate
+    def test_revocation_reaches_other_processes(self):
+        # like redis, two cache clients (two API processes) over the same storage
+        self.add_profile_response()
+        self.add_revocation_response()
+        one_process = LocMemCache('cas-profile-test', {})
+        other_process = LocMemCache('cas-profile-test', {})
+        one_process.clear()
+
+        with mock.patch.object(cas.CasProfileCache, 'cache', one_process):
+            self.client.profile(self.token)
+            self.client.profile(self.token)
+        with mock.patch.object(cas.CasProfileCache, 'cache', other_process):
+            self.client.revoke_application_tokens('fake_id', 'fake_secret')
+        with mock.patch.object(cas.CasProfileCache, 'cache', one_process):
+            self.client.profile(self.token)
+
+        assert_equal(self.profile_lookups(), 2)
+
+    def test_lookup_in_flight_during_revocation_is_not_cached(self):
+        generation = cas.profile_cache.generation
+        cas.profile_cache.clear()
+        cas.profile_cache.set(self.token, make_successful_response(self.user), generation)
+        assert_is_none(cas.profile_cache.get(self.token))
+
+
 class TestCASTicketAuthentication(OsfTestCase):
 
     def setUp(self):
@@ -2,14 +2,18 @@ import collections
 import mock
 from babel import dates, Locale
 from schema import Schema, And, Use, Or
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 
 from nose.tools import *  # noqa PEP8 asserts
 
 from framework.auth import Auth
 from osf.models import Comment, NotificationDigest, NotificationSubscription, Guid, OSFUser
+from osf.exceptions import ValidationValueError
 
 from website.notifications.tasks import get_users_emails, send_users_email, group_by_node, remove_notifications
+from website.notifications import tasks
 from website.notifications.exceptions import InvalidSubscriptionError
 from website.notifications import constants
 from website.notifications import emails
@@ -1284,6 +1288,63 @@ class TestCompileSubscriptions(NotificationTestCase):
         subs = emails.compile_subscriptions(node5, 'file_updated')
         assert_equal(subs, {'email_transactional': [], 'email_digest': [self.user_1._id], 'none': []})
 
+    def test_resolver_matches_recursive_compilation_on_nested_trees(self):
+        # user_4 can read the deep components only as an admin on shared_node
+        self.shared_node.add_contributor(self.user_4, permissions=permissions.ADMIN)
+        disabled_user = factories.UserFactory()
+        self.base_project.add_contributor(disabled_user, permissions=permissions.WRITE)
+        node2 = factories.NodeFactory(parent=self.shared_node, creator=self.user_1)
+        node3 = factories.NodeFactory(parent=node2, creator=self.user_1)
+        node4 = factories.NodeFactory(parent=node3, creator=self.user_1)
+        node3.add_contributor(self.user_3, permissions=permissions.READ)
+        node4.add_contributor(self.user_2, permissions=permissions.READ)
+        node4.remove_contributor(self.user_2, auth=Auth(self.user_1))
+
+        self.base_sub.email_transactional.add(self.user_1, self.user_2, self.user_3, disabled_user)
+        self.base_sub.email_digest.add(self.user_4)
+        self.shared_sub.email_digest.add(self.user_2)
+        self.private_sub.none.add(self.user_1)
+        node3_sub = factories.NotificationSubscriptionFactory(
+            _id=node3._id + '_file_updated',
+            node=node3,
+            event_name='file_updated'
+        )
+        node3_sub.none.add(self.user_3)
+        node3_sub.email_transactional.add(self.user_4)
+        file_sub = factories.NotificationSubscriptionFactory(
+            _id=node4._id + '_xyz42_file_updated',
+            node=node4,
+            event_name='xyz42_file_updated'
+        )
+        file_sub.email_digest.add(self.user_1)
+        disabled_user.is_disabled = True
+        disabled_user.save()
+
+        for node in (self.base_project, self.shared_node, self.private_node, node2, node3, node4):
+            for event in (None, 'xyz42_file_updated'):
+                resolved = emails.resolve_subscriptions(node, 'file_updated', event)
+                compiled = emails._compile_subscriptions_recursive(node, 'file_updated', event)
+                assert_equal(resolved, {key: sorted(value) for key, value in compiled.items()})
+
+        assert_equal(emails.compile_subscriptions(node4, 'file_updated', 'xyz42_file_updated'), {
+            'email_transactional': [self.user_4._id],
+            'email_digest': sorted([self.user_1._id, self.user_2._id]),
+            'none': [],
+        })
+
+    def test_resolver_queries_do_not_grow_with_depth(self):
+        self.base_sub.email_transactional.add(self.user_1)
+        shallow = factories.NodeFactory(parent=self.shared_node)
+        deep = shallow
+        for _ in range(5):
+            deep = factories.NodeFactory(parent=deep)
+
+        with CaptureQueriesContext(connection) as shallow_queries:
+            emails.resolve_subscriptions(shallow, 'file_updated')
+        with CaptureQueriesContext(connection) as deep_queries:
+            assert_equal(emails.resolve_subscriptions(deep, 'file_updated')['email_transactional'], [self.user_1._id])
+        assert_equal(len(deep_queries), len(shallow_queries))
+
 
 class TestMoveSubscription(NotificationTestCase):
     def setUp(self):
@@ -1707,6 +1768,55 @@ class TestSendEmails(NotificationTestCase):
         formatted_datetime = u'{time} on {date}'.format(time=formatted_time, date=formatted_date)
         assert_equal(emails.localize_timestamp(timestamp, self.user), formatted_datetime)
 
+    @mock.patch('website.mails.render_message', return_value='rendered')
+    def test_store_emails_creates_digests_for_active_recipients(self, mock_render):
+        timestamp = timezone.now()
+        recipients = [factories.UserFactory() for _ in range(3)]
+        disabled = factories.UserFactory()
+        disabled.is_disabled = True
+        disabled.save()
+        recipient_ids = [recipient._id for recipient in recipients] + [disabled._id, self.user._id]
+
+        emails.store_emails(recipient_ids, 'email_digest', 'comments', self.user, self.node, timestamp)
+
+        digests = NotificationDigest.objects.filter(event='comments')
+        assert_equal(set(digests.values_list('user__guids___id', flat=True)), {recipient._id for recipient in recipients})
+        for digest in digests:
+            assert_equal(digest.send_type, 'email_digest')
+            assert_equal(digest.node_lineage, [self.project._id, self.node._id])
+
+    @mock.patch('website.mails.render_message', return_value='rendered')
+    def test_store_emails_renders_once_per_timezone_and_locale(self, mock_render):
+        timestamp = timezone.now()
+        recipients = [
+            factories.UserFactory(timezone='America/New_York', locale='en_US'),
+            factories.UserFactory(timezone='America/New_York', locale='en_US'),
+            factories.UserFactory(timezone='Europe/Moscow', locale='ru_RU'),
+        ]
+        emails.store_emails([recipient._id for recipient in recipients], 'email_digest', 'comments',
+                            self.user, self.node, timestamp)
+        assert_equal(mock_render.call_count, 2)
+        assert_equal(NotificationDigest.objects.filter(event='comments', message='rendered').count(), 3)
+
+    @mock.patch('website.mails.render_message', return_value='rendered')
+    def test_store_emails_renders_per_recipient_when_template_addresses_recipient(self, mock_render):
+        recipients = [factories.UserFactory(timezone='Etc/UTC', locale='en') for _ in range(2)]
+        emails.store_emails([recipient._id for recipient in recipients], 'email_transactional',
+                            'reviews_submission_status', self.user, self.node, timezone.now())
+        assert_equal(mock_render.call_count, 2)
+        assert_equal([call[1]['recipient'] for call in mock_render.call_args_list], recipients)
+
+    def test_store_emails_rejects_invalid_notification_type(self):
+        with assert_raises(ValidationValueError):
+            emails.store_emails([factories.UserFactory()._id], 'email_whenever', 'comments',
+                                self.user, self.node, timezone.now())
+
+    def test_template_references(self):
+        assert_true(mails.template_references('reviews_submission_status.html.mako', 'recipient'))
+        assert_false(mails.template_references('comments.html.mako', 'recipient'))
+        # inherited from notify_base.mako
+        assert_true(mails.template_references('comments.html.mako', 'settings'))
+
 
 class TestSendDigest(OsfTestCase):
     def setUp(self):
@@ -1869,6 +1979,51 @@ class TestSendDigest(OsfTestCase):
         send_users_email(send_type)
         assert_false(mock_send_mail.called)
 
+    @mock.patch('website.mails.send_mail')
+    def test_send_users_email_in_batches(self, mock_send_mail):
+        send_type = 'email_transactional'
+        project = factories.ProjectFactory()
+        users = [factories.UserFactory() for _ in range(5)]
+        for user in users:
+            factories.NotificationDigestFactory(
+                user=user,
+                send_type=send_type,
+                event='comment_replies',
+                timestamp=timezone.now(),
+                message='Hello',
+                node_lineage=[project._id]
+            )
+
+        with mock.patch('website.notifications.tasks.remove_notifications',
+                        wraps=remove_notifications) as mock_remove:
+            tasks._send_global_and_node_emails(send_type, batch_size=2)
+
+        assert_equal(mock_send_mail.call_count, 5)
+        assert_equal(mock_remove.call_count, 3)
+        assert_equal({call[1]['to_addr'] for call in mock_send_mail.call_args_list}, {user.username for user in users})
+        assert_true(all(call[1]['node'] == project for call in mock_send_mail.call_args_list))
+        assert_false(NotificationDigest.objects.filter(send_type=send_type).exists())
+
+    @mock.patch('website.mails.send_mail')
+    def test_send_users_email_removes_sent_digests_when_a_send_fails(self, mock_send_mail):
+        send_type = 'email_transactional'
+        users = [factories.UserFactory() for _ in range(2)]
+        for user in users:
+            factories.NotificationDigestFactory(
+                user=user,
+                send_type=send_type,
+                event='comment_replies',
+                timestamp=timezone.now(),
+                message='Hello',
+                node_lineage=[factories.ProjectFactory()._id]
+            )
+        mock_send_mail.side_effect = [None, Exception('mail server down')]
+
+        with assert_raises(Exception):
+            tasks._send_global_and_node_emails(send_type)
+
+        assert_equal(NotificationDigest.objects.filter(send_type=send_type).count(), 1)
+
     def test_remove_sent_digest_notifications(self):
         d = factories.NotificationDigestFactory(
             event='comment_replies',
@@ -16,6 +16,7 @@ from framework.celery_tasks import handlers as celery_task_handlers
 from framework.django import handlers as django_handlers
 from framework.csrf import handlers as csrf_handlers
 from framework.flask import add_handlers, app
+from framework.guids import handlers as guid_handlers
 # Import necessary to initialize the root logger
 from framework.logging import logger as root_logger  # noqa
 from framework.postcommit_tasks import handlers as postcommit_handlers
@@ -69,6 +70,10 @@ def attach_handlers(app, settings):
     add_handlers(app, {'before_request': framework.sessions.before_request,
                        'after_request': framework.sessions.after_request})
 
+    # Attached last so that its after_request handler, which drops the request's guid identity map,
+    # runs before the handlers that run (postcommit) tasks
+    add_handlers(app, guid_handlers.handlers)
+
     return app
 
 
@@ -19,7 +19,9 @@ Usage: ::
 
 """
 import os
+import re
 import logging
+import functools
 import waffle
 
 from mako.lookup import TemplateLookup, Template
@@ -38,6 +40,8 @@ _tpl_lookup = TemplateLookup(
 
 HTML_EXT = '.html.mako'
 
+_TPL_REFERENCE = re.compile(r'<%(?:inherit|include|namespace)\s[^>]*file="([^"]+)"')
+
 DISABLED_MAILS = [
     'welcome',
     'welcome_osf4i'
@@ -76,6 +80,17 @@ def render_message(tpl_name, **context):
     return tpl.render(**context)
 
 
+@functools.lru_cache(maxsize=None)
+def template_references(tpl_name, name):
+    """Whether an email template, or any template it inherits or includes,
+    refers to the context variable `name`.
+    """
+    source = _tpl_lookup.get_template(tpl_name).source
+    if re.search(r'\b{}\b'.format(re.escape(name)), source):
+        return True
+    return any(template_references(uri, name) for uri in _TPL_REFERENCE.findall(source))
+
+
 def send_mail(
         to_addr, mail, from_addr=None, mailer=None, celery=True,
         username=None, password=None, callback=None, attachment_name=None,
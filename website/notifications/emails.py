@@ -1,9 +1,13 @@
+import collections
+
 from django.apps import apps
 
 from babel import dates, core, Locale
 
-from osf.models import AbstractNode, NotificationDigest, NotificationSubscription
-from osf.utils.permissions import ADMIN, READ
+from osf.models import AbstractNode, NodeClosure, NotificationDigest, NotificationSubscription
+from osf.models.node import NodeGroupObjectPermission
+from osf.models.validators import validate_subscription_type
+from osf.utils.permissions import ADMIN, ADMIN_NODE, READ, READ_NODE
 from website import mails
 from website.notifications import constants
 from website.notifications import utils
@@ -96,6 +100,8 @@ def store_emails(recipient_ids, notification_type, event, user, node, timestamp,
 
     if notification_type == 'none':
         return
+    # Digests are bulk created, which skips the per-instance validation done in save()
+    validate_subscription_type(notification_type)
 
     # If `template` is not specified, default to using a template with name `event`
     template = '{template}.html.mako'.format(template=template or event)
@@ -104,28 +110,148 @@ def store_emails(recipient_ids, notification_type, event, user, node, timestamp,
     context['user'] = user
     node_lineage_ids = get_node_lineage(node) if node else []
 
+    recipients = {
+        recipient._id: recipient
+        for recipient in OSFUser.objects.filter(
+            guids___id__in=[recipient_id for recipient_id in recipient_ids if recipient_id != user._id],
+            date_disabled__isnull=True,
+        ).prefetch_related('guids')
+    }
+    # Unless the template addresses the recipient directly, a message only varies with the
+    # recipient's timezone and locale, so render it once for every recipient sharing those.
+    per_recipient = mails.template_references(template, 'recipient')
+    messages = {}
+
+    digests = []
     for recipient_id in recipient_ids:
-        if recipient_id == user._id:
-            continue
-        recipient = OSFUser.load(recipient_id)
-        if recipient.is_disabled:
+        recipient = recipients.get(recipient_id)
+        if recipient is None:
             continue
-        context['localized_timestamp'] = localize_timestamp(timestamp, recipient)
-        context['recipient'] = recipient
-        message = mails.render_message(template, **context)
-        digest = NotificationDigest(
+        key = (recipient.timezone, recipient.locale)
+        if per_recipient or key not in messages:
+            context['localized_timestamp'] = localize_timestamp(timestamp, recipient)
+            context['recipient'] = recipient
+            messages[key] = mails.render_message(template, **context)
+        digests.append(NotificationDigest(
             timestamp=timestamp,
             send_type=notification_type,
             event=event,
             user=recipient,
-            message=message,
+            message=messages[key],
             node_lineage=node_lineage_ids,
             provider=abstract_provider
-        )
-        digest.save()
+        ))
+    NotificationDigest.objects.bulk_create(digests)
+
+
+def compile_subscriptions(node, event_type, event=None):
+    """Compile the subscriptions that apply to an event on a node.
+
+    Subscriptions on a node override the subscriber's choice on its ancestors, and a
+    subscription to the particular event overrides the node's one. Only users who can
+    read the node are returned.
+
+    :param node: current node
+    :param event_type: Generally node_subscriptions_available
+    :param event: Particular event such a file_updated that has specific file subs
+    :return: a dict of notification types with lists of users.
+    """
+    if isinstance(node, AbstractNode):
+        return resolve_subscriptions(node, event_type, event)
+    return _compile_subscriptions_recursive(node, event_type, event)
+
 
+def resolve_subscriptions(node, event_type, event=None):
+    """Set-based version of `_compile_subscriptions_recursive` for an AbstractNode.
 
-def compile_subscriptions(node, event_type, event=None, level=0):
+    The lineage's subscriptions, their subscribers and the subscribers' permissions on the
+    lineage are each loaded with a single query, however deep the node is nested.
+    """
+    OSFUser = apps.get_model('osf', 'OSFUser')
+
+    ancestor_ids = list(
+        NodeClosure.objects.filter(descendant_id=node.pk)
+        .order_by('-depth')
+        .values_list('ancestor_id', flat=True)
+    )
+    # Root first, with the node itself last
+    lineage = ancestor_ids + [node.pk]
+    guids = {
+        lineage_node.pk: lineage_node._id
+        for lineage_node in AbstractNode.objects.filter(pk__in=ancestor_ids).prefetch_related('guids')
+    }
+    guids[node.pk] = node._id
+
+    levels = [(index, event_type) for index in range(len(lineage))]
+    if event:
+        levels.append((len(lineage) - 1, event))
+    keys = {utils.to_subscription_key(guids[lineage[index]], name) for index, name in levels}
+    subscription_ids = dict(
+        NotificationSubscription.objects.filter(_id__in=keys).values_list('_id', 'id')
+    )
+
+    subscribers = collections.defaultdict(set)
+    for notification_type in constants.NOTIFICATION_TYPES:
+        through = getattr(NotificationSubscription, notification_type).through
+        rows = through.objects.filter(
+            notificationsubscription_id__in=subscription_ids.values(),
+            osfuser__date_disabled__isnull=True,
+        ).values_list('notificationsubscription_id', 'osfuser_id')
+        for subscription_id, user_id in rows:
+            subscribers[subscription_id, notification_type].add(user_id)
+
+    # READ on a node comes from a permission on the node itself, or from ADMIN on it or any
+    # of its ancestors (see AbstractNode.has_permission and is_admin_parent).
+    user_ids = set().union(*subscribers.values())
+    lineage_index = {pk: index for index, pk in enumerate(lineage)}
+    readable = set()
+    admin_from = {}
+    permission_rows = NodeGroupObjectPermission.objects.filter(
+        content_object_id__in=lineage,
+        permission__codename__in=(READ_NODE, ADMIN_NODE),
+        group__user__in=user_ids,
+    ).values_list('group__user', 'content_object_id', 'permission__codename').distinct()
+    for user_id, node_id, codename in permission_rows:
+        index = lineage_index[node_id]
+        if codename == ADMIN_NODE:
+            admin_from[user_id] = min(index, admin_from.get(user_id, index))
+        else:
+            readable.add((user_id, index))
+
+    def can_read(user_id, index):
+        return (user_id, index) in readable or admin_from.get(user_id, len(lineage)) <= index
+
+    compiled = {notification_type: set() for notification_type in constants.NOTIFICATION_TYPES}
+    for index, name in levels:
+        subscription_id = subscription_ids.get(utils.to_subscription_key(guids[lineage[index]], name))
+        level_subscribers = {
+            notification_type: {
+                user_id for user_id in subscribers[subscription_id, notification_type]
+                if can_read(user_id, index)
+            } for notification_type in constants.NOTIFICATION_TYPES
+        }
+        for notification_type in compiled:
+            overridden = set().union(*(
+                users for other_type, users in level_subscribers.items() if other_type != notification_type
+            ))
+            compiled[notification_type] = (compiled[notification_type] | level_subscribers[notification_type]) - overridden
+
+    node_index = len(lineage) - 1
+    recipients = {
+        notification_type: [user_id for user_id in users if can_read(user_id, node_index)]
+        for notification_type, users in compiled.items()
+    }
+    user_guids = {
+        user.pk: user._id
+        for user in OSFUser.objects.filter(pk__in=set().union(*recipients.values())).prefetch_related('guids')
+    }
+    return {
+        notification_type: sorted(user_guids[user_id] for user_id in users)
+        for notification_type, users in recipients.items()
+    }
+
+
+def _compile_subscriptions_recursive(node, event_type, event=None, level=0):
     """Recurse through node and parents for subscriptions.
 
     :param node: current node
@@ -137,10 +263,10 @@ def compile_subscriptions(node, event_type, event=None, level=0):
     subscriptions = check_node(node, event_type)
     if event:
         subscriptions = check_node(node, event)  # Gets particular event subscriptions
-        parent_subscriptions = compile_subscriptions(node, event_type, level=level + 1)  # get node and parent subs
+        parent_subscriptions = _compile_subscriptions_recursive(node, event_type, level=level + 1)  # get node and parent subs
     elif getattr(node, 'parent_id', False):
         parent_subscriptions = \
-            compile_subscriptions(AbstractNode.load(node.parent_id), event_type, level=level + 1)
+            _compile_subscriptions_recursive(AbstractNode.load(node.parent_id), event_type, level=level + 1)
     else:
         parent_subscriptions = check_node(None, event_type)
     for notification_type in parent_subscriptions:
@@ -184,15 +310,9 @@ def get_node_lineage(node):
         e.g. [parent._id, node._id]
     """
     from osf.models import Preprint
-    lineage = [node._id]
     if isinstance(node, Preprint):
-        return lineage
-
-    while node.parent_id:
-        node = node.parent_node
-        lineage = [node._id] + lineage
-
-    return lineage
+        return [node._id]
+    return [*reversed(NodeClosure.ancestor_guids(node.pk)), node._id]
 
 
 def get_settings_url(uid, user):
@@ -20,6 +20,8 @@ from osf.utils.permissions import ADMIN
 from website import mails, settings
 from website.notifications.utils import NotificationsDict
 
+DIGEST_BATCH_SIZE = 100
+
 
 @celery_app.task(name='website.notifications.tasks.send_users_email', max_retries=0)
 def send_users_email(send_type):
@@ -32,34 +34,57 @@ def send_users_email(send_type):
     _send_reviews_moderator_emails(send_type)
 
 
-def _send_global_and_node_emails(send_type):
+def _send_global_and_node_emails(send_type, batch_size=DIGEST_BATCH_SIZE):
     """
     Called by `send_users_email`. Send all global and node-related notification emails.
+
+    Groups are handled `batch_size` at a time: their users and single-node digest nodes are
+    loaded together, and the sent digests are removed with a single delete per batch.
     """
     grouped_emails = get_users_emails(send_type)
-    for group in grouped_emails:
-        user = OSFUser.load(group['user_id'])
-        if not user:
-            log_exception()
-            continue
-        info = group['info']
-        notification_ids = [message['_id'] for message in info]
-        sorted_messages = group_by_node(info)
-        if sorted_messages:
-            if not user.is_disabled:
-                # If there's only one node in digest we can show it's preferences link in the template.
-                notification_nodes = list(sorted_messages['children'].keys())
-                node = AbstractNode.load(notification_nodes[0]) if len(
-                    notification_nodes) == 1 else None
-                mails.send_mail(
-                    to_addr=user.username,
-                    can_change_node_preferences=bool(node),
-                    node=node,
-                    mail=mails.DIGEST,
-                    name=user.fullname,
-                    message=sorted_messages,
-                )
-            remove_notifications(email_notification_ids=notification_ids)
+    while True:
+        groups = list(itertools.islice(grouped_emails, batch_size))
+        if not groups:
+            break
+        users = _load_by_guid(OSFUser, [group['user_id'] for group in groups])
+        sorted_messages = {group['user_id']: group_by_node(group['info']) for group in groups}
+        # If there's only one node in digest we can show it's preferences link in the template.
+        single_node_ids = {
+            user_id: next(iter(messages['children']))
+            for user_id, messages in sorted_messages.items()
+            if len(messages['children']) == 1
+        }
+        nodes = _load_by_guid(AbstractNode, single_node_ids.values())
+
+        sent_notification_ids = []
+        try:
+            for group in groups:
+                user = users.get(group['user_id'])
+                if not user:
+                    log_exception()
+                    continue
+                if sorted_messages[group['user_id']]:
+                    if not user.is_disabled:
+                        node = nodes.get(single_node_ids.get(group['user_id']))
+                        mails.send_mail(
+                            to_addr=user.username,
+                            can_change_node_preferences=bool(node),
+                            node=node,
+                            mail=mails.DIGEST,
+                            name=user.fullname,
+                            message=sorted_messages[group['user_id']],
+                        )
+                    sent_notification_ids.extend(message['_id'] for message in group['info'])
+        finally:
+            remove_notifications(email_notification_ids=sent_notification_ids)
+
+
+def _load_by_guid(model, guids):
+    """Load the instances of `model` with the given guids in one query, keyed by guid."""
+    return {
+        instance._id: instance
+        for instance in model.objects.filter(guids___id__in=list(guids)).prefetch_related('guids')
+    }
 
 
 def _send_reviews_moderator_emails(send_type):
@@ -200,9 +225,11 @@ def get_users_emails(send_type):
     ORDER BY osf_guid.id ASC
     """
 
-    with connection.cursor() as cursor:
+    # Server-side cursor, so groups are streamed rather than fetched all at once
+    with connection.chunked_cursor() as cursor:
         cursor.execute(sql, [send_type, ])
-        return itertools.chain.from_iterable(cursor.fetchall())
+        for row in cursor:
+            yield from row
 
 
 def group_by_node(notifications, limit=15):
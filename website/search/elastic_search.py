@@ -2,20 +2,21 @@
 
 from __future__ import division
 
+import collections
 import copy
 import functools
 import logging
 import math
 import re
+import time
 import unicodedata
 from framework import sentry
 
 import six
 
 from django.apps import apps
-from django.core.paginator import Paginator
 from django.contrib.contenttypes.models import ContentType
-from django.db.models import Q
+from django.db.models import Exists, F, Max, OuterRef, Q, prefetch_related_objects
 from elasticsearch2 import (ConnectionError, Elasticsearch, NotFoundError,
                            RequestError, TransportError, helpers)
 from framework.celery_tasks import app as celery_app
@@ -23,13 +24,20 @@ from framework.database import paginated
 from osf.models import AbstractNode
 from osf.models import OSFUser
 from osf.models import BaseFileNode
+from osf.models import Contributor
 from osf.models import GuidMetadataRecord
 from osf.models import Institution
+from osf.models import NodeClosure
+from osf.models import NodeLicenseRecord
+from osf.models import NodeRelation
 from osf.models import OSFGroup
 from osf.models import QuickFilesNode
 from osf.models import Preprint
 from osf.models import SpamStatus
-from addons.wiki.models import WikiPage
+from osf.models import Tag
+from osf.models.node import NodeGroupObjectPermission
+from osf.models.osf_group import OSFGroupGroupObjectPermission
+from addons.wiki.models import WikiVersion
 from osf.models import CollectionSubmission
 from osf.utils.sanitize import unescape_entities
 from osf.utils.workflows import CollectionSubmissionStates
@@ -347,7 +355,11 @@ def get_doctype_from_node(node):
         return 'group'
     if node.is_registration:
         return 'registration'
-    elif node.parent_node is None:
+    if getattr(node, '_search_relations', None):
+        parent = _search_relations(node)['parent_id']
+    else:
+        parent = node.parent_node
+    if parent is None:
         # ElasticSearch categorizes top-level projects differently than children
         return 'project'
     elif node.category in COMPONENT_CATEGORIES:
@@ -391,8 +403,152 @@ def update_user_async(self, user_id, index=None):
     except Exception as exc:
         self.retry(exc)
 
+class NodeSearchRelations(object):
+    """The related objects `serialize_node` reads, for a batch of nodes.
+
+    Nothing is loaded until a node of the batch is serialized; then every relation is loaded
+    for the whole batch with one query (a couple for groups and parents), instead of once per
+    node. Batches are attached to nodes with `prefetch_search_relations`.
+    """
+
+    def __init__(self, nodes):
+        self.nodes = list(nodes)
+        self._relations = None
+
+    def __getitem__(self, node):
+        if self._relations is None:
+            self._relations = _load_search_relations(self.nodes)
+        return self._relations[node.id]
+
+
+def prefetch_search_relations(nodes):
+    """Have `serialize_node` share one `NodeSearchRelations` between the AbstractNodes in `nodes`"""
+    nodes = [node for node in nodes if isinstance(node, AbstractNode)]
+    batch = NodeSearchRelations(nodes)
+    for node in nodes:
+        node._search_relations = batch
+
+
+def clear_search_relations(nodes):
+    for node in nodes:
+        node.__dict__.pop('_search_relations', None)
+
+
+def _search_relations(node):
+    batch = getattr(node, '_search_relations', None) or NodeSearchRelations([node])
+    return batch[node]
+
+
+def _load_search_relations(nodes):
+    node_ids = [node.id for node in nodes]
+    relations = {
+        node.id: {
+            'parent_id': None,
+            'contributors': [],
+            'groups': [],
+            'tags': [],
+            'institutions': [],
+            'license': None,
+            'guid_metadata': {},
+            'wikis': [],
+        }
+        for node in nodes
+    }
+    prefetch_related_objects(nodes, 'guids')
+
+    # Sanction state of registrations is read from their root
+    registrations = [node for node in nodes if node.is_registration]
+    prefetch_related_objects(
+        registrations,
+        'retraction', 'embargo', 'registration_approval',
+        'root__retraction', 'root__embargo', 'root__registration_approval',
+    )
+
+    parent_ids = dict(
+        NodeRelation.objects.filter(child_id__in=node_ids, is_node_link=False).values_list('child_id', 'parent_id')
+    )
+    parent_guids = {
+        parent.id: parent._id
+        for parent in AbstractNode.objects.filter(id__in=set(parent_ids.values())).prefetch_related('guids')
+    }
+    for node_id, parent_id in parent_ids.items():
+        relations[node_id]['parent_id'] = parent_guids.get(parent_id)
+
+    contributors = Contributor.objects.filter(
+        node_id__in=node_ids,
+        visible=True,
+    ).order_by('node_id', '_order').values_list('node_id', 'user__fullname', 'user__guids___id', 'user__is_active')
+    for node_id, fullname, user_guid, is_active in contributors:
+        relations[node_id]['contributors'].append({
+            'fullname': fullname,
+            'url': '/{}/'.format(user_guid) if is_active else None
+        })
+
+    # See AbstractNode.osf_groups
+    nodes_by_member_group = collections.defaultdict(set)
+    member_groups = NodeGroupObjectPermission.objects.filter(
+        content_object_id__in=node_ids,
+        group__name__icontains='osfgroup',
+    ).values_list('group_id', 'content_object_id').distinct()
+    for group_id, node_id in member_groups:
+        nodes_by_member_group[group_id].add(node_id)
+    nodes_by_osf_group = collections.defaultdict(set)
+    osf_group_permissions = OSFGroupGroupObjectPermission.objects.filter(
+        group_id__in=nodes_by_member_group,
+    ).values_list('group_id', 'content_object_id')
+    for group_id, osf_group_id in osf_group_permissions:
+        nodes_by_osf_group[osf_group_id] |= nodes_by_member_group[group_id]
+    for osf_group in OSFGroup.objects.filter(id__in=nodes_by_osf_group).values('id', 'name', '_id'):
+        for node_id in nodes_by_osf_group[osf_group['id']]:
+            relations[node_id]['groups'].append({
+                'name': osf_group['name'],
+                'url': '/{}/'.format(osf_group['_id'])
+            })
+
+    for node_id, name, system in Tag.objects.filter(abstractnode_tagged__in=node_ids).values_list('abstractnode_tagged', 'name', 'system'):
+        relations[node_id]['tags'].append((name, system))
+
+    # The through table bypasses InstitutionManager, so deactivated institutions are excluded here
+    institutions = AbstractNode.affiliated_institutions.through.objects.filter(
+        abstractnode_id__in=node_ids,
+        institution__deactivated__isnull=True,
+    ).values_list('abstractnode_id', 'institution__name')
+    for node_id, name in institutions:
+        relations[node_id]['institutions'].append(name)
+
+    # Nodes without a license inherit the closest ancestor's (see AbstractNode.license)
+    license_ids = {node.id: node.node_license_id for node in nodes if node.node_license_id}
+    inherited_licenses = NodeClosure.objects.filter(
+        descendant_id__in=[node_id for node_id in node_ids if node_id not in license_ids],
+        ancestor__node_license__isnull=False,
+    ).order_by('descendant_id', 'depth').values_list('descendant_id', 'ancestor__node_license_id')
+    for node_id, license_id in inherited_licenses:
+        license_ids.setdefault(node_id, license_id)
+    license_records = NodeLicenseRecord.objects.select_related('node_license').in_bulk(set(license_ids.values()))
+    for node_id, license_id in license_ids.items():
+        relations[node_id]['license'] = license_records.get(license_id)
+
+    node_ids_by_guid = {node._id: node.id for node in nodes}
+    for record in GuidMetadataRecord.objects.filter(guid___id__in=node_ids_by_guid).select_related('guid'):
+        relations[node_ids_by_guid[record.guid._id]]['guid_metadata'] = _serialize_guid_metadata_record(record)
+
+    # See WikiPageNodeManager.get_wiki_pages_latest
+    latest_wikis = WikiVersion.objects.annotate(
+        newest_version=Max('wiki_page__versions__identifier'),
+    ).filter(
+        identifier=F('newest_version'),
+        wiki_page__node_id__in=[node.id for node in nodes if not node.is_retracted],
+        wiki_page__deleted__isnull=True,
+    ).select_related('wiki_page')
+    for wiki in latest_wikis:
+        relations[wiki.wiki_page.node_id]['wikis'].append(wiki)
+
+    return relations
+
+
 def serialize_node(node, category):
-    parent_id = node.parent_id
+    relations = _search_relations(node)
+    parent_id = relations['parent_id']
 
     try:
         normalized_title = six.u(node.title)
@@ -400,28 +556,15 @@ def serialize_node(node, category):
         normalized_title = node.title
     normalized_title = unicodedata.normalize('NFKD', normalized_title)
     elastic_document = {
-        **serialize_guid_metadata(node._id),
+        **relations['guid_metadata'],
         'id': node._id,
-        'contributors': [
-            {
-                'fullname': x['user__fullname'],
-                'url': '/{}/'.format(x['user__guids___id']) if x['user__is_active'] else None
-            }
-            for x in node.contributor_set.filter(visible=True).order_by('_order')
-            .values('user__fullname', 'user__guids___id', 'user__is_active')
-        ],
-        'groups': [
-            {
-                'name': x['name'],
-                'url': '/{}/'.format(x['_id'])
-            }
-            for x in node.osf_groups.values('name', '_id')
-        ],
+        'contributors': relations['contributors'],
+        'groups': relations['groups'],
         'title': node.title,
         'normalized_title': normalized_title,
         'category': category,
         'public': node.is_public,
-        'tags': list(node.tags.filter(system=False).values_list('name', flat=True)),
+        'tags': [name for name, system in relations['tags'] if not system],
         'description': node.description,
         'url': node.url,
         'is_registration': node.is_registration,
@@ -434,13 +577,13 @@ def serialize_node(node, category):
         'wikis': {},
         'parent_id': parent_id,
         'date_created': node.created,
-        'license': serialize_node_license_record(node.license),
-        'affiliated_institutions': list(node.affiliated_institutions.values_list('name', flat=True)),
+        'license': serialize_node_license_record(relations['license']),
+        'affiliated_institutions': relations['institutions'],
         'boost': int(not node.is_registration) + 1,  # This is for making registered projects less relevant
         'extra_search_terms': clean_splitters(node.title),
     }
     if not node.is_retracted:
-        for wiki in WikiPage.objects.get_wiki_pages_latest(node):
+        for wiki in relations['wikis']:
             # '.' is not allowed in field names in ES2
             elastic_document['wikis'][wiki.wiki_page.page_name.replace('.', ' ')] = wiki.raw_text(node)
 
@@ -519,7 +662,11 @@ def update_node(node, index=None, bulk=False, async_update=False):
     for file_ in paginated(OsfStorageFile, Q(target_content_type=ContentType.objects.get_for_model(type(node)), target_object_id=node.id)):
         file_.update_search()
 
-    is_qa_node = bool(set(settings.DO_NOT_INDEX_LIST['tags']).intersection(node.tags.all().values_list('name', flat=True))) or any(substring in node.title for substring in settings.DO_NOT_INDEX_LIST['titles'])
+    if getattr(node, '_search_relations', None):
+        tag_names = [name for name, system in _search_relations(node)['tags']]
+    else:
+        tag_names = node.tags.all().values_list('name', flat=True)
+    is_qa_node = bool(set(settings.DO_NOT_INDEX_LIST['tags']).intersection(tag_names)) or any(substring in node.title for substring in settings.DO_NOT_INDEX_LIST['titles'])
     if node.is_deleted or not node.is_public or node.archiving or node.is_spam or (node.spam_status == SpamStatus.FLAGGED and settings.SPAM_FLAGGED_REMOVE_FROM_SEARCH) or node.is_quickfiles or is_qa_node:
         delete_doc(node._id, node, index=index)
     else:
@@ -562,6 +709,24 @@ def update_group(group, index=None, bulk=False, async_update=False, deleted_id=N
         else:
             client().index(index=index, doc_type=category, id=group._id, body=elastic_document, refresh=True)
 
+def _bulk_update_actions(serialize, nodes, index, category=None):
+    nodes = list(nodes)
+    prefetch_search_relations(nodes)
+    try:
+        for node in nodes:
+            serialized = serialize(node)
+            if serialized:
+                yield {
+                    '_op_type': 'update',
+                    '_index': index,
+                    '_id': node._id,
+                    '_type': category or get_doctype_from_node(node),
+                    'doc': serialized,
+                    'doc_as_upsert': True,
+                }
+    finally:
+        clear_search_relations(nodes)
+
 def bulk_update_nodes(serialize, nodes, index=None, category=None):
     """Updates the list of input projects
 
@@ -571,21 +736,73 @@ def bulk_update_nodes(serialize, nodes, index=None, category=None):
     :return:
     """
     index = index or INDEX
-    actions = []
-    for node in nodes:
-        serialized = serialize(node)
-        if serialized:
-            actions.append({
-                '_op_type': 'update',
-                '_index': index,
-                '_id': node._id,
-                '_type': category or get_doctype_from_node(node),
-                'doc': serialized,
-                'doc_as_upsert': True,
-            })
-    if actions:
-        return helpers.bulk(client(), actions, refresh=True)
+    return helpers.bulk(client(), _bulk_update_actions(serialize, nodes, index, category=category), refresh=True)
+
+def iter_queryset_chunks(queryset, chunk_size=500):
+    """Yield the objects of `queryset` in lists of `chunk_size`, paging on primary key.
+
+    Unlike `QuerySet.iterator`, each chunk still runs the queryset's `select_related`
+    and `prefetch_related` lookups, so serializers can use them.
+    """
+    queryset = queryset.order_by('pk')
+    last_pk = None
+    while True:
+        page = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        chunk = list(page[:chunk_size])
+        if not chunk:
+            return
+        yield chunk
+        if len(chunk) < chunk_size:
+            return
+        last_pk = chunk[-1].pk
+
+def stream_bulk_update_nodes(serialize, queryset, index=None, category=None, chunk_size=500):
+    """Updates every object in `queryset` without loading them all into memory.
+
+    Meant for full reindexes: objects are loaded and serialized a chunk at a time, the index is
+    only refreshed once at the end, and throughput is logged as chunks are sent.
 
+    :param function Node-> dict serialize:
+    :param QuerySet queryset: Projects, components, registrations, preprints, groups or files
+    :param str index: Index of the nodes
+    :return tuple: Number of documents indexed and number that failed
+    """
+    index = index or INDEX
+
+    def actions():
+        for chunk in iter_queryset_chunks(queryset, chunk_size=chunk_size):
+            yield from _bulk_update_actions(serialize, chunk, index, category=category)
+
+    return _stream_bulk(actions(), index, chunk_size)
+
+def _stream_bulk(actions, index, chunk_size, ignore_missing=False):
+    """Send `actions` with streaming_bulk, refreshing `index` once at the end.
+
+    :param bool ignore_missing: Don't count updates to documents that aren't in the index as failures
+    :return tuple: Number of documents indexed and number that failed
+    """
+    start = time.time()
+    indexed = failed = 0
+    for ok, result in helpers.streaming_bulk(client(), actions, chunk_size=chunk_size, raise_on_error=False, refresh=False):
+        if ok:
+            indexed += 1
+        elif ignore_missing and result.get('update', {}).get('status') == 404:
+            pass
+        else:
+            failed += 1
+            logger.error('Failed to index document: {}'.format(result))
+        if (indexed + failed) % chunk_size == 0:
+            logger.info('{} documents sent ({:.1f}/s)'.format(indexed + failed, (indexed + failed) / (time.time() - start)))
+    client().indices.refresh(index=index)
+
+    elapsed = time.time() - start
+    logger.info('Indexed {} documents, {} failed, in {:.1f}s ({:.1f}/s)'.format(
+        indexed,
+        failed,
+        elapsed,
+        (indexed + failed) / elapsed if elapsed else 0,
+    ))
+    return indexed, failed
 
 def serialize_collection_submission_contributor(contrib):
     return {
@@ -660,15 +877,69 @@ def serialize_contributors(node):
 bulk_update_contributors = functools.partial(bulk_update_nodes, serialize_contributors)
 
 
+def serialize_contributors_for_nodes(node_ids):
+    """Like `serialize_contributors`, for many nodes with one query.
+
+    :return dict: Lists of contributors keyed by node id
+    """
+    contributors = {node_id: [] for node_id in node_ids}
+    rows = Contributor.objects.filter(
+        node_id__in=node_ids,
+        visible=True,
+        user__is_active=True,
+    ).order_by('node_id', '_order').values_list('node_id', 'user__fullname', 'user__guids___id')
+    for node_id, fullname, guid in rows:
+        contributors[node_id].append({
+            'fullname': fullname,
+            'url': '/{}/'.format(guid),
+        })
+    return contributors
+
+def _contributor_update_doctype(node):
+    """`get_doctype_from_node` for nodes annotated with `has_parent`, without querying the parent"""
+    if node.is_registration:
+        return 'registration'
+    elif not node.has_parent:
+        return 'project'
+    elif node.category in COMPONENT_CATEGORIES:
+        return 'component'
+    return node.category
+
+def stream_contributor_updates(nodes, index=None, chunk_size=500):
+    """Update the `contributors` field of every node in the `nodes` queryset.
+
+    Each chunk's visible contributors are loaded with a single query and sent as partial
+    updates, so nodes that aren't in the index (e.g. private ones) are left out of it.
+    The index is refreshed once at the end.
+
+    :return tuple: Number of documents updated and number that failed
+    """
+    index = index or INDEX
+    nodes = nodes.annotate(
+        has_parent=Exists(NodeRelation.objects.filter(child_id=OuterRef('pk'), is_node_link=False))
+    ).prefetch_related('guids')
+
+    def actions():
+        for chunk in iter_queryset_chunks(nodes, chunk_size=chunk_size):
+            contributors = serialize_contributors_for_nodes([node.id for node in chunk])
+            for node in chunk:
+                yield {
+                    '_op_type': 'update',
+                    '_index': index,
+                    '_id': node._id,
+                    '_type': _contributor_update_doctype(node),
+                    'doc': {'contributors': contributors[node.id]},
+                }
+
+    return _stream_bulk(actions(), index, chunk_size, ignore_missing=True)
+
 @celery_app.task(bind=True, max_retries=5, default_retry_delay=60)
 def update_contributors_async(self, user_id):
     OSFUser = apps.get_model('osf.OSFUser')
     user = OSFUser.objects.get(id=user_id)
     # If search updated so group member names are displayed on project search results,
     # then update nodes that the user has group membership as well
-    p = Paginator(user.visible_contributor_to.order_by('id'), 100)
-    for page_num in p.page_range:
-        bulk_update_contributors(p.page(page_num).object_list)
+    stream_contributor_updates(user.visible_contributor_to)
 
 @requires_search
 def update_user(user, index=None):
@@ -979,21 +1250,31 @@ def search_contributor(query, page=0, size=10, exclude=None, current_user=None):
     pages = math.ceil(results['counts'].get('user', 0) / size)
     validate_page_num(page, pages)
 
+    hits = {
+        user._id: user
+        for user in OSFUser.objects.filter(guids___id__in=[doc['id'] for doc in docs]).prefetch_related('guids')
+    }
+    if current_user:
+        projects_in_common = current_user.n_projects_in_common_by_user([
+            user.id for user in hits.values() if user.is_active and user.id != current_user.id
+        ])
+
     users = []
     for doc in docs:
         # TODO: use utils.serialize_user
-        user = OSFUser.load(doc['id'])
+        user = hits.get(doc['id'])
+
+        if user is None:
+            logger.error('Could not load user {0}'.format(doc['id']))
+            continue
 
         if current_user and current_user._id == user._id:
             n_projects_in_common = -1
         elif current_user:
-            n_projects_in_common = current_user.n_projects_in_common(user)
+            n_projects_in_common = projects_in_common.get(user.id, 0)
         else:
             n_projects_in_common = 0
 
-        if user is None:
-            logger.error('Could not load user {0}'.format(doc['id']))
-            continue
         if user.is_active:  # exclude merged, unregistered, etc.
             current_employment = None
             education = None
@@ -1033,20 +1314,24 @@ def serialize_guid_metadata(guid):
     if guid:
         guid_metadata_record = GuidMetadataRecord.objects.for_guid(guid)
         if guid_metadata_record.id:
-            serialized_guid_metadata = {
-                'title': guid_metadata_record.title or None,
-                'description': guid_metadata_record.description or None,
-                'language': guid_metadata_record.language or None,
-                'resource_type_general': guid_metadata_record.resource_type_general or None,
-                'funder_name': _funding_values(guid_metadata_record, 'funder_name'),
-                'funder_identifier': _funding_values(guid_metadata_record, 'funder_identifier'),
-                'award_number': _funding_values(guid_metadata_record, 'award_number'),
-                'award_uri': _funding_values(guid_metadata_record, 'award_uri'),
-                'award_title': _funding_values(guid_metadata_record, 'award_title'),
-            }
+            serialized_guid_metadata = _serialize_guid_metadata_record(guid_metadata_record)
     return serialized_guid_metadata
 
 
+def _serialize_guid_metadata_record(guid_metadata_record):
+    return {
+        'title': guid_metadata_record.title or None,
+        'description': guid_metadata_record.description or None,
+        'language': guid_metadata_record.language or None,
+        'resource_type_general': guid_metadata_record.resource_type_general or None,
+        'funder_name': _funding_values(guid_metadata_record, 'funder_name'),
+        'funder_identifier': _funding_values(guid_metadata_record, 'funder_identifier'),
+        'award_number': _funding_values(guid_metadata_record, 'award_number'),
+        'award_uri': _funding_values(guid_metadata_record, 'award_uri'),
+        'award_title': _funding_values(guid_metadata_record, 'award_title'),
+    }
+
+
 def _funding_values(guid_metadata_record, funding_field):
     return [
         funding_info[funding_field]
@@ -83,6 +83,11 @@ def bulk_update_nodes(serialize, nodes, index=None, category=None):
     index = index or settings.ELASTIC_INDEX
     search_engine.bulk_update_nodes(serialize, nodes, index=index, category=category)
 
+@requires_search
+def stream_bulk_update_nodes(serialize, queryset, index=None, category=None, chunk_size=500):
+    index = index or settings.ELASTIC_INDEX
+    return search_engine.stream_bulk_update_nodes(serialize, queryset, index=index, category=category, chunk_size=chunk_size)
+
 @requires_search
 def delete_node(node, index=None):
     index = index or settings.ELASTIC_INDEX
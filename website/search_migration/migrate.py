@@ -7,9 +7,9 @@ import functools
 import logging
 
 from django.db import connection
-from django.core.paginator import Paginator
 from elasticsearch2 import helpers
 
+from api.share.utils import update_share
 import website.search.search as search
 from website.search.elastic_search import client
 from website.search_migration import (
@@ -93,31 +93,25 @@ def migrate_nodes(index, delete, increment=10000):
 
 def migrate_preprints(index, delete):
     logger.info('Migrating preprints to index: {}'.format(index))
-    preprints = Preprint.objects.all()
-    increment = 100
-    paginator = Paginator(preprints, increment)
-    for page_number in paginator.page_range:
-        logger.info('Updating page {} / {}'.format(page_number, paginator.num_pages))
-        Preprint.bulk_update_search(paginator.page(page_number).object_list, index=index)
+    serialize = functools.partial(_update_preprint, index=index)
+    search.stream_bulk_update_nodes(serialize, Preprint.objects.all(), index=index, chunk_size=100)
+
+def _update_preprint(preprint, index):
+    # Preprint.bulk_update_search, which this replaces, also resent each preprint to SHARE
+    update_share(preprint)
+    return search.update_preprint(preprint, index=index, bulk=True, async_update=False)
 
 def migrate_preprint_files(index, delete):
     logger.info('Migrating preprint files to index: {}'.format(index))
     valid_preprints = Preprint.objects.all()
     valid_preprint_files = BaseFileNode.objects.filter(preprint__in=valid_preprints)
-    paginator = Paginator(valid_preprint_files, 500)
     serialize = functools.partial(search.update_file, index=index)
-    for page_number in paginator.page_range:
-        logger.info('Updating page {} / {}'.format(page_number, paginator.num_pages))
-        search.bulk_update_nodes(serialize, paginator.page(page_number).object_list, index=index, category='file')
+    search.stream_bulk_update_nodes(serialize, valid_preprint_files, index=index, category='file')
 
 def migrate_groups(index, delete):
     logger.info('Migrating groups to index: {}'.format(index))
-    groups = OSFGroup.objects.all()
-    increment = 100
-    paginator = Paginator(groups, increment)
-    for page_number in paginator.page_range:
-        logger.info('Updating page {} / {}'.format(page_number, paginator.num_pages))
-        OSFGroup.bulk_update_search(paginator.page(page_number).object_list, index=index)
+    serialize = functools.partial(search.update_group, index=index, bulk=True, async_update=False)
+    search.stream_bulk_update_nodes(serialize, OSFGroup.objects.all(), index=index, chunk_size=100)
 
 def migrate_files(index, delete, increment=10000):
     logger.info('Migrating files to index: {}'.format(index))
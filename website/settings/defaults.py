@@ -284,6 +284,11 @@ KEEN = {
     },
 }
 
+# CountedAuthUsages are buffered per process and written to elasticsearch in bulk once this many
+# are waiting, or once the oldest has waited this many seconds; 0 writes each usage in its request
+COUNTED_USAGE_BUFFER_SIZE = 100
+COUNTED_USAGE_BUFFER_SECONDS = 5
+
 SENTRY_DSN = None
 SENTRY_DSN_JS = None
 
@@ -371,8 +376,15 @@ SHARE_ENABLED = True  # This should be False for most local development
 SHARE_REGISTRATION_URL = ''
 SHARE_URL = 'https://share.osf.io/'
 SHARE_API_TOKEN = None  # Required to send project updates to SHARE
+# Push each updated resource to SHARE at most once per this many seconds (0 pushes every update)
+SHARE_UPDATE_COALESCE_SECONDS = 10
+# Number of guids per task when bulk-pushing to SHARE (recatalog_metadata, reindex_provider)
+SHARE_UPDATE_BATCH_SIZE = 100
 
 CAS_SERVER_URL = 'http://localhost:8080'
+# How long (in seconds) to cache successful OAuth2 token lookups, in CAS_PROFILE_CACHE_NAME.
+# Tokens revoked through OSF are dropped at once; tokens revoked directly in CAS stay usable this long
+CAS_PROFILE_CACHE_TTL = 60
 MFR_SERVER_URL = 'http://localhost:7778'
 
 ###### ARCHIVER ###########
@@ -548,8 +560,10 @@ class CeleryConfig:
         'api.providers.tasks',
         'osf.management.commands.daily_reporters_go',
         'osf.management.commands.monthly_reporters_go',
+        'osf.management.commands.update_storage_usage',
         'osf.external.spam.tasks',
         'api.share.utils',
+        'osf.metrics.counted_usage',
     )
 
     # Modules that need metrics and release requirements
@@ -652,6 +666,10 @@ class CeleryConfig:
                 'task': 'management.commands.monthly_reporters_go',
                 'schedule': crontab(minute=30, hour=6, day_of_month=2),     # Second day of month 1:30 a.m.
             },
+            'update_storage_usage': {
+                'task': 'management.commands.update_storage_usage',
+                'schedule': crontab(minute=30, hour=7),  # Daily 2:30 a.m.
+            },
             # 'data_storage_usage': {
             #   'task': 'management.commands.data_storage_usage',
             #   'schedule': crontab(day_of_month=1, minute=30, hour=4),  # Last of the month at 11:30 p.m.
@@ -2009,6 +2027,11 @@ SITEMAP_TO_S3 = False
 SITEMAP_AWS_BUCKET = None
 SITEMAP_URL_MAX = 25000
 SITEMAP_INDEX_MAX = 50000
+SITEMAP_QUERY_CHUNK_SIZE = 2000
+# Number of processes generating the user/node/preprint sections, None to generate them in turn
+SITEMAP_PARALLEL = None
+# Only regenerate the sections whose rows changed since the previous run
+SITEMAP_INCREMENTAL = False
 SITEMAP_STATIC_URLS = [
     OrderedDict([('loc', ''), ('changefreq', 'yearly'), ('priority', '0.5')]),
     OrderedDict([('loc', 'preprints'), ('changefreq', 'yearly'), ('priority', '0.5')]),
@@ -2127,7 +2150,7 @@ class StorageLimits(enum.IntEnum):
         else:
             return cls.DEFAULT
 
-STORAGE_USAGE_CACHE_TIMEOUT = 3600 * 24  # seconds in hour times hour (one day)
+STORAGE_USAGE_CACHE_TIMEOUT = None  # counters are kept up to date by file events and reconciled daily by update_storage_usage
 OSF_PIGEON_URL = os.environ.get('OSF_PIGEON_URL', None)
 IA_ARCHIVE_ENABLED = bool(OSF_PIGEON_URL)
 ID_VERSION = 'staging_v2'